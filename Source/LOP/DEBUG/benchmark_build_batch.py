@@ -0,0 +1,52 @@
+#!/usr/bin/env python
+# -*- coding: utf8 -*-
+
+# Micro-benchmark : build_batch against Window_batch_builder, on a random block
+# with a float16 orchestra and with a bit-packed orchestra (BIT_PACKED databases)
+#   python benchmark_build_batch.py [temporal_order] [batch_size]
+
+import sys
+import time
+import numpy as np
+
+from LOP.Utils.build_batch import build_batch, Window_batch_builder
+from LOP.Utils.bit_packing import Bit_packed_matrix, pack
+
+T = 20000
+PIANO_DIM = 93
+ORCH_DIM = 250
+N_BATCHES = 200
+
+def time_builder(build, batches):
+    time_0 = time.time()
+    for batch_index in batches:
+        build(batch_index)
+    return (time.time() - time_0) / len(batches)
+
+if __name__ == '__main__':
+    temporal_order = int(sys.argv[1]) if len(sys.argv) > 1 else 5
+    batch_size = int(sys.argv[2]) if len(sys.argv) > 2 else 200
+
+    piano = np.random.rand(T, PIANO_DIM).astype(np.float32)
+    orch_dense = (np.random.rand(T, ORCH_DIM) > 0.9).astype(np.float16)
+    orch_packed = Bit_packed_matrix(pack(orch_dense), ORCH_DIM)
+    indices = np.arange(temporal_order-1, T-temporal_order+1, dtype=np.int32)
+    np.random.shuffle(indices)
+    batches = [indices[i*batch_size:(i+1)*batch_size] for i in range(min(N_BATCHES, len(indices) // batch_size))]
+    print("temporal_order = {}, batch_size = {}".format(temporal_order, batch_size))
+
+    for orch_name, orch in [("float16", orch_dense), ("bit-packed", orch_packed)]:
+        builder = Window_batch_builder(temporal_order)
+        # Same batches
+        for batch_index in batches[:10]:
+            reference = build_batch(batch_index, piano, orch, None, None, len(batch_index), temporal_order)
+            windowed = builder.build(batch_index, piano, orch, None, None)
+            for a, b in zip(reference, windowed):
+                assert np.array_equal(a, b)
+
+        time_reference = time_builder(lambda e: build_batch(e, piano, orch, None, None, len(e), temporal_order), batches)
+        time_windowed = time_builder(lambda e: builder.build(e, piano, orch, None, None), batches)
+        print("{} orchestra".format(orch_name))
+        print("    build_batch          : {:.3f} ms / batch".format(1000 * time_reference))
+        print("    Window_batch_builder : {:.3f} ms / batch".format(1000 * time_windowed))
+        print("    Speedup              : {:.2f}".format(time_reference / time_windowed))
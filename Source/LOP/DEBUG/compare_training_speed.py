@@ -0,0 +1,27 @@
+#!/usr/bin/env python
+# -*- coding: utf8 -*-
+
+# Epoch-time speedup between two trainings on the same data (typically windowed and sequence mode)
+#   python compare_training_speed.py config_folder_windowed config_folder_sequence
+
+import os
+import re
+import sys
+
+def read_training_speed(config_folder):
+    speed = {}
+    with open(os.path.join(config_folder, 'training_speed.txt'), 'r') as ff:
+        for line in ff:
+            res = re.split('=', line)
+            if len(res) == 2:
+                speed[res[0].strip()] = res[1].strip()
+    return speed
+
+if __name__ == '__main__':
+    reference = read_training_speed(sys.argv[1])
+    compared = read_training_speed(sys.argv[2])
+    if reference['targets_per_epoch'] != compared['targets_per_epoch']:
+        print("Warning : different number of targets per epoch, the trainings do not use the same data")
+    for speed in [reference, compared]:
+        print("{} mode : {:.2f}s per epoch, {} targets".format(speed['mode'], float(speed['epoch_training_time']), speed['targets_per_epoch']))
+    print("Speedup : {:.2f}".format(float(reference['epoch_training_time']) / float(compared['epoch_training_time'])))
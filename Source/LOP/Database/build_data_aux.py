@@ -12,7 +12,7 @@ from LOP_database.utils.time_warping import needleman_chord_wrapper, warp_dictio
 from LOP_database.utils.event_level import get_event_ind_dict
 from LOP_database.utils.pianoroll_processing import sum_along_instru_dim
 from LOP_database.utils.align_pianorolls import align_pianorolls
-from LOP.Database.simplify_instrumentation import get_simplify_mapping
+from LOP.Database.simplify_instrumentation import simplify_header
 from LOP.Utils.process_data import process_data_piano, process_data_orch
 
 def get_instru_and_pr_from_folder_path(folder_path, quantization, clip=True):
@@ -46,8 +46,8 @@ def get_instru_and_pr_from_folder_path(folder_path, quantization, clip=True):
         instru1 = next(r1)
 
     # Simplify names : keep only tracks not marked as useless
-    instru0_simple = {k: simplify_instrumentation(v) for k, v in instru0.items()}
-    instru1_simple = {k: simplify_instrumentation(v) for k, v in instru1.items()}
+    instru0_simple = simplify_header(instru0)
+    instru1_simple = simplify_header(instru1)
     # Files name, no extensions
     mid_file_0 = re.sub('.mid', '', mid_files[0])
     mid_file_1 = re.sub('.mid', '', mid_files[1])
@@ -143,32 +143,41 @@ def discriminate_between_piano_and_orchestra(pr0, instru0, T0, name0, pr1, instr
     return pr_piano, instru_piano, T_piano, name_piano, pr_orch, instru_orch, T_orch, name_orch
 
 
-def cast_small_pr_into_big_pr(pr_small, instru, time, duration, instru_mapping, pr_big):
-    # Detremine x_min and x_max thanks to time and duration
-    # Parse pr_small by keys (instrument)
-    # Get insrument name in instru
-    # For pr_instrument, remove the column out of pitch_min and pitch_max
-    # Determine thanks to instru_mapping the y_min and y_max in pr_big
+# Cast plans already compiled in this process, indexed by (tracks, instrumentation, instru_mapping)
+_cast_plans = {}
 
-    # Detremine t_min and t_max thanks to time and duration
-    t_min = time
-    t_max = time + duration
-    # Parse pr_small
-    for track_name, pr_instru in pr_small.items():
-        track_name = unidecode(track_name)
+
+def get_cast_plan(track_names, instru, instru_mapping):
+    """Columns of the small pianorolls and where they go in the big one.
+    Returns (sources, index_big, layers) where
+        - sources : list of (track_name, pitch_min, pitch_max), the slices gathered from pr_small, in that order
+        - index_big : for each gathered column, its column in pr_big
+        - layers : lists of gathered columns whose destinations are all different,
+            so that each layer is one vectorized max (mixed or doubled instruments write several times the same columns)
+    Plans only depend on the track names, instrumentation and mapping, so they are compiled once and reused.
+    """
+    key = (tuple(track_names),
+        tuple(sorted(instru.items())),
+        tuple(sorted((k, v['pitch_min'], v['pitch_max'], v['index_min'], v['index_max']) for k, v in instru_mapping.items())))
+    if key in _cast_plans:
+        return _cast_plans[key]
+
+    sources = []
+    index_big = []
+    for track_name in track_names:
+        track_name_decoded = unidecode(track_name)
         if len(instru) == 0:
             # Then this is the piano score
             instru_names = ['Piano']
         else:
             # unmix instrusi
-            track_name_processed = (track_name.rstrip('\x00')).replace('\r', '')
+            track_name_processed = (track_name_decoded.rstrip('\x00')).replace('\r', '')
             instru_names = unmixed_instru(instru[track_name_processed])
-        
+
         for instru_name in instru_names:
             # "Remove" tracks
             if instru_name == 'Remove':
                 continue
-
             # For pr_instrument, remove the column out of pitch_min and pitch_max
             try:
                 pitch_min = instru_mapping[instru_name]['pitch_min']
@@ -176,26 +185,52 @@ def cast_small_pr_into_big_pr(pr_small, instru, time, duration, instru_mapping,
             except KeyError:
                 print(instru_name + " instrument was not present in the training database")
                 continue
-
             # Determine thanks to instru_mapping the y_min and y_max in pr_big
             index_min = instru_mapping[instru_name]['index_min']
             index_max = instru_mapping[instru_name]['index_max']
+            sources.append((track_name, pitch_min, pitch_max))
+            index_big.extend(range(index_min, index_max))
 
-            # Insert the small pr in the big one :)
-            # Insertion is max between already written notes and new ones
-            pr_big[t_min:t_max, index_min:index_max] = np.maximum(pr_big[t_min:t_max, index_min:index_max], pr_instru[:, pitch_min:pitch_max])
-            
-    return pr_big
+    # Layer of a column = number of previous columns with the same destination
+    layers = []
+    count_written = {}
+    for column, index in enumerate(index_big):
+        layer = count_written.get(index, 0)
+        if layer == len(layers):
+            layers.append([])
+        layers[layer].append(column)
+        count_written[index] = layer + 1
 
-def simplify_instrumentation(instru_name_complex):
-    simplify_mapping = get_simplify_mapping()
-    instru_name_unmixed = unmixed_instru(instru_name_complex)
-    instru_name_unmixed_simple = []
-    for e in instru_name_unmixed:
-        simple_name = simplify_mapping[e]
-        instru_name_unmixed_simple.append(simple_name)
-    link = " and "
-    return link.join(instru_name_unmixed_simple)
+    index_big = np.asarray(index_big, dtype=np.int64)
+    layers = [np.asarray(e, dtype=np.int64) for e in layers]
+    _cast_plans[key] = (sources, index_big, layers)
+    return _cast_plans[key]
+
+
+def cast_small_pr_into_big_pr(pr_small, instru, time, duration, instru_mapping, pr_big):
+    # Detremine x_min and x_max thanks to time and duration
+    # Parse pr_small by keys (instrument)
+    # Get insrument name in instru
+    # For pr_instrument, remove the column out of pitch_min and pitch_max
+    # Determine thanks to instru_mapping the y_min and y_max in pr_big
+
+    # Detremine t_min and t_max thanks to time and duration
+    t_min = time
+    t_max = time + duration
+    sources, index_big, layers = get_cast_plan(list(pr_small.keys()), instru, instru_mapping)
+    if len(sources) == 0:
+        return pr_big
+
+    # Gather all the useful columns of the small pr at once
+    pr_gathered = np.concatenate([pr_small[track_name][:, pitch_min:pitch_max] for track_name, pitch_min, pitch_max in sources], axis=1)
+
+    # Insert the small pr in the big one :)
+    # Insertion is max between already written notes and new ones
+    pr_big_slice = pr_big[t_min:t_max]
+    for columns in layers:
+        index = index_big[columns]
+        pr_big_slice[:, index] = np.maximum(pr_big_slice[:, index], pr_gathered[:, columns])
+    return pr_big
 
 def process_folder(folder_path, quantization, binary_piano, binary_orch, temporal_granularity, gapopen=3, gapextend=1):
     # Get instrus and prs from a folder name name
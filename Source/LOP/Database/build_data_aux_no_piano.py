@@ -11,7 +11,7 @@ import os
 import csv
 import re
 
-from build_data_aux import simplify_instrumentation
+from LOP.Database.simplify_instrumentation import simplify_header
 
 from LOP_database.utils.event_level import get_event_ind_dict
 from LOP_database.utils.time_warping import warp_pr_aux
@@ -48,7 +48,7 @@ def get_instru_and_pr_from_folder_path_NP(folder_path, quantization):
         instru = next(rr)
 
     # Simplify names : keep only tracks not marked as useless
-    instru_simple = {k: simplify_instrumentation(v) for k, v in instru.items()}
+    instru_simple = simplify_header(instru)
     # Files name, no extensions
     name = re.sub(r'\.(mid|csv)$', '', music_file_path)
 
@@ -18,30 +18,60 @@ import os
 import glob
 import shutil
 import re
+import copy
 import numpy as np
 import LOP.Scripts.config as config
 import build_data_aux
 import build_data_aux_no_piano
 import pickle as pkl
 import avoid_tracks 
+import parsed_score_cache
+import source_manifest
+import chunk_store
+import chunk_manifest
 import torch
 # memory issues
 import gc
 import sys
 import time
+from multiprocessing import Pool
 
-import LOP.Scripts.config as config
 from LOP.Embedding.EmbedModel import embedDenseNet, ChordLevelAttention
+from LOP.Embedding.embedding_cache import Embedding_cache
+from LOP.Utils import bit_packing
 
 DEBUG=False
 ERASE=True
+# Number of processes used for reading, aligning and writing the folders
+NUM_WORKERS=1
+# Store the parsed scores on disk, shared by the two passes of the build and by later rebuilds
+PARSED_SCORE_CACHE=True
+# Only process new or modified folders, reuse the chunks of a previous build (see source_manifest.py)
+INCREMENTAL=False
+# Also write the packed store of each subset (see chunk_store.py)
+PACKED_STORE=True
+# Binary pianorolls are written with np.packbits (see LOP/Utils/bit_packing.py).
+# Off by default : databases built before it are read the same way. Loaders follow the metadata of each database
+BIT_PACKED=False
+# Keep the embeddings of the piano frames on disk, shared by subsets and rebuilds (see LOP/Embedding/embedding_cache.py)
+EMBEDDING_CACHE=True
 
 cuda_gpu = torch.cuda.is_available()
 
-def update_instru_mapping(folder_path, instru_mapping, quantization):
-	if not os.path.isdir(folder_path):
-		return instru_mapping
-	
+def read_folder(folder_path, quantization, binary_piano, binary_orch, temporal_granularity, cache_folder=None):
+	"""Outputs of process_folder (or process_folder_NP), read from the parsed-score cache when available.
+	Returns None when the score could not be read
+	"""
+	read_parameters = {'quantization': quantization,
+		'binary_piano': binary_piano,
+		'binary_orch': binary_orch,
+		'temporal_granularity': temporal_granularity,
+		'gapopen': 3,
+		'gapextend': 1}
+	cached = parsed_score_cache.load(cache_folder, folder_path, read_parameters)
+	if cached is not None:
+		return cached['parsed_score']
+
 	# Is there an original piano score or do we have to create it ?
 	num_music_file = max(len(glob.glob(folder_path + '/*.mid')), len(glob.glob(folder_path + '/*.xml')))
 	if num_music_file == 2:
@@ -53,15 +83,30 @@ def update_instru_mapping(folder_path, instru_mapping, quantization):
 
 	# Read pr
 	if is_piano:
-		pr_piano, _, _, instru_piano, _, pr_orch, _, _, instru_orch, _, duration =\
-			build_data_aux.process_folder(folder_path, quantization, binary_piano, binary_orch, temporal_granularity, gapopen=3, gapextend=1)
+		parsed_score = build_data_aux.process_folder(folder_path, quantization, binary_piano, binary_orch, temporal_granularity, gapopen=3, gapextend=1)
 	else:
 		try:
-			pr_piano, _, _, instru_piano, _, pr_orch, _, _, instru_orch, _, duration =\
-				build_data_aux_no_piano.process_folder_NP(folder_path, quantization, binary_piano, binary_orch, temporal_granularity)
+			parsed_score = build_data_aux_no_piano.process_folder_NP(folder_path, quantization, binary_piano, binary_orch, temporal_granularity)
 		except:
-			duration=None
-			logging.warning("Could not read file in " + folder_path)
+			parsed_score = None
+
+	parsed_score_cache.save(cache_folder, folder_path, read_parameters, parsed_score)
+	return parsed_score
+
+def read_folder_wrapper(args):
+	# Only fills the cache, don't send the pianorolls back to the parent process
+	read_folder(*args)
+	return
+
+def update_instru_mapping(folder_path, instru_mapping, quantization, cache_folder=None):
+	if not os.path.isdir(folder_path):
+		return instru_mapping
+	
+	parsed_score = read_folder(folder_path, quantization, binary_piano, binary_orch, temporal_granularity, cache_folder)
+	if parsed_score is None:
+		logging.warning("Could not read file in " + folder_path)
+		return instru_mapping
+	pr_piano, _, _, instru_piano, _, pr_orch, _, _, instru_orch, _, duration = parsed_score
 	
 	if duration is None:
 		# Files that could not be aligned
@@ -86,7 +131,7 @@ def update_instru_mapping(folder_path, instru_mapping, quantization):
 	return instru_mapping
 
 
-def build_instru_mapping(subset_A_paths, subset_B_paths, subset_C_paths, meta_info_path, quantization, temporal_granularity, logging=None):
+def build_instru_mapping(subset_A_paths, subset_B_paths, subset_C_paths, meta_info_path, quantization, temporal_granularity, num_workers=1, cache_folder=None, logging=None):
 	logging.info("##########")
 	logging.info("Get dimension informations")
 	# Determine the temporal size of the matrices
@@ -101,25 +146,40 @@ def build_instru_mapping(subset_A_paths, subset_B_paths, subset_C_paths, meta_in
 	folder_paths_splits_B = {}
 	folder_paths_splits_C = {}
 
+	##############################
+	# Parse all the scores in parallel first. They are stored in the parsed-score cache,
+	# then read again by the (sequential) updates of the mapping and by build_split_matrices
+	if (num_workers > 1) and (cache_folder is not None):
+		jobs = []
+		for folder_path in subset_A_paths + subset_B_paths + subset_C_paths:
+			folder_path = folder_path.rstrip()
+			if os.path.isdir(folder_path):
+				jobs.append((folder_path, quantization, binary_piano, binary_orch, temporal_granularity, cache_folder))
+		pool = Pool(processes=num_workers)
+		pool.map(read_folder_wrapper, jobs, chunksize=1)
+		pool.close()
+		pool.join()
+	##############################
+
 	##############################
 	# Subset A
 	for folder_path in subset_A_paths:
 		folder_path = folder_path.rstrip()
-		instru_mapping = update_instru_mapping(folder_path, instru_mapping, quantization)
+		instru_mapping = update_instru_mapping(folder_path, instru_mapping, quantization, cache_folder)
 	##############################
 
 	##############################
 	# Subset B
 	for folder_path in subset_B_paths:
 		folder_path = folder_path.rstrip()
-		instru_mapping = update_instru_mapping(folder_path, instru_mapping, quantization)
+		instru_mapping = update_instru_mapping(folder_path, instru_mapping, quantization, cache_folder)
 	##############################
 
 	##############################
 	# Subset C
 	for folder_path in subset_C_paths:
 		folder_path = folder_path.rstrip()
-		instru_mapping = update_instru_mapping(folder_path, instru_mapping, quantization)
+		instru_mapping = update_instru_mapping(folder_path, instru_mapping, quantization, cache_folder)
 	##############################
 
 	##############################
@@ -150,124 +210,238 @@ def build_instru_mapping(subset_A_paths, subset_B_paths, subset_C_paths, meta_in
 
 	return
 
-def build_split_matrices(folder_paths, destination_folder, chunk_size, instru_mapping, N_piano, N_orchestra, embedding_model, binary_piano, binary_orch):
-	file_counter = 0
+def build_folder_chunks(folder_path, tmp_prefix, chunk_size, instru_mapping, N_piano, N_orchestra, quantization, binary_piano, binary_orch, temporal_granularity, cache_folder):
+	"""Per-folder part of the build : read, align, cast and write the chunks of one folder.
+	Runs in a worker process, so it does not touch the embedding model (which lives on the GPU of the parent)
+	and writes its chunks under temporary names. The parent renames them once the file counter is known.
+
+	Returns (status, pr_piano, split_folders, chunk_entries), chunk_entries being the lengths and non-silent frames of the chunks
+	"""
+	# Get pr, warped and duration
+	parsed_score = read_folder(folder_path, quantization, binary_piano, binary_orch, temporal_granularity, cache_folder)
+	if parsed_score is None:
+		return "unreadable", None, None, None
+	new_pr_piano, _, new_duration_piano, _, new_name_piano, new_pr_orchestra, _, new_duration_orch, new_instru_orchestra, _, duration = parsed_score
+
+	# Skip shitty files
+	if new_pr_piano is None:
+		return "not_aligned", None, None, None
+
+	pr_orch = build_data_aux.cast_small_pr_into_big_pr(new_pr_orchestra, new_instru_orchestra, 0, duration, instru_mapping, np.zeros((duration, N_orchestra)))
+	pr_piano = build_data_aux.cast_small_pr_into_big_pr(new_pr_piano, {}, 0, duration, instru_mapping, np.zeros((duration, N_piano)))
+
+	###############################
+	# Split
+	split_folders = []
+	chunk_entries = []
+	last_index = pr_piano.shape[0]
+	start_indices = range(0, pr_piano.shape[0], chunk_size)
+
+	for split_counter, start_index in enumerate(start_indices):
+		this_split_folder = tmp_prefix + '_' + str(split_counter)
+		if os.path.isdir(this_split_folder):
+			# Left over by an interrupted build
+			shutil.rmtree(this_split_folder)
+		os.mkdir(this_split_folder)
+		end_index = min(start_index + chunk_size, last_index)
+	
+		section = pr_piano[start_index: end_index]
+		if binary_piano and BIT_PACKED:
+			section_cast = bit_packing.pack(section)
+		else:
+			section_cast = section.astype(np.float32)
+		np.save(this_split_folder + '/pr_piano.npy', section_cast)
+
+		section = pr_orch[start_index: end_index]
+		if binary_orch and BIT_PACKED:
+			section_cast = bit_packing.pack(section)
+		else:
+			section_cast = section.astype(np.float32)
+		np.save(this_split_folder + '/pr_orch.npy', section_cast)
+
+		section = new_duration_piano[start_index: end_index]
+		section_cast = np.asarray(section, dtype=np.int8)
+		np.save(this_split_folder + '/duration_piano.npy', section_cast)
+
+		section = new_duration_orch[start_index: end_index]
+		section_cast = np.asarray(section, dtype=np.int8)
+		np.save(this_split_folder + '/duration_orch.npy', section_cast)
+
+		split_folders.append(this_split_folder)
+		chunk_entries.append(chunk_manifest.chunk_entry(pr_piano[start_index: end_index], pr_orch[start_index: end_index]))
+	###############################
+
+	return "ok", pr_piano, split_folders, chunk_entries
+
+def build_folder_chunks_wrapper(args):
+	# Pool.imap only passes one argument
+	return build_folder_chunks(*args)
+
+def embed_piano(pr_piano, instru_mapping, embedding_cache):
+	# Each distinct frame is embedded once (see LOP/Embedding/embedding_cache.py)
+	return embedding_cache.embed(pr_piano, instru_mapping['Piano']['pitch_min'], instru_mapping['Piano']['pitch_max'])
+
+def build_split_matrices(folder_paths, destination_folder, chunk_size, instru_mapping, N_piano, N_orchestra, embedding_cache, binary_piano, binary_orch, num_workers=1, cache_folder=None, previous_folders=None):
+	"""Parsing, alignment, casting and writing of the chunks is distributed over num_workers processes.
+	Results are collected in the order of folder_paths, so that file counters, chunk names
+	and the train_only/train_and_valid dictionaries do not depend on the number of workers.
+
+	previous_folders is the manifest of this subset in a previous build (incremental mode).
+	Folders with an unchanged content keep their chunks, the others are processed with a new file counter.
+	Returns train_and_valid_files, train_only_files and the manifest of the subset for this build.
+	"""
+	if previous_folders is None:
+		previous_folders = {}
+	file_counter = 1 + max([e['file_counter'] for e in previous_folders.values()] + [-1])
 	train_only_files={}
 	train_and_valid_files={}
+	folders_manifest={}
 
-	for folder_path in folder_paths:
-		###############################
-		# Read file
+	folder_list = []
+	jobs = []
+	for folder_index, folder_path in enumerate(folder_paths):
 		folder_path = folder_path.rstrip()
-		logging.info(" : " + folder_path)
 		if not os.path.isdir(folder_path):
 			continue
+		folder_hash = source_manifest.hash_folder(folder_path)
+		previous_entry = previous_folders.get(folder_path)
+		if source_manifest.is_reusable(previous_entry, folder_hash):
+			folder_list.append((folder_path, folder_hash, False))
+			continue
+		if previous_entry is not None:
+			# Changed folder, its old chunks are replaced
+			for chunk in previous_entry['chunks']:
+				if os.path.isdir(chunk):
+					shutil.rmtree(chunk)
+		folder_list.append((folder_path, folder_hash, True))
+		tmp_prefix = destination_folder + '/tmp_' + str(folder_index)
+		jobs.append((folder_path, tmp_prefix, chunk_size, instru_mapping, N_piano, N_orchestra, quantization, binary_piano, binary_orch, temporal_granularity, cache_folder))
+
+	if num_workers > 1:
+		pool = Pool(processes=num_workers)
+		results = pool.imap(build_folder_chunks_wrapper, jobs)
+	else:
+		pool = None
+		results = (build_folder_chunks_wrapper(job) for job in jobs)
+
+	for folder_path, folder_hash, to_process in folder_list:
+		###############################
+		# Read file
+		logging.info(" : " + folder_path)
 
 		if folder_path in avoid_tracks.no_valid_tracks():
-			train_only_files[folder_path] = []
-		else:
-			train_and_valid_files[folder_path] = []
-
-		# Is there an original piano score or do we have to create it ?
-		num_music_file = max(len(glob.glob(folder_path + '/*.mid')), len(glob.glob(folder_path + '/*.xml')))
-		if num_music_file == 2:
-			is_piano = True
-		elif num_music_file == 1:
-			is_piano = False
+			this_dict = train_only_files
 		else:
-			raise Exception("CAVAVAVAMAVAL")
+			this_dict = train_and_valid_files
+		
+		if not to_process:
+			this_dict[folder_path] = list(previous_folders[folder_path]['chunks'])
+			folders_manifest[folder_path] = previous_folders[folder_path]
+			continue
 
-		# Get pr, warped and duration
-		if is_piano:
-			new_pr_piano, _, new_duration_piano, _, new_name_piano, new_pr_orchestra, _, new_duration_orch, new_instru_orchestra, _, duration\
-				= build_data_aux.process_folder(folder_path, quantization, binary_piano, binary_orch, temporal_granularity, gapopen=3, gapextend=1)
-		else:
-			try:
-				new_pr_piano, _, new_duration_piano, _, new_name_piano, new_pr_orchestra, _, new_duration_orch, new_instru_orchestra, _, duration\
-					= build_data_aux_no_piano.process_folder_NP(folder_path, quantization, binary_piano, binary_orch, temporal_granularity)
-			except:
-				logging.warning("Could not read file in " + folder_path)
-				continue
-
-		# Skip shitty files
-		if new_pr_piano is None:
+		this_dict[folder_path] = []
+		# Failed folders are recorded too, so that they are not read again until they change
+		folders_manifest[folder_path] = {'hash': folder_hash, 'file_counter': -1, 'chunks': [], 'chunk_entries': []}
+
+		status, pr_piano, tmp_split_folders, chunk_entries = next(results)
+		if status == "unreadable":
+			logging.warning("Could not read file in " + folder_path)
+			continue
+		if status == "not_aligned":
 			# It's definitely not a match...
 			# Check for the files : are they really a piano score and its orchestration ??
 			with(open('log_build_db.txt', 'a')) as f:
 				f.write(folder_path + '\n')
 			continue
-
-		pr_orch = build_data_aux.cast_small_pr_into_big_pr(new_pr_orchestra, new_instru_orchestra, 0, duration, instru_mapping, np.zeros((duration, N_orchestra)))
-		pr_piano = build_data_aux.cast_small_pr_into_big_pr(new_pr_piano, {}, 0, duration, instru_mapping, np.zeros((duration, N_piano)))
 		###############################
 		
 		###############################
 		# Embed piano
-		piano_embedded = []
-		len_piano = len(pr_piano)
-		batch_size = 500  			# forced to batch for memory issues
-		start_batch_index = 0
-		while start_batch_index < len_piano:
-			end_batch_index = min(start_batch_index+batch_size, len_piano)
-			this_batch_size = end_batch_index-start_batch_index
-			piano_resize_emb = np.zeros((this_batch_size, 1, 128)) # Embeddings accetp size 128 samples
-			piano_resize_emb[:, 0, instru_mapping['Piano']['pitch_min']:instru_mapping['Piano']['pitch_max']] = pr_piano[start_batch_index:end_batch_index]
-			piano_resize_emb_TT = torch.tensor(piano_resize_emb)
-			if cuda_gpu:
-				piano_resize_emb_TT = piano_resize_emb_TT.cuda()
-			piano_embedded_TT = embedding_model(piano_resize_emb_TT.float(), 0)
-			if cuda_gpu:
-				piano_embedded.append(piano_embedded_TT.cpu().numpy())
-			else:
-				piano_embedded.append(piano_embedded_TT.numpy())
-			start_batch_index+=batch_size
-		piano_embedded = np.concatenate(piano_embedded)
+		piano_embedded = embed_piano(pr_piano, instru_mapping, embedding_cache)
 		###############################
 
 		###############################
-		# Split
-		last_index = pr_piano.shape[0]
-		start_indices = range(0, pr_piano.shape[0], chunk_size)
-
-		for split_counter, start_index in enumerate(start_indices):
+		# Name the chunks and keep track of splits
+		for split_counter, tmp_split_folder in enumerate(tmp_split_folders):
 			this_split_folder = destination_folder + '/' + str(file_counter) + '_' + str(split_counter)
-			os.mkdir(this_split_folder)
-			end_index = min(start_index + chunk_size, last_index)
-		
-			section = pr_piano[start_index: end_index]
-			section_cast = section.astype(np.float32)
-			np.save(this_split_folder + '/pr_piano.npy', section_cast)
+			os.rename(tmp_split_folder, this_split_folder)
+			start_index = split_counter * chunk_size
+			end_index = min(start_index + chunk_size, len(pr_piano))
 
 			section = piano_embedded[start_index: end_index]
 			section_cast = section.astype(np.float32)
 			np.save(this_split_folder + '/pr_piano_embedded.npy', section_cast)
 
-			section = pr_orch[start_index: end_index]
-			section_cast = section.astype(np.float32)
-			np.save(this_split_folder + '/pr_orch.npy', section_cast)
+			this_dict[folder_path].append(this_split_folder)
 
-			section = new_duration_piano[start_index: end_index]
-			section_cast = np.asarray(section, dtype=np.int8)
-			np.save(this_split_folder + '/duration_piano.npy', section_cast)
+		folders_manifest[folder_path]['file_counter'] = file_counter
+		folders_manifest[folder_path]['chunks'] = list(this_dict[folder_path])
+		folders_manifest[folder_path]['chunk_entries'] = chunk_entries
+		file_counter+=1
+		###############################
 
-			section = new_duration_orch[start_index: end_index]
-			section_cast = np.asarray(section, dtype=np.int8)
-			np.save(this_split_folder + '/duration_orch.npy', section_cast)
+	if pool is not None:
+		pool.close()
+		pool.join()
 
-			# Keep track of splits
-			if folder_path in avoid_tracks.no_valid_tracks():
-				train_only_files[folder_path].append(this_split_folder)
-			else:
-				train_and_valid_files[folder_path].append(this_split_folder)
+	# Chunks of the folders which are not part of the database anymore
+	for folder_path, previous_entry in previous_folders.items():
+		if folder_path not in folders_manifest:
+			for chunk in previous_entry['chunks']:
+				if os.path.isdir(chunk):
+					shutil.rmtree(chunk)
 
-		file_counter+=1
-		###############################
+	return train_and_valid_files, train_only_files, folders_manifest
 
-	return train_and_valid_files, train_only_files
+def build_data(subset_A_paths, subset_B_paths, subset_C_paths, meta_info_path, quantization, temporal_granularity, binary_piano, binary_orch, store_folder, num_workers=1, cache_folder=None, embedding_cache_folder=None, incremental=False, packed=False, logging=None):
+	
+	chunk_size = config.build_parameters()["chunk_size"]
+	embedding_path = config.database_embedding() + "/Model_complete_JSB_3_DICT.pth"
+	build_parameters = {'quantization': quantization,
+		'temporal_granularity': temporal_granularity,
+		'binary_piano': binary_piano,
+		'binary_orch': binary_orch,
+		'chunk_size': chunk_size,
+		'embedding_path': embedding_path,
+		'bit_packed': BIT_PACKED,
+		'embedding_eval_mode': True}
+	subsets = [("A", subset_A_paths), ("B", subset_B_paths), ("C", subset_C_paths)]
 
-def build_data(subset_A_paths, subset_B_paths, subset_C_paths, meta_info_path, quantization, temporal_granularity, binary_piano, binary_orch, store_folder, logging=None):
+	###############################
+	# Incremental build : the previous build is reused if its parameters did not change
+	# and if the new or modified folders fit in its pitch ranges
+	manifest = None
+	if incremental:
+		manifest = source_manifest.load(store_folder)
+		if (manifest is not None) and (manifest['build_parameters'] != build_parameters):
+			logging.info("Build parameters changed : full rebuild")
+			manifest = None
 	
-	build_instru_mapping(subset_A_paths, subset_B_paths, subset_C_paths, meta_info_path=meta_info_path, quantization=quantization, temporal_granularity=temporal_granularity, logging=logging)
+	if manifest is not None:
+		logging.info("##########")
+		logging.info("Check pitch ranges of new and modified folders")
+		pitch_ranges = copy.deepcopy(manifest['instru_mapping'])
+		for subset_name, subset_paths in subsets:
+			for folder_path in subset_paths:
+				folder_path = folder_path.rstrip()
+				if not os.path.isdir(folder_path):
+					continue
+				if source_manifest.is_reusable(manifest['folders'][subset_name].get(folder_path), source_manifest.hash_folder(folder_path)):
+					continue
+				pitch_ranges = update_instru_mapping(folder_path, pitch_ranges, quantization, cache_folder)
+		if source_manifest.pitch_range_widened(manifest['instru_mapping'], pitch_ranges):
+			logging.info("Pitch range widened : full rebuild")
+			manifest = None
+	###############################
+
+	if manifest is None:
+		for subset_name, _ in subsets:
+			if os.path.isdir(os.path.join(store_folder, subset_name)):
+				shutil.rmtree(os.path.join(store_folder, subset_name))
+		build_instru_mapping(subset_A_paths, subset_B_paths, subset_C_paths, meta_info_path=meta_info_path, quantization=quantization, temporal_granularity=temporal_granularity, num_workers=num_workers, cache_folder=cache_folder, logging=logging)
+		previous_folders = {"A": {}, "B": {}, "C": {}}
+	else:
+		previous_folders = manifest['folders']
 
 	logging.info("##########")
 	logging.info("Build data")
@@ -277,11 +451,11 @@ def build_data(subset_A_paths, subset_B_paths, subset_C_paths, meta_info_path, q
 
 	###############################
 	# Load embedding model
-	embedding_path = config.database_embedding() + "/Model_complete_JSB_3_DICT.pth"
 	embedding_model = embedDenseNet(380, 12, (1500,500), 100, 1500, 2, 3, 12, 0.5, 0, False, True)
 	if cuda_gpu:
 		embedding_model.cuda()
 	embedding_model.load_state_dict(torch.load(embedding_path))
+	embedding_cache = Embedding_cache(embedding_model, embedding_path, cache_folder=embedding_cache_folder, cuda=cuda_gpu)
 	###############################
 
 	###############################
@@ -316,19 +490,49 @@ def build_data(subset_A_paths, subset_B_paths, subset_C_paths, meta_info_path, q
 
 	###############################
 	# Iinit folders
-	chunk_size = config.build_parameters()["chunk_size"]
 	split_folder_A = os.path.join(store_folder, "A")
-	os.mkdir(split_folder_A)
 	split_folder_B = os.path.join(store_folder, "B")
-	os.mkdir(split_folder_B)
 	split_folder_C = os.path.join(store_folder, "C")
-	os.mkdir(split_folder_C)
+	for split_folder in [split_folder_A, split_folder_B, split_folder_C]:
+		if not os.path.isdir(split_folder):
+			os.mkdir(split_folder)
 	
 	###############################
 	# Build matrices
-	train_and_valid_A, train_only_A = build_split_matrices(subset_A_paths, split_folder_A, chunk_size, instru_mapping, N_piano, N_orchestra, embedding_model, binary_piano, binary_orch)
-	train_and_valid_B, train_only_B = build_split_matrices(subset_B_paths, split_folder_B, chunk_size, instru_mapping, N_piano, N_orchestra, embedding_model, binary_piano, binary_orch)
-	train_and_valid_C, train_only_C = build_split_matrices(subset_C_paths, split_folder_C, chunk_size, instru_mapping, N_piano, N_orchestra, embedding_model, binary_piano, binary_orch)
+	folders_manifest = {}
+	train_and_valid_A, train_only_A, folders_manifest["A"] = build_split_matrices(subset_A_paths, split_folder_A, chunk_size, instru_mapping, N_piano, N_orchestra, embedding_cache, binary_piano, binary_orch, num_workers, cache_folder, previous_folders["A"])
+	train_and_valid_B, train_only_B, folders_manifest["B"] = build_split_matrices(subset_B_paths, split_folder_B, chunk_size, instru_mapping, N_piano, N_orchestra, embedding_cache, binary_piano, binary_orch, num_workers, cache_folder, previous_folders["B"])
+	train_and_valid_C, train_only_C, folders_manifest["C"] = build_split_matrices(subset_C_paths, split_folder_C, chunk_size, instru_mapping, N_piano, N_orchestra, embedding_cache, binary_piano, binary_orch, num_workers, cache_folder, previous_folders["C"])
+	###############################
+
+	logging.info("Embedded {} distinct piano frames out of {}".format(embedding_cache.num_embedded, embedding_cache.num_frames))
+	embedding_cache.save()
+
+	###############################
+	# Manifest for the next incremental build
+	source_manifest.save(store_folder, {'build_parameters': build_parameters,
+		'instru_mapping': instru_mapping,
+		'folders': folders_manifest})
+	###############################
+
+	###############################
+	# Lengths and non-silent frames of the chunks, for building the folds without loading the matrices
+	chunks = {}
+	for subset_folders in folders_manifest.values():
+		for folder_entry in subset_folders.values():
+			if 'chunk_entries' not in folder_entry:
+				# Reused from an incremental build older than the chunk manifest
+				folder_entry['chunk_entries'] = [chunk_manifest.chunk_entry_from_files(e) for e in folder_entry['chunks']]
+			for chunk_path, entry in zip(folder_entry['chunks'], folder_entry['chunk_entries']):
+				chunks[chunk_path] = entry
+	chunk_manifest.save(store_folder, chunks)
+	###############################
+
+	###############################
+	# One contiguous memory-mappable file per array kind and subset
+	if packed:
+		for split_folder in [split_folder_A, split_folder_B, split_folder_C]:
+			chunk_store.pack_subset(split_folder)
 	###############################
 
 	###############################
@@ -356,6 +560,8 @@ def build_data(subset_A_paths, subset_B_paths, subset_C_paths, meta_info_path, q
 	metadata['temporal_granularity'] = temporal_granularity
 	metadata['store_folder'] = store_folder
 	metadata['embedding_path'] = embedding_path
+	metadata['bitpacked_piano'] = binary_piano and BIT_PACKED
+	metadata['bitpacked_orch'] = binary_orch and BIT_PACKED
 	with open(store_folder + '/metadata.pkl', 'wb') as outfile:
 		pkl.dump(metadata, outfile)
 	###############################
@@ -421,10 +627,21 @@ if __name__ == '__main__':
 	if binary_orch:
 		data_folder += '_bo'
 	data_folder += '_tempGran' + str(quantization)
+
+	# Parsed scores are kept outside of data_folder so that they survive ERASE
+	if PARSED_SCORE_CACHE:
+		cache_folder = config.data_root() + '/Parsed_scores'
+	else:
+		cache_folder = None
+	if EMBEDDING_CACHE:
+		embedding_cache_folder = config.data_root() + '/Embeddings_cache'
+	else:
+		embedding_cache_folder = None
 	
-	if ERASE:
+	if ERASE and (not INCREMENTAL):
 		if os.path.isdir(data_folder):
 			shutil.rmtree(data_folder)
+	if not os.path.isdir(data_folder):
 		os.makedirs(data_folder)
 
 	ff=open(data_folder + '/binary_piano', 'wb')
@@ -471,4 +688,9 @@ if __name__ == '__main__':
 			   binary_piano=binary_piano,
 			   binary_orch=binary_orch,
 			   store_folder=data_folder,
+			   num_workers=NUM_WORKERS,
+			   cache_folder=cache_folder,
+			   embedding_cache_folder=embedding_cache_folder,
+			   incremental=INCREMENTAL,
+			   packed=PACKED_STORE,
 			   logging=logging)
@@ -0,0 +1,100 @@
+#!/usr/bin/env python
+# -*- coding: utf-8-unix -*-
+
+"""Length and non-silent frames of every chunk of a database, written by the build.
+	<store_folder>/chunk_manifest.pkl = {
+		chunk_path: {'length': 200, 'non_silent': np.packbits(piano and orchestra are both non-silent)},
+		...
+	}
+Fold construction only needs these two informations, so it never loads the matrices.
+
+Write the manifest of an existing database with :
+	python chunk_manifest.py /path/to/Data_bp_bo_tempGran8
+"""
+
+import os
+import sys
+import pickle as pkl
+import numpy as np
+from LOP.Database import chunk_store
+
+MANIFEST_NAME = 'chunk_manifest.pkl'
+
+# Manifests already loaded in this process, indexed by store folder (None when the database has no manifest)
+_manifests = {}
+
+
+def non_silent_frames(pr_piano, pr_orch):
+	# Also valid for bit-packed matrices : a row is silent iff all its bytes are zero
+	return (pr_piano.sum(axis=1) > 0) & (pr_orch.sum(axis=1) > 0)
+
+
+def chunk_entry(pr_piano, pr_orch):
+	return {'length': len(pr_piano),
+		'non_silent': np.packbits(non_silent_frames(pr_piano, pr_orch))}
+
+
+def chunk_entry_from_files(chunk_path):
+	store = chunk_store.get_store(chunk_path)
+	if store is not None:
+		pr_piano = store.load_chunk(chunk_path, 'pr_piano')
+		pr_orch = store.load_chunk(chunk_path, 'pr_orch')
+	else:
+		pr_piano = np.load(os.path.join(chunk_path, 'pr_piano.npy'), mmap_mode='r')
+		pr_orch = np.load(os.path.join(chunk_path, 'pr_orch.npy'), mmap_mode='r')
+	return chunk_entry(pr_piano, pr_orch)
+
+
+def non_silent(entry):
+	"""Boolean vector of the frames of the chunk where both piano and orchestra are non-silent
+	"""
+	return np.unpackbits(entry['non_silent'])[:entry['length']].astype(bool)
+
+
+def load(store_folder):
+	manifest_path = os.path.join(store_folder, MANIFEST_NAME)
+	if not os.path.isfile(manifest_path):
+		return None
+	with open(manifest_path, 'rb') as ff:
+		return pkl.load(ff)
+
+
+def save(store_folder, chunks):
+	with open(os.path.join(store_folder, MANIFEST_NAME), 'wb') as ff:
+		pkl.dump(chunks, ff, protocol=pkl.HIGHEST_PROTOCOL)
+	_manifests.pop(store_folder, None)
+	return
+
+
+def get_entry(chunk_path):
+	"""Entry of chunk_path, or None if its database has no manifest (built before the manifest existed)
+	"""
+	chunk_path = chunk_path.rstrip('/')
+	store_folder = os.path.dirname(os.path.dirname(chunk_path))
+	if store_folder not in _manifests:
+		_manifests[store_folder] = load(store_folder)
+	chunks = _manifests[store_folder]
+	if chunks is None:
+		return None
+	return chunks.get(chunk_path)
+
+
+def build_manifest(store_folder):
+	# From the chunk folders of an existing database
+	chunks = {}
+	for subset_name in ['A', 'B', 'C']:
+		for dict_name in ['train_and_valid_', 'train_only_']:
+			dict_path = os.path.join(store_folder, dict_name + subset_name + '.pkl')
+			if not os.path.isfile(dict_path):
+				continue
+			with open(dict_path, 'rb') as ff:
+				files = pkl.load(ff)
+			for chunk_paths in files.values():
+				for chunk_path in chunk_paths:
+					chunks[chunk_path.rstrip('/')] = chunk_entry_from_files(chunk_path)
+	save(store_folder, chunks)
+	return
+
+
+if __name__ == '__main__':
+	build_manifest(sys.argv[1])
@@ -0,0 +1,168 @@
+#!/usr/bin/env python
+# -*- coding: utf-8-unix -*-
+
+"""Packed storage of the chunks of a subset.
+Instead of one folder per chunk with five small .npy files, each array kind of a subset
+is written as one contiguous .npy file in <subset_folder>/packed, with an index giving
+the rows of each chunk :
+	<subset_folder>/packed/index.pkl = {
+		'kinds': ['pr_piano', 'pr_piano_embedded', 'pr_orch', 'duration_piano', 'duration_orch'],
+		'chunks': {'0_0': (0, 200), '0_1': (200, 341), ...}
+	}
+Chunks keep their usual names (the paths stored in the train_only/train_and_valid dictionaries),
+so the rest of the pipeline does not change. Arrays are opened once per process, memory-mapped.
+
+Convert an existing database with :
+	python chunk_store.py /path/to/Data_bp_bo_tempGran8 [--remove_chunks]
+"""
+
+import os
+import re
+import sys
+import shutil
+import pickle as pkl
+import numpy as np
+
+PACKED_FOLDER = 'packed'
+ARRAY_KINDS = ['pr_piano', 'pr_piano_embedded', 'pr_orch', 'duration_piano', 'duration_orch', 'mask_orch']
+
+# Stores already opened in this process, indexed by subset folder (None when the subset is not packed)
+_stores = {}
+# Databases whose packed stores are read from another location (e.g. a node-local copy in shared memory),
+# store folder -> folder containing the packed store of each subset (<packed_root>/A, <packed_root>/B...)
+_packed_roots = {}
+
+
+def normalize_folder(folder):
+	# Same key for a folder whatever the way it is written (relative, trailing '/')
+	return os.path.abspath(folder.rstrip('/'))
+
+
+class Chunk_store(object):
+
+	def __init__(self, packed_folder):
+		self.packed_folder = packed_folder
+		with open(os.path.join(packed_folder, 'index.pkl'), 'rb') as ff:
+			index = pkl.load(ff)
+		self.kinds = index['kinds']
+		self.chunks = index['chunks']
+		self.arrays = {}
+		return
+
+	def get_array(self, kind):
+		# Single open per array, then only slices
+		if kind not in self.arrays:
+			self.arrays[kind] = np.load(os.path.join(self.packed_folder, kind + '.npy'), mmap_mode='r')
+		return self.arrays[kind]
+
+	def has_chunk(self, chunk_path):
+		return os.path.basename(chunk_path.rstrip('/')) in self.chunks
+
+	def chunk_length(self, chunk_path):
+		start, end = self.chunks[os.path.basename(chunk_path.rstrip('/'))]
+		return end - start
+
+	def load_chunk(self, chunk_path, kind):
+		start, end = self.chunks[os.path.basename(chunk_path.rstrip('/'))]
+		return self.get_array(kind)[start:end]
+
+
+def get_store(chunk_path):
+	"""Chunk_store containing chunk_path, or None if its subset has not been packed
+	"""
+	subset_folder = os.path.dirname(normalize_folder(chunk_path))
+	if subset_folder not in _stores:
+		store_folder, subset_name = os.path.split(subset_folder)
+		if store_folder in _packed_roots:
+			packed_folder = os.path.join(_packed_roots[store_folder], subset_name)
+		else:
+			packed_folder = os.path.join(subset_folder, PACKED_FOLDER)
+		if os.path.isfile(os.path.join(packed_folder, 'index.pkl')):
+			_stores[subset_folder] = Chunk_store(packed_folder)
+		else:
+			_stores[subset_folder] = None
+	store = _stores[subset_folder]
+	if (store is not None) and store.has_chunk(chunk_path):
+		return store
+	return None
+
+
+def set_packed_root(store_folder, packed_root):
+	"""Read the packed stores of the database in store_folder from packed_root instead
+	"""
+	store_folder = normalize_folder(store_folder)
+	_packed_roots[store_folder] = packed_root
+	for subset_folder in list(_stores.keys()):
+		if os.path.dirname(subset_folder) == store_folder:
+			del _stores[subset_folder]
+	return
+
+
+def list_chunks(subset_folder):
+	# Chunk folders are named file-counter_split-counter
+	chunk_names = [e for e in os.listdir(subset_folder) if re.match(r'^\d+_\d+$', e)]
+	return sorted(chunk_names, key=lambda e: [int(x) for x in e.split('_')])
+
+
+def pack_subset(subset_folder, remove_chunks=False, packed_folder=None):
+	"""Write the packed store of a subset folder (A, B or C) from its chunk folders,
+	in <subset_folder>/packed or in packed_folder if given
+	"""
+	if packed_folder is None:
+		packed_folder = os.path.join(subset_folder, PACKED_FOLDER)
+	chunk_names = list_chunks(subset_folder)
+	if len(chunk_names) == 0:
+		return
+
+	# Array kinds present in every chunk
+	kinds = [kind for kind in ARRAY_KINDS
+		if all([os.path.isfile(os.path.join(subset_folder, e, kind + '.npy')) for e in chunk_names])]
+
+	# Lengths, read from the .npy headers only
+	chunks = {}
+	start = 0
+	for chunk_name in chunk_names:
+		length = np.load(os.path.join(subset_folder, chunk_name, kinds[0] + '.npy'), mmap_mode='r').shape[0]
+		chunks[chunk_name] = (start, start + length)
+		start += length
+	total_length = start
+
+	# Write in a temporary folder, the previous store stays valid until the new one is complete
+	tmp_folder = packed_folder + '_tmp'
+	if os.path.isdir(tmp_folder):
+		shutil.rmtree(tmp_folder)
+	os.mkdir(tmp_folder)
+	for kind in kinds:
+		first = np.load(os.path.join(subset_folder, chunk_names[0], kind + '.npy'), mmap_mode='r')
+		packed = np.lib.format.open_memmap(os.path.join(tmp_folder, kind + '.npy'), mode='w+',
+			dtype=first.dtype, shape=(total_length,) + first.shape[1:])
+		for chunk_name in chunk_names:
+			start, end = chunks[chunk_name]
+			packed[start:end] = np.load(os.path.join(subset_folder, chunk_name, kind + '.npy'))
+		packed.flush()
+		del packed
+	with open(os.path.join(tmp_folder, 'index.pkl'), 'wb') as ff:
+		pkl.dump({'kinds': kinds, 'chunks': chunks}, ff)
+
+	if os.path.isdir(packed_folder):
+		shutil.rmtree(packed_folder)
+	os.rename(tmp_folder, packed_folder)
+	_stores.pop(normalize_folder(subset_folder), None)
+
+	if remove_chunks:
+		# Warning : incremental builds need the chunk folders
+		for chunk_name in chunk_names:
+			shutil.rmtree(os.path.join(subset_folder, chunk_name))
+	return
+
+
+def pack_database(store_folder, remove_chunks=False):
+	for subset_name in ['A', 'B', 'C']:
+		subset_folder = os.path.join(store_folder, subset_name)
+		if os.path.isdir(subset_folder):
+			pack_subset(subset_folder, remove_chunks)
+	return
+
+
+if __name__ == '__main__':
+	pack_database(sys.argv[1], remove_chunks=('--remove_chunks' in sys.argv))
@@ -0,0 +1,79 @@
+#!/usr/bin/env python
+# -*- coding: utf-8-unix -*-
+
+"""On-disk store of the folds built by the training strategies.
+Folds only depend on the database, the split parameters and the strategy
+(random instances are seeded), so configurations sharing these reuse the same plan.
+Plans are written in <database_path>/fold_plans and are invalidated by any rebuild of the database.
+"""
+
+import os
+import hashlib
+import pickle as pkl
+
+FOLD_PLAN_FOLDER = 'fold_plans'
+# Change it when the structure of the folds changes (2 : batches stored as Batch_plan)
+FOLD_PLAN_VERSION = 2
+
+# Files of the database that fold construction depends on
+DATABASE_FILES = ['metadata.pkl', 'chunk_manifest.pkl',
+	'train_only_A.pkl', 'train_and_valid_A.pkl',
+	'train_only_B.pkl', 'train_and_valid_B.pkl',
+	'train_only_C.pkl', 'train_and_valid_C.pkl']
+
+
+def database_fingerprint(database_path):
+	# Name, size and modification time of the files, so that any build of the database changes it
+	signature = []
+	for file_name in DATABASE_FILES:
+		file_path = os.path.join(database_path, file_name)
+		if not os.path.isfile(file_path):
+			continue
+		stat = os.stat(file_path)
+		signature.append((file_name, stat.st_size, int(stat.st_mtime)))
+	return signature
+
+
+def get_plan_path(database_path, strategy_name, split_parameters):
+	key = repr((FOLD_PLAN_VERSION, database_fingerprint(database_path), strategy_name, sorted(split_parameters.items())))
+	return os.path.join(database_path, FOLD_PLAN_FOLDER, hashlib.md5(key.encode('utf-8')).hexdigest() + '.pkl')
+
+
+def get_split_parameters(num_k_folds, parameters, model_params):
+	return {'num_k_folds': num_k_folds,
+		'temporal_order': model_params["temporal_order"],
+		'batch_size': parameters["batch_size"],
+		'long_range': parameters["long_range"],
+		'num_max_contiguous_blocks': parameters["num_max_contiguous_blocks"]}
+
+
+def get_plan(training_strategy):
+	# Folds and names of files attributes of a training strategy (K_folds, K_folds_A, train_names_B...)
+	return {k: v for k, v in vars(training_strategy).items() if k.startswith('K_folds') or ('_names' in k)}
+
+
+def load(database_path, strategy_name, split_parameters):
+	"""Returns the stored plan or None
+	"""
+	plan_path = get_plan_path(database_path, strategy_name, split_parameters)
+	if not os.path.isfile(plan_path):
+		return None
+	with open(plan_path, 'rb') as ff:
+		return pkl.load(ff)
+
+
+def save(database_path, strategy_name, split_parameters, plan):
+	plan_folder = os.path.join(database_path, FOLD_PLAN_FOLDER)
+	if not os.path.isdir(plan_folder):
+		try:
+			os.makedirs(plan_folder)
+		except OSError:
+			# Created by another job in the meantime
+			pass
+	plan_path = get_plan_path(database_path, strategy_name, split_parameters)
+	# Concurrent jobs may write the same plan : write in a temporary file then rename
+	tmp_path = plan_path + '.' + str(os.getpid())
+	with open(tmp_path, 'wb') as ff:
+		pkl.dump(plan, ff, protocol=pkl.HIGHEST_PROTOCOL)
+	os.rename(tmp_path, plan_path)
+	return
@@ -2,7 +2,11 @@
 # -*- coding: utf8 -*-
 
 import random
+import numpy as np
 import load_matrices
+from LOP.Database import chunk_manifest
+from LOP.Utils.batch_plan import Batch_plan
+from LOP.Utils.sequence_batch import build_segments, batch_segments
 import LOP.Scripts.config
 import LOP.Database.avoid_tracks
 import pickle as pkl
@@ -52,88 +56,98 @@ def from_block_list_to_folds(list_blocks, temporal_order, train_batch_size, long
     random_inst.shuffle(list_blocks)
 
     # Split them in blocks of size num_max_contiguous_blocks
+    block_size = num_max_contiguous_blocks + 1
+    list_chunks_folders = [list_blocks[start:start+block_size] for start in range(0, len(list_blocks), block_size)]
+    if len(list_chunks_folders) == 0:
+        list_chunks_folders = [[]]
+
     blocks = []
-    counter = 0
-    time = 0
-    this_list_of_path = []
-    this_list_of_valid_indices = []
-    this_list_of_valid_indices_lr = []
-    for block_folder in list_blocks:
-        if counter > num_max_contiguous_blocks:
-            this_dict = {       
-                "batches": build_batches(this_list_of_valid_indices, train_batch_size, random_inst),
-                "chunks_folders": this_list_of_path
-                }
-            if long_range_pred:
-                this_dict["batches_lr"] = build_batches(this_list_of_valid_indices_lr, train_batch_size, random_inst)
-            blocks.append(this_dict)
-            counter = 0
-            time = 0
-            this_list_of_path = []
-            this_list_of_valid_indices = []
-            this_list_of_valid_indices_lr = []
-        counter+=1
-        
-        # Update list of chunks
-        this_list_of_path.append(block_folder)
-        
-        # Update the list of valid indices
-        pr_piano, _, pr_orch, _, _ = load_matrices.load_matrix_NO_PROCESSING(block_folder, duration_piano_bool=False, mask_orch_bool=False)
-        duration = len(pr_piano)
-        start_valid_ind = temporal_order - 1
-        end_valid_ind = duration - temporal_order + 1
-        this_indices = remove_silences(range(start_valid_ind, end_valid_ind), pr_piano, pr_orch)
-        this_indices = [e+time for e in this_indices]
-        this_list_of_valid_indices.extend(this_indices)
+    for chunks_folders in list_chunks_folders:
+        valid_indices, valid_indices_lr = get_valid_indices(chunks_folders, temporal_order, long_range_pred)
+        this_dict = {
+            "batches": build_batches(valid_indices, train_batch_size, random_inst),
+            "chunks_folders": chunks_folders
+            }
         if long_range_pred:
-            end_valid_ind_lr = duration - temporal_order - long_range_pred + 1
-            this_indices_lr = remove_silences(range(start_valid_ind, end_valid_ind_lr), pr_piano, pr_orch)
-            this_indices_lr = [e+time for e in this_indices_lr]
-            this_list_of_valid_indices_lr.extend(this_indices_lr)
-        time += duration
-    
-    # Don't forget the last one !
-    this_dict = {       
-        "batches": build_batches(this_list_of_valid_indices, train_batch_size, random_inst),
-        "chunks_folders": this_list_of_path
-        }
-    if long_range_pred:
-        this_dict["batches_lr"] = build_batches(this_list_of_valid_indices_lr, train_batch_size, random_inst)
-    blocks.append(this_dict)
+            this_dict["batches_lr"] = build_batches(valid_indices_lr, train_batch_size, random_inst)
+        blocks.append(this_dict)
 
     return blocks
 
-def build_batches(ind, train_batch_size, random_inst):
-        batches = []
-        position = 0
-        n_ind = len(ind)
+def get_chunk_entry(block_folder):
+    # Lengths and silences are read in the chunk manifest written by the build,
+    # matrices are only loaded for databases built without it
+    entry = chunk_manifest.get_entry(block_folder)
+    if entry is None:
+        PARTS = load_matrices.load_chunk_arrays(block_folder, ['pr_piano', 'pr_orch'])
+        entry = chunk_manifest.chunk_entry(PARTS['pr_piano'], PARTS['pr_orch'])
+    return entry
+
+def get_valid_indices(chunks_folders, temporal_order, long_range_pred):
+    """ Valid indices of a block, i.e. of the concatenation of its chunks, as int32 arrays (indices, indices_lr).
+    In each chunk, an index is valid if it is not silent and lies in [temporal_order-1, duration-temporal_order+1)
+    (duration-temporal_order-long_range_pred+1 for the long range predictions)
+    """
+    entries = [get_chunk_entry(e) for e in chunks_folders]
+    durations = np.asarray([e['length'] for e in entries], dtype=np.int64)
+    total_duration = durations.sum()
+    if total_duration == 0:
+        empty = np.zeros((0,), dtype=np.int32)
+        return empty, empty
+    flat_pr = np.concatenate([chunk_manifest.non_silent(e) for e in entries])
+    # Time of each frame in its chunk, and duration of its chunk
+    starts = np.cumsum(durations) - durations
+    time_in_chunk = np.arange(total_duration) - np.repeat(starts, durations)
+    chunk_duration = np.repeat(durations, durations)
+    candidates = flat_pr & (time_in_chunk >= temporal_order - 1)
+    indices = np.flatnonzero(candidates & (time_in_chunk < chunk_duration - temporal_order + 1)).astype(np.int32)
+    if long_range_pred:
+        indices_lr = np.flatnonzero(candidates & (time_in_chunk < chunk_duration - temporal_order - long_range_pred + 1)).astype(np.int32)
+    else:
+        indices_lr = None
+    return indices, indices_lr
 
+def get_block_segments(block, temporal_order, sequence_length):
+    """ Segments of a block for the sequence mode (see Utils/sequence_batch.py),
+    targets being the indices of the batches of the block
+    """
+    durations = [get_chunk_entry(e)['length'] for e in block['chunks_folders']]
+    valid_indices = np.concatenate([np.asarray(e) for e in block['batches']] + [np.zeros((0,), dtype=np.int32)])
+    return build_segments(valid_indices, durations, temporal_order, sequence_length)
+
+def to_sequence_blocks(blocks, temporal_order, sequence_length, batch_size, random_inst):
+    """ Same blocks, with batches of segments in place of the batches of indices (sequence mode training).
+    batch_size = None : one batch per block.
+    The long range batches are left unchanged
+    """
+    sequence_blocks = []
+    for block in blocks:
+        segments = get_block_segments(block, temporal_order, sequence_length)
+        this_dict = dict(block)
+        this_dict["batches"] = batch_segments(segments, batch_size or max(1, len(segments[0])), random_inst)
+        sequence_blocks.append(this_dict)
+    return sequence_blocks
+
+def build_batches(ind, train_batch_size, random_inst):
+        # Batch_plan : int32 indices and offsets of the batches
         if train_batch_size:
-            n_batch = int(n_ind // train_batch_size)
             # Shuffle indices
             random_inst.shuffle(ind)
-        else:
-            # One batch for valid and test, 
-            # and don't shuffle (useless)
-            n_batch = 1
-            train_batch_size = n_ind
-        
-        for i in range(n_batch):
-            batches.append(ind[position:position+train_batch_size])
-            position += train_batch_size
-        # Smaller last batch
-        if position < n_ind:
-            batches.append(ind[position:n_ind])
-        return batches
+        # else one batch for valid and test, 
+        # and don't shuffle (useless)
+        return Batch_plan.from_indices(ind, train_batch_size)
 
 def remove_silences(indices, piano, orch):
     """ Remove silences from a set of indices. Remove both from piano and orchestra
-    
+    Also valid for bit-packed matrices : a row is silent iff all its bytes are zero
     """
-    flat_piano = piano.sum(axis=1)>0
-    flat_orch = orch.sum(axis=1)>0
-    flat_pr = flat_piano * flat_orch
-    return [e for e in indices if (flat_pr[e] != 0)]
+    flat_pr = chunk_manifest.non_silent_frames(piano, orch)
+    return remove_silences_from_flags(indices, flat_pr)
+
+def remove_silences_from_flags(indices, flat_pr):
+    # flat_pr : boolean vector, True where both piano and orchestra are non-silent
+    indices = np.asarray(indices, dtype=np.int32)
+    return indices[np.asarray(flat_pr, dtype=bool)[indices]]
 
 if __name__ == '__main__':
     build_folds("/Users/leo/Recherche/GitHub_Aciditeam/lop/Data_folds/Data__event_level8")
\ No newline at end of file
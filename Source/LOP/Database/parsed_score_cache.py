@@ -0,0 +1,58 @@
+#!/usr/bin/env python
+# -*- coding: utf-8-unix -*-
+
+"""On-disk store of parsed scores.
+Reading, aligning and warping a folder is the most expensive part of the database build.
+The output of process_folder / process_folder_NP is pickled once per set of reading parameters,
+so that the instrument mapping pass, the matrices pass and later rebuilds parse each score only once.
+"""
+
+import os
+import glob
+import hashlib
+import pickle as pkl
+
+
+def folder_signature(folder_path):
+	# Name, size and modification time of the files of the folder,
+	# so that an edited midi or csv file is parsed again
+	signature = []
+	for file_path in sorted(glob.glob(folder_path + '/*')):
+		stat = os.stat(file_path)
+		signature.append((os.path.basename(file_path), stat.st_size, int(stat.st_mtime)))
+	return signature
+
+
+def get_cache_path(cache_folder, folder_path, read_parameters):
+	key = repr((os.path.abspath(folder_path), folder_signature(folder_path), sorted(read_parameters.items())))
+	return os.path.join(cache_folder, hashlib.md5(key.encode('utf-8')).hexdigest() + '.pkl')
+
+
+def load(cache_folder, folder_path, read_parameters):
+	"""Returns the stored entry ({'parsed_score': ...}) or None if the folder has not been parsed with these parameters
+	"""
+	if cache_folder is None:
+		return None
+	cache_path = get_cache_path(cache_folder, folder_path, read_parameters)
+	if not os.path.isfile(cache_path):
+		return None
+	with open(cache_path, 'rb') as ff:
+		return pkl.load(ff)
+
+
+def save(cache_folder, folder_path, read_parameters, parsed_score):
+	if cache_folder is None:
+		return
+	if not os.path.isdir(cache_folder):
+		try:
+			os.makedirs(cache_folder)
+		except OSError:
+			# Created by another worker in the meantime
+			pass
+	cache_path = get_cache_path(cache_folder, folder_path, read_parameters)
+	# Several workers write in the store : write in a temporary file then rename
+	tmp_path = cache_path + '.' + str(os.getpid())
+	with open(tmp_path, 'wb') as ff:
+		pkl.dump({'parsed_score': parsed_score}, ff, protocol=pkl.HIGHEST_PROTOCOL)
+	os.rename(tmp_path, cache_path)
+	return
@@ -0,0 +1,142 @@
+#!/usr/bin/env python
+# -*- coding: utf-8-unix -*-
+
+"""Node-local copy of a database in shared memory, for jobs running concurrently on the same node.
+The packed stores of the subsets are copied once in /dev/shm (tmpfs), the first job to attach
+writes the copy, the others wait for it. Jobs memory-map these files read-only,
+so their pages are shared and the dataset is held in RAM once per node, not once per job.
+The folder being written holds the PID of its writer : if the writer died, a waiting job removes it and writes the copy.
+
+Remove the copy of a database with :
+	python shared_dataset.py /path/to/Data_bp_bo_tempGran8 --remove
+"""
+
+import os
+import sys
+import time
+import errno
+import shutil
+import hashlib
+from LOP.Database import chunk_store
+
+SHARED_ROOT = '/dev/shm/LOP_datasets'
+WRITER_FILE = 'writer.pid'
+POLL_INTERVAL = 5
+
+
+def get_shared_folder(store_folder):
+	# Depends on the build of the database, so that a rebuild is copied again
+	store_folder = chunk_store.normalize_folder(store_folder)
+	signature = []
+	for subset_name in ['A', 'B', 'C']:
+		subset_folder = os.path.join(store_folder, subset_name)
+		index_path = os.path.join(subset_folder, chunk_store.PACKED_FOLDER, 'index.pkl')
+		if os.path.isfile(index_path):
+			signature.append((subset_name, int(os.stat(index_path).st_mtime)))
+		elif os.path.isdir(subset_folder):
+			signature.append((subset_name, chunk_store.list_chunks(subset_folder)))
+	key = repr((store_folder, signature))
+	return os.path.join(SHARED_ROOT, hashlib.md5(key.encode('utf-8')).hexdigest())
+
+
+def process_alive(pid):
+	try:
+		os.kill(pid, 0)
+	except OSError as e:
+		# EPERM : the process exists, owned by another user
+		return e.errno == errno.EPERM
+	return True
+
+
+def take_lock(shared_folder):
+	# Only one job writes the copy : the one creating the _tmp folder, which then writes its PID in it
+	tmp_folder = shared_folder + '_tmp'
+	try:
+		os.mkdir(tmp_folder)
+	except OSError:
+		return False
+	with open(os.path.join(tmp_folder, WRITER_FILE), 'w') as ff:
+		ff.write(str(os.getpid()))
+	return True
+
+
+def writer_died(shared_folder):
+	tmp_folder = shared_folder + '_tmp'
+	try:
+		with open(os.path.join(tmp_folder, WRITER_FILE), 'r') as ff:
+			pid = int(ff.read())
+	except (IOError, OSError, ValueError):
+		# Folder removed, or PID not written yet
+		return False
+	return not process_alive(pid)
+
+
+def remove_stale_copy(shared_folder):
+	# Moved away first, so that only one of the waiting jobs removes it
+	stale_folder = shared_folder + '_stale_' + str(os.getpid())
+	try:
+		os.rename(shared_folder + '_tmp', stale_folder)
+	except OSError:
+		return
+	shutil.rmtree(stale_folder)
+	return
+
+
+def write_copy(store_folder, shared_folder):
+	tmp_folder = shared_folder + '_tmp'
+	for subset_name in ['A', 'B', 'C']:
+		subset_folder = os.path.join(store_folder, subset_name)
+		packed_folder = os.path.join(subset_folder, chunk_store.PACKED_FOLDER)
+		if os.path.isfile(os.path.join(packed_folder, 'index.pkl')):
+			shutil.copytree(packed_folder, os.path.join(tmp_folder, subset_name))
+		elif os.path.isdir(subset_folder):
+			# Not packed on disk : pack directly in shared memory
+			chunk_store.pack_subset(subset_folder, packed_folder=os.path.join(tmp_folder, subset_name))
+	os.remove(os.path.join(tmp_folder, WRITER_FILE))
+	os.rename(tmp_folder, shared_folder)
+	return
+
+
+def attach(store_folder, logger=None, timeout=3600):
+	"""Make the packed stores of store_folder be read from the shared copy (written if needed).
+	timeout : seconds to wait for a copy written by another job which is still running.
+	Returns the shared folder
+	"""
+	store_folder = chunk_store.normalize_folder(store_folder)
+	shared_folder = get_shared_folder(store_folder)
+	if not os.path.isdir(SHARED_ROOT):
+		try:
+			os.makedirs(SHARED_ROOT)
+		except OSError:
+			pass
+	time_0 = time.time()
+	while not os.path.isdir(shared_folder):
+		if take_lock(shared_folder):
+			if logger is not None:
+				logger.info('Copy the database in ' + shared_folder)
+			write_copy(store_folder, shared_folder)
+		elif writer_died(shared_folder):
+			if logger is not None:
+				logger.info('Writer of ' + shared_folder + ' died, write the copy again')
+			remove_stale_copy(shared_folder)
+		elif time.time() - time_0 > timeout:
+			raise Exception('Timeout while waiting for the shared copy ' + shared_folder + ' (remove ' + shared_folder + '_tmp if no job is writing it)')
+		else:
+			time.sleep(POLL_INTERVAL)
+	chunk_store.set_packed_root(store_folder, shared_folder)
+	return shared_folder
+
+
+def remove(store_folder):
+	shared_folder = get_shared_folder(store_folder)
+	for folder in [shared_folder, shared_folder + '_tmp']:
+		if os.path.isdir(folder):
+			shutil.rmtree(folder)
+	return
+
+
+if __name__ == '__main__':
+	if '--remove' in sys.argv:
+		remove(sys.argv[1])
+	else:
+		attach(sys.argv[1])
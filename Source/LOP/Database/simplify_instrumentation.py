@@ -384,4 +384,27 @@ def get_simplify_mapping():
     #################################################
     #################################################
     #################################################
-    return simplify_mapping
\ No newline at end of file
+    return simplify_mapping
+
+# The mapping is built once per process, and simplified names are memoized
+# for complete (mixed) instrument strings, e.g. "Violin and Viola"
+_simplify_mapping = None
+_simplified_names = {}
+
+
+def simplify_instrumentation(instru_name_complex):
+    global _simplify_mapping
+    if instru_name_complex in _simplified_names:
+        return _simplified_names[instru_name_complex]
+    if _simplify_mapping is None:
+        _simplify_mapping = get_simplify_mapping()
+    instru_name_unmixed = instru_name_complex.split(" and ")
+    simple_name = " and ".join([_simplify_mapping[e] for e in instru_name_unmixed])
+    _simplified_names[instru_name_complex] = simple_name
+    return simple_name
+
+
+def simplify_header(instru):
+    """Simplify a whole csv header row {track_name: instrument_names} in one call
+    """
+    return {k: simplify_instrumentation(v) for k, v in instru.items()}
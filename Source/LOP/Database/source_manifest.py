@@ -0,0 +1,75 @@
+#!/usr/bin/env python
+# -*- coding: utf-8-unix -*-
+
+"""Manifest of the sources of a database, used for incremental rebuilds.
+	manifest = {
+		'build_parameters': {'quantization': 8, 'chunk_size': ..., ...},
+		'instru_mapping': {...},
+		'folders': {
+			'A': {folder_path: {'hash': ..., 'file_counter': 3, 'chunks': [chunk_path, ...]}, ...},
+			'B': ...
+		}
+	}
+Folders whose content hash and build parameters did not change keep their chunks.
+"""
+
+import os
+import glob
+import hashlib
+import pickle as pkl
+
+MANIFEST_NAME = 'source_manifest.pkl'
+
+# Hashes are computed once per run of the build
+_folder_hashes = {}
+
+
+def hash_folder(folder_path):
+	# Content of every file of the folder (midi, xml and csv)
+	if folder_path in _folder_hashes:
+		return _folder_hashes[folder_path]
+	md5 = hashlib.md5()
+	for file_path in sorted(glob.glob(folder_path + '/*')):
+		if not os.path.isfile(file_path):
+			continue
+		md5.update(os.path.basename(file_path).encode('utf-8'))
+		with open(file_path, 'rb') as ff:
+			md5.update(ff.read())
+	_folder_hashes[folder_path] = md5.hexdigest()
+	return _folder_hashes[folder_path]
+
+
+def load(store_folder):
+	manifest_path = os.path.join(store_folder, MANIFEST_NAME)
+	if not os.path.isfile(manifest_path):
+		return None
+	with open(manifest_path, 'rb') as ff:
+		return pkl.load(ff)
+
+
+def save(store_folder, manifest):
+	with open(os.path.join(store_folder, MANIFEST_NAME), 'wb') as ff:
+		pkl.dump(manifest, ff)
+	return
+
+
+def is_reusable(folder_entry, folder_hash):
+	if folder_entry is None:
+		return False
+	if folder_entry['hash'] != folder_hash:
+		return False
+	# Chunks might have been removed by hand
+	return all([os.path.isdir(e) for e in folder_entry['chunks']])
+
+
+def pitch_range_widened(old_mapping, new_mapping):
+	"""True if new_mapping contains an instrument or a pitch out of the ranges of old_mapping.
+	Narrower ranges (e.g. removed folders) are not a reason for rebuilding, the old mapping is kept
+	"""
+	for instru_name, new_range in new_mapping.items():
+		if instru_name not in old_mapping:
+			return True
+		old_range = old_mapping[instru_name]
+		if (new_range['pitch_min'] < old_range['pitch_min']) or (new_range['pitch_max'] > old_range['pitch_max']):
+			return True
+	return False
@@ -0,0 +1,79 @@
+import os
+import hashlib
+import pickle as pkl
+import numpy as np
+import torch
+
+
+class Embedding_cache(object):
+    """Piano embeddings computed once per distinct frame.
+    The same chords come back all along a piece and across the corpus, so frames are
+    deduplicated, only the frames never seen before go through the network, and results
+    are scattered back to the time axis.
+    The table (md5 of the 128-pitch frame -> embedding) is specific to one checkpoint and can be
+    kept on disk in cache_folder, so that it is shared by the subsets A/B/C and by later rebuilds.
+    """
+    def __init__(self, embedding_model, embedding_path, cache_folder=None, batch_size=500, cuda=False):
+        self.embedding_model = embedding_model
+        # Per-frame embeddings : batchnorm must not use the statistics of the batch
+        self.embedding_model.eval()
+        self.batch_size = batch_size
+        self.cuda = cuda
+        if cache_folder is None:
+            self.cache_path = None
+        else:
+            stat = os.stat(embedding_path)
+            key = repr((os.path.abspath(embedding_path), stat.st_size, int(stat.st_mtime)))
+            self.cache_path = os.path.join(cache_folder, hashlib.md5(key.encode('utf-8')).hexdigest() + '.pkl')
+        if (self.cache_path is not None) and os.path.isfile(self.cache_path):
+            with open(self.cache_path, 'rb') as ff:
+                self.table = pkl.load(ff)
+        else:
+            self.table = {}
+        self.num_embedded = 0
+        self.num_frames = 0
+        return
+
+    def embed_frames(self, frames):
+        # frames : (N, 128) float32
+        embedded = []
+        with torch.no_grad():
+            for start_batch_index in range(0, len(frames), self.batch_size):
+                batch = torch.from_numpy(frames[start_batch_index:start_batch_index+self.batch_size]).unsqueeze(1)
+                if self.cuda:
+                    batch = batch.cuda()
+                embedded_TT = self.embedding_model(batch, 0)
+                embedded.append(embedded_TT.cpu().numpy())
+        return np.concatenate(embedded).astype(np.float32)
+
+    def embed(self, pr_piano, pitch_min, pitch_max):
+        """pr_piano : (T, pitch_max-pitch_min) -> (T, embedding_dim) float32
+        """
+        T = len(pr_piano)
+        frames = np.zeros((T, 128), dtype=np.float32) # Embeddings accept size 128 samples
+        frames[:, pitch_min:pitch_max] = pr_piano
+        unique_frames, inverse = np.unique(frames, axis=0, return_inverse=True)
+        keys = [hashlib.md5(e.tobytes()).digest() for e in unique_frames]
+
+        missing = [ind for ind, key in enumerate(keys) if key not in self.table]
+        if len(missing) > 0:
+            missing_embedded = self.embed_frames(unique_frames[missing])
+            for ind, embedding in zip(missing, missing_embedded):
+                self.table[keys[ind]] = embedding
+        self.num_embedded += len(missing)
+        self.num_frames += T
+
+        unique_embedded = np.stack([self.table[key] for key in keys])
+        return unique_embedded[inverse.ravel()]
+
+    def save(self):
+        if self.cache_path is None:
+            return
+        cache_folder = os.path.dirname(self.cache_path)
+        if not os.path.isdir(cache_folder):
+            os.makedirs(cache_folder)
+        tmp_path = self.cache_path + '.tmp'
+        with open(tmp_path, 'wb') as ff:
+            pkl.dump(self.table, ff, protocol=pkl.HIGHEST_PROTOCOL)
+        os.rename(tmp_path, self.cache_path)
+        return
@@ -31,6 +31,8 @@ class Conv_lstm_1(Model_lop):
 		self.gru_orch = list(model_param["gru_orch"])
 		self.gru_orch.append(self.embeddings_size)
 		self.mlp_pred = model_param["mlp_pred"]
+		# The GRU reads the pitch convolutions of the past orchestra frames instead of the raw frames
+		self.gru_on_orch_embedding = model_param.get("gru_on_orch_embedding", False)
 		return
 
 	@staticmethod
@@ -49,6 +51,9 @@ class Conv_lstm_1(Model_lop):
 	def optimize():
 		return True
 	@staticmethod
+	def trainer():
+		return "standard_trainer"
+	@staticmethod
 	def get_hp_space():
 		super_space = Model_lop.get_hp_space()
 
@@ -64,6 +69,27 @@ class Conv_lstm_1(Model_lop):
 		space.update(super_space)
 		return space
 
+	def frame_cache_supported(self):
+		# Only the frame embeddings read by the GRU can be computed once per distinct frame
+		return self.gru_on_orch_embedding
+
+	def embed_orch_frames(self, orch_frames):
+		# Pitch convolutions of orchestra frames (num_frames, orch_dim) -> (num_frames, orch_frame_embedding_dim)
+		with tf.name_scope("pitch_convolution"):
+			with tf.name_scope("0"):
+				conv_layer = Conv1D(self.num_filter_orch[0], self.kernel_size_orch[0], activation='relu')
+				_O1_ = conv_layer(tf.reshape(orch_frames, [-1, self.orch_dim, 1]))
+				keras_layer_summary(conv_layer)
+
+			with tf.name_scope("1"):
+				conv_layer = Conv1D(self.num_filter_orch[1], self.kernel_size_orch[1], activation='relu')
+				_O2_ = conv_layer(_O1_)
+				keras_layer_summary(conv_layer)
+
+			dims_last_layer = _O2_.shape.as_list()
+			self.orch_frame_embedding_dim = dims_last_layer[1]* dims_last_layer[2]
+			return tf.reshape(_O2_, [-1, self.orch_frame_embedding_dim])
+
 	def predict(self, inputs_ph):
 		
 		piano_t, _, _, orch_past, _ = inputs_ph
@@ -95,22 +121,23 @@ class Conv_lstm_1(Model_lop):
 		#####################
 		# Convolutions over pitch axis
 		with tf.name_scope("embedding_orch"):
-			with tf.name_scope("pitch_convolution"):
-				_O0_ = tf.reshape(orch_past, [-1, self.orch_dim])
-				with tf.name_scope("0"):
-					conv_layer = Conv1D(self.num_filter_orch[0], self.kernel_size_orch[0], activation='relu')
-					_O1_ = conv_layer(tf.reshape(_O0_, [-1, self.orch_dim, 1]))
-					keras_layer_summary(conv_layer)
-
-				with tf.name_scope("1"):
-					conv_layer = Conv1D(self.num_filter_orch[1], self.kernel_size_orch[1], activation='relu')
-					_O2_ = conv_layer(_O1_)
-					keras_layer_summary(conv_layer)
-				
-				dims_last_layer = _O2_.shape.as_list()
-				dim_last_layer = dims_last_layer[1]* dims_last_layer[2]
+			if not self.gru_on_orch_embedding:
+				# The pitch convolutions are built, but the GRU reads the raw past orchestra
+				self.embed_orch_frames(tf.reshape(orch_past, [-1, self.orch_dim]))
+				_O3_ = orch_past
+				dim_last_layer = self.orch_dim
+			elif self.orch_frames_input is None:
+				# Every frame of every window
+				_O2_ = self.embed_orch_frames(tf.reshape(orch_past, [-1, self.orch_dim]))
 				# Reshape into (batch, time, features)
-				_O3_ = tf.reshape(_O2_, [-1, self.temporal_order, dim_last_layer])
+				_O3_ = tf.reshape(_O2_, [-1, self.temporal_order-1, self.orch_frame_embedding_dim])
+				dim_last_layer = self.orch_frame_embedding_dim
+			else:
+				# Distinct frames of the batch are embedded once, then gathered in the windows
+				orch_frames, orch_past_index = self.orch_frames_input
+				self.orch_frames_embedding = self.embed_orch_frames(orch_frames)
+				_O3_ = tf.gather(self.orch_frames_embedding, orch_past_index)
+				dim_last_layer = self.orch_frame_embedding_dim
 
 			with tf.name_scope("time_recurrence"):
 				# Recurrence over time axis
@@ -121,7 +148,7 @@ class Conv_lstm_1(Model_lop):
 				
 				with tf.name_scope("0"):
 					x = GRU(self.gru_orch[0], return_sequences=return_sequences, input_shape=(self.temporal_order, dim_last_layer),
-							activation='relu', dropout=self.dropout_probability)(orch_past)
+							activation='relu', dropout=self.dropout_probability)(_O3_)
 				
 				if len(self.gru_orch) > 1:
 					# Intermediates layers
@@ -146,7 +173,7 @@ class Conv_lstm_1(Model_lop):
 			orch_prediction = Dense(self.orch_dim, activation='sigmoid', name='orch_pred')(top_input)
 		#####################
 
-		return orch_prediction
+		return orch_prediction, top_input
 
 
 # "0" : {
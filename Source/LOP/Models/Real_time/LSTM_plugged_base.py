@@ -44,6 +44,13 @@ class LSTM_plugged_base(Model_lop):
     def optimize():
         return True
     @staticmethod
+    def sequence_mode_supported():
+        # In sequence mode, the last GRU returns sequences and the prediction is made at each frame
+        return True
+    @staticmethod
+    def layers_built_once():
+        return True
+    @staticmethod
     def trainer():
         return "standard_trainer"
     @staticmethod
@@ -63,6 +70,8 @@ class LSTM_plugged_base(Model_lop):
     def predict(self, inputs_ph):
 
         piano_t, _, _, orch_past, _ = inputs_ph
+        # Weight summaries on the first call only, the next ones reuse the layers
+        summarize = not self.built_layers
         
         #####################
         # Batch norm
@@ -77,27 +86,29 @@ class LSTM_plugged_base(Model_lop):
         if len(self.n_hs) > 1:
             return_sequences = True
         else:
-            return_sequences = False
+            return_sequences = self.sequence_mode
         
         with tf.name_scope("orch_rnn_0"):
-            gru_layer = GRU(self.n_hs[0], return_sequences=return_sequences, input_shape=(self.temporal_order, self.orch_dim),
-                    activation='relu', dropout=self.dropout_probability)
+            gru_layer = self.get_layer("orch_rnn_0", lambda: GRU(self.n_hs[0], return_sequences=return_sequences, input_shape=(self.temporal_order, self.orch_dim),
+                    activation='relu', dropout=self.dropout_probability))
             x = gru_layer(orch_past)
-            keras_layer_summary(gru_layer)
+            if summarize:
+                keras_layer_summary(gru_layer)
         
         if len(self.n_hs) > 1:
             # Intermediates layers
             for layer_ind in range(1, len(self.n_hs)):
                 # Last layer ?
                 if layer_ind == len(self.n_hs)-1:
-                    return_sequences = False
+                    return_sequences = self.sequence_mode
                 else:
                     return_sequences = True
                 with tf.name_scope("orch_rnn_" + str(layer_ind)):
-                    gru_layer = GRU(self.n_hs[layer_ind], return_sequences=return_sequences,
-                            activation='relu', dropout=self.dropout_probability)
+                    gru_layer = self.get_layer("orch_rnn_" + str(layer_ind), lambda: GRU(self.n_hs[layer_ind], return_sequences=return_sequences,
+                            activation='relu', dropout=self.dropout_probability))
                     x = gru_layer(x)
-                    keras_layer_summary(gru_layer)
+                    if summarize:
+                        keras_layer_summary(gru_layer)
 
         lstm_out = x
         #####################
@@ -106,20 +117,22 @@ class LSTM_plugged_base(Model_lop):
         # gru out and piano(t)
         with tf.name_scope("piano_embedding"):
             piano_t_ = Dropout(self.dropout_probability)(piano_t)
-            dense_layer = Dense(self.n_hs[-1], activation='relu')  # fully-connected layer with 128 units and ReLU activation
+            dense_layer = self.get_layer("piano_embedding", lambda: Dense(self.n_hs[-1], activation='relu'))  # fully-connected layer with 128 units and ReLU activation
             piano_embedding = dense_layer(piano_t_)
-            keras_layer_summary(dense_layer)
+            if summarize:
+                keras_layer_summary(dense_layer)
             
         #####################
 
         #####################
         # Concatenate and predict
         with tf.name_scope("top_layer_prediction"):
-            top_input = keras.layers.concatenate([lstm_out, piano_embedding], axis=1)
+            top_input = keras.layers.concatenate([lstm_out, piano_embedding], axis=-1)
             top_input_drop = Dropout(self.dropout_probability)(top_input)
-            dense_layer = Dense(self.orch_dim, activation='sigmoid', name='orch_pred')
+            dense_layer = self.get_layer("orch_pred", lambda: Dense(self.orch_dim, activation='sigmoid', name='orch_pred'))
             orch_prediction = dense_layer(top_input_drop)
-            keras_layer_summary(dense_layer)
+            if summarize:
+                keras_layer_summary(dense_layer)
         #####################
 
         embedding_concat = top_input
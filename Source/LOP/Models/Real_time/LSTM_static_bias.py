@@ -52,6 +52,10 @@ class LSTM_static_bias(Model_lop):
     def optimize():
         return True
     @staticmethod
+    def sequence_mode_supported():
+        # In sequence mode, the last GRU returns sequences and the prediction is made at each frame
+        return True
+    @staticmethod
     def trainer():
         return "standard_trainer"
     @staticmethod
@@ -85,7 +89,7 @@ class LSTM_static_bias(Model_lop):
         if len(self.n_hs) > 1:
             return_sequences = True
         else:
-            return_sequences = False
+            return_sequences = self.sequence_mode
         
         with tf.name_scope("orch_rnn_0"):
             gru_layer = GRU(self.n_hs[0], return_sequences=return_sequences, input_shape=(self.temporal_order, self.orch_dim),
@@ -98,7 +102,7 @@ class LSTM_static_bias(Model_lop):
             for layer_ind in range(1, len(self.n_hs)):
                 # Last layer ?
                 if layer_ind == len(self.n_hs)-1:
-                    return_sequences = False
+                    return_sequences = self.sequence_mode
                 else:
                     return_sequences = True
                 with tf.name_scope("orch_rnn_" + str(layer_ind)):
@@ -123,7 +127,7 @@ class LSTM_static_bias(Model_lop):
         #####################
         # Concatenate and predict
         with tf.name_scope("top_layer_prediction"):
-            top_input = keras.layers.concatenate([lstm_out, piano_embedding], axis=1)
+            top_input = keras.layers.concatenate([lstm_out, piano_embedding], axis=-1)
             top_input_drop = Dropout(self.dropout_probability)(top_input)
             # First, just the linear part
             dense_layer = Dense(self.orch_dim, activation='linear', name='orch_pred')
@@ -5,10 +5,11 @@ import tensorflow as tf
 from keras.layers import Dense
 from LOP.Models.Utils.weight_summary import keras_layer_summary
 
-def MLP(x, layers, activation='relu'):
-	for layer_ind, num_unit in enumerate(layers):
-		with tf.variable_scope(str(layer_ind)):
-			dense_layer = Dense(num_unit, activation=activation)
-			x = dense_layer(x)
-			keras_layer_summary(dense_layer)
+def MLP(x, layers, name="MLP", activation='relu'):
+	with tf.variable_scope(name):
+		for layer_ind, num_unit in enumerate(layers):
+			with tf.variable_scope(str(layer_ind)):
+				dense_layer = Dense(num_unit, activation=activation)
+				x = dense_layer(x)
+				keras_layer_summary(dense_layer)
 	return x
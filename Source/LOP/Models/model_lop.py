@@ -26,8 +26,36 @@ class Model_lop(object):
 		########################
 
 		self.params = []
+
+		# Predictions for every frame of sequences (batch, time, dim) instead of windows,
+		# set by train for the models supporting it
+		self.sequence_mode = False
+		# (orch_frames, orch_past_index) : distinct frames of the past orchestra and their positions in the windows,
+		# set by the trainer for the models supporting it (frame cache), which then embed each frame once
+		self.orch_frames_input = None
+		# Layers of the models building them once (layers_built_once), by name
+		self.built_layers = {}
 		return
 
+	def get_layer(self, name, build):
+		# Layer built on the first call of predict and reused by the next ones
+		if name not in self.built_layers:
+			self.built_layers[name] = build()
+		return self.built_layers[name]
+
+	@staticmethod
+	def sequence_mode_supported():
+		return False
+
+	@staticmethod
+	def frame_cache_supported():
+		return False
+
+	@staticmethod
+	def layers_built_once():
+		# predict can be called again on other inputs with the same weights
+		return False
+
 	@staticmethod
 	def get_hp_space():
 		space_training = {'temporal_order': hopt_wrapper.qloguniform_int('temporal_order', log(3), log(20), 1)}
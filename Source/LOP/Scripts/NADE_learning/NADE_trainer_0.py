@@ -101,7 +101,8 @@ class NADE_trainer_0(Standard_trainer):
 		self.orch_pred = tf.get_collection('orch_pred')[0]
 		return
 
-	def training_step(self, sess, batch_index, piano, orch, mask_orch, summarize_dict):
+	def training_step(self, sess, batch_index, piano, orch, mask_orch, summarize_dict, diagnostics=True):
+		# diagnostics=False : only the train op and the loss are fetched (preds, debug_outputs and summary are None)
 		feed_dict, orch_t = Standard_trainer.build_feed_dict(self, batch_index, piano, orch, duration_piano, mask_orch)
 		feed_dict[self.keras_learning_phase] = True
 		
@@ -122,6 +123,10 @@ class NADE_trainer_0(Standard_trainer):
 		SUMMARIZE = summarize_dict['bool']
 		merged_node = summarize_dict['merged_node']
 		
+		if not diagnostics:
+			_, loss_batch = sess.run([self.train_step, self.loss], feed_dict)
+			return loss_batch, None, None, None
+
 		if SUMMARIZE:
 			_, loss_batch, preds_batch, sparse_loss_batch, summary = sess.run([self.train_step, self.loss, self.preds, self.sparse_loss_mean, merged_node], feed_dict)
 		else:
@@ -2,6 +2,7 @@
 # -*- coding: utf8 -*-
 
 from load_matrices import load_matrices
+from LOP.Utils.build_batch import append_duration
 import time
 
 
@@ -13,4 +14,8 @@ def async_load_mat(normalizer, chunk_path_list, parameters):
     # Normalization
     if not parameters["embedded_piano"]:
     	piano_input = normalizer.transform(piano_input)
-    return piano_input, orch, duration_piano, mask_orch
+    # Durations are appended to the piano once per block, batches only gather rows
+    # (None is returned in place of the durations, already in piano_input)
+    if duration_piano is not None:
+        piano_input = append_duration(piano_input, duration_piano)
+    return piano_input, orch, None, mask_orch
@@ -0,0 +1,47 @@
+#!/usr/bin/env python
+# -*- coding: utf8 -*-
+
+import threading
+from collections import OrderedDict
+
+
+class Block_cache(object):
+    """Least recently used matrices, within a budget in bytes.
+    Shared by the threads of the process (prefetchers), hence the lock.
+    """
+    def __init__(self, budget=0):
+        self.budget = budget
+        self.entries = OrderedDict()
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.lock = threading.Lock()
+        return
+
+    def get(self, key):
+        with self.lock:
+            if key in self.entries:
+                value = self.entries.pop(key)
+                # Most recently used at the end
+                self.entries[key] = value
+                self.hits += 1
+                return value
+            self.misses += 1
+            return None
+
+    def put(self, key, value):
+        nbytes = value.nbytes
+        with self.lock:
+            if (nbytes > self.budget) or (key in self.entries):
+                return
+            while self.size + nbytes > self.budget:
+                _, evicted = self.entries.popitem(last=False)
+                self.size -= evicted.nbytes
+                self.evictions += 1
+            self.entries[key] = value
+            self.size += nbytes
+        return
+
+    def stats(self):
+        return "{} hits, {} misses, {} evictions, {:.1f} MB cached".format(self.hits, self.misses, self.evictions, self.size / 2.**20)
@@ -24,6 +24,7 @@ from LOP_database.utils.reconstruct_pr import instrument_reconstruction, instrum
 
 # Embeddings
 from LOP.Embedding.EmbedModel import embedDenseNet, ChordLevelAttention
+from LOP.Embedding.embedding_cache import Embedding_cache
 
 def load_from_pair(tracks_path, quantization, binarize_piano, binarize_orch, temporal_granularity):
     ############################################################
@@ -140,12 +141,9 @@ def generate_midi(config_folder, score_source, number_of_version, duration_gen,
         embedding_model = embedDenseNet(380, 12, (1500,500), 100, 1500, 2, 3, 12, 0.5, 0, False, True)
         embedding_model.load_state_dict(torch.load(embedding_path))
 
-        # Build embedding (no need to batch here, len(pr_piano_gen) is sufficiently small)
-        piano_resize_emb = np.zeros((len(pr_piano_gen), 1, 128)) # Embeddings accetp size 128 samples
-        piano_resize_emb[:, 0, instru_mapping['Piano']['pitch_min']:instru_mapping['Piano']['pitch_max']] = pr_piano_gen
-        piano_resize_emb_TT = torch.tensor(piano_resize_emb)
-        piano_embedded_TT = embedding_model(piano_resize_emb_TT.float(), 0)
-        pr_piano_gen_embedded = piano_embedded_TT.numpy()
+        # Build embedding, same procedure as when building the database
+        embedding_cache = Embedding_cache(embedding_model, embedding_path)
+        pr_piano_gen_embedded = embedding_cache.embed(pr_piano_gen, instru_mapping['Piano']['pitch_min'], instru_mapping['Piano']['pitch_max'])
     else:
         pr_piano_gen_embedded = pr_piano_gen
     time_embedding = time.time() - time_embedding
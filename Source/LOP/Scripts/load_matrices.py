@@ -2,72 +2,187 @@
 # -*- coding: utf8 -*-
 
 import numpy as np
-import re
 import os
+from LOP.Database import chunk_store
+from LOP.Utils import bit_packing
+from LOP.Utils.virtual_matrix import Virtual_matrix
+from LOP.Scripts.block_cache import Block_cache
 
-def load_matrices(chunk_path_list, parameters):
+# Process-wide cache of loaded matrices, budget given by parameters["block_cache_budget"] (GB, 0 disables it)
+block_cache = Block_cache()
+
+def piano_array_name(parameters):
+    # Array fed to the model as piano input
+    if parameters["embedded_piano"]:
+        return 'pr_piano_embedded'
+    return 'pr_piano'
+
+def required_arrays(parameters):
+    """Arrays of the chunks used by a training run, the others are never read
+    """
+    arrays = [piano_array_name(parameters), 'pr_orch']
+    if parameters["duration_piano"]:
+        arrays.append('duration_piano')
+    if parameters["mask_orch"]:
+        arrays.append('mask_orch')
+    return arrays
+
+def output_position(array_name):
+    # Position of an array in the outputs of load_matrices
+    return {'pr_piano': 0, 'pr_piano_embedded': 0, 'pr_orch': 1, 'duration_piano': 2, 'mask_orch': 3}[array_name]
+
+def load_matrices(chunk_path_list, parameters, arrays=None):
     """Input : 
         - chunk_path_list : list of splitted matrices to be concatenated
+        - arrays : names of the arrays to read (see required_arrays, default).
+            Outputs corresponding to arrays which are not read are None
 
     This function build the matrix corresponing to a coherent ensemble of files, for example only train files
+    Matrices are kept in block_cache, one entry per block and array, so that epochs and data statistics
+    do not read the same blocks again (memory-mapped matrices are not cached, they are already in the page cache)
     """
+    if arrays is None:
+        arrays = required_arrays(parameters)
+    block_cache.budget = parameters.get("block_cache_budget", 0) * 2**30
+    if (block_cache.budget == 0) or parameters.get("mmap_matrices", False):
+        return load_matrices_uncached(chunk_path_list, parameters, arrays)
+
+    # The representation of the arrays depends on these parameters (see load_matrices_uncached)
+    key_parameters = (parameters["embedded_piano"], parameters["duration_piano"], parameters.get("normalizer"))
+    outputs = [None, None, None, None]
+    missing = []
+    for name in arrays:
+        outputs[output_position(name)] = block_cache.get((tuple(chunk_path_list), name, key_parameters))
+        if outputs[output_position(name)] is None:
+            missing.append(name)
+    if len(missing) > 0:
+        loaded = load_matrices_uncached(chunk_path_list, parameters, missing)
+        for name in missing:
+            outputs[output_position(name)] = loaded[output_position(name)]
+            block_cache.put((tuple(chunk_path_list), name, key_parameters), loaded[output_position(name)])
+    return tuple(outputs)
+
+def load_matrices_uncached(chunk_path_list, parameters, arrays):
+    piano_name = piano_array_name(parameters)
+    load_piano = piano_name in arrays
+    load_orch = 'pr_orch' in arrays
+    load_duration_piano = 'duration_piano' in arrays
+    load_mask_orch = 'mask_orch' in arrays
+
+    if parameters.get("mmap_matrices", False):
+        return load_matrices_mmap(chunk_path_list, parameters, arrays)
+
     tt=0
     T_max = len(chunk_path_list)*parameters["chunk_size"] 
-    orch_transformed = np.zeros((T_max, parameters["N_orchestra"]), dtype=np.float16)
-    if parameters["embedded_piano"]:
-        piano_input = np.zeros((T_max, parameters["N_piano_embedded"]), dtype=np.float16)
-    else:
-        piano_input = np.zeros((T_max, parameters["N_piano"]), dtype=np.float16)
 
-    if parameters["duration_piano"]:
+    # Bit-packed databases (binary pianorolls stored with np.packbits)
+    # Orchestra stays packed in memory, rows are unpacked in build_batch.
+    # Piano too, but only when it is fed as is to the model (no embedding, duration or normalization)
+    stored_packed_piano = parameters.get("bitpacked_piano", False)
+    stored_packed_orch = parameters.get("bitpacked_orch", False)
+    keep_packed_piano = stored_packed_piano and (not parameters["embedded_piano"]) and (not parameters["duration_piano"])\
+        and (parameters.get("normalizer") == "no_normalization")
+    
+    if load_orch:
+        if stored_packed_orch:
+            orch_transformed = np.zeros((T_max, bit_packing.num_bytes(parameters["N_orchestra"])), dtype=np.uint8)
+        else:
+            orch_transformed = np.zeros((T_max, parameters["N_orchestra"]), dtype=np.float16)
+    if load_piano:
+        if parameters["embedded_piano"]:
+            piano_input = np.zeros((T_max, parameters["N_piano_embedded"]), dtype=np.float16)
+        elif keep_packed_piano:
+            piano_input = np.zeros((T_max, bit_packing.num_bytes(parameters["N_piano"])), dtype=np.uint8)
+        else:
+            piano_input = np.zeros((T_max, parameters["N_piano"]), dtype=np.float16)
+
+    if load_duration_piano:
         duration_piano = np.zeros((T_max,), dtype=np.float16)
 
-    if parameters["mask_orch"]:
+    if load_mask_orch:
         mask_orch = np.zeros((T_max, parameters["N_orchestra"]), dtype=np.float16)
     
     for block_folder in chunk_path_list:
-        piano_transformed_PART, piano_embedded_PART, orch_transformed_PART, duration_piano_PART, mask_orch_PART = load_matrix_NO_PROCESSING(block_folder, parameters['duration_piano'], parameters["mask_orch"])
-        length = piano_transformed_PART.shape[0]
-        if parameters["embedded_piano"]:
-            piano_input[tt:tt+length]=piano_embedded_PART
-        else:
-            piano_input[tt:tt+length]=piano_transformed_PART
-        orch_transformed[tt:tt+length]=orch_transformed_PART
-        if parameters["duration_piano"]:
-            duration_piano[tt:tt+length]=duration_piano_PART
-        if parameters["mask_orch"]:
-            mask_orch[tt:tt+length]=mask_orch_PART
+        PARTS = load_chunk_arrays(block_folder, arrays)
+        length = len(PARTS[arrays[0]])
+        if load_piano:
+            if stored_packed_piano and (not parameters["embedded_piano"]) and (not keep_packed_piano):
+                piano_input[tt:tt+length]=bit_packing.unpack(PARTS[piano_name], parameters["N_piano"])
+            else:
+                piano_input[tt:tt+length]=PARTS[piano_name]
+        if load_orch:
+            orch_transformed[tt:tt+length]=PARTS['pr_orch']
+        if load_duration_piano:
+            duration_piano[tt:tt+length]=PARTS['duration_piano']
+        if load_mask_orch:
+            mask_orch[tt:tt+length]=PARTS['mask_orch']
         tt += length
 
     # Crop the last part (some chunks will be smaller than parameters["chunk_size"] )
-    piano_input_cropped=piano_input[:tt]
-    orch_transformed_cropped=orch_transformed[:tt]
-    if parameters["mask_orch"]:
+    if load_piano:
+        piano_input_cropped=piano_input[:tt]
+        if keep_packed_piano:
+            piano_input_cropped = bit_packing.Bit_packed_matrix(piano_input_cropped, parameters["N_piano"])
+    else:
+        piano_input_cropped = None
+    if load_orch:
+        orch_transformed_cropped=orch_transformed[:tt]
+        if stored_packed_orch:
+            orch_transformed_cropped = bit_packing.Bit_packed_matrix(orch_transformed_cropped, parameters["N_orchestra"])
+    else:
+        orch_transformed_cropped = None
+    if load_mask_orch:
         mask_orch_cropped=mask_orch[:tt]
     else:
         mask_orch_cropped=None
-    if parameters["duration_piano"]:
+    if load_duration_piano:
         duration_piano_cropped=duration_piano[:tt]
     else:
         duration_piano_cropped = None
 
     return piano_input_cropped, orch_transformed_cropped, duration_piano_cropped, mask_orch_cropped
 
-def load_matrix_NO_PROCESSING(block_folder, duration_piano_bool, mask_orch_bool):    
-    piano_file = os.path.join(block_folder, 'pr_piano.npy')
-    orch_file = re.sub('piano', 'orch', piano_file)
-    piano_embedded_file = re.sub('piano', 'piano_embedded', piano_file)
-    duration_piano_file = re.sub('pr_piano', 'duration_piano', piano_file)
-
-    pr_piano_transformed = np.load(piano_file)
-    pr_piano_embedded = np.load(piano_embedded_file)
-    pr_orch_transformed = np.load(orch_file)
-    duration_piano = np.load(duration_piano_file)
+def load_matrices_mmap(chunk_path_list, parameters, arrays):
+    """Same as load_matrices, but chunks are memory-mapped and exposed as one virtual matrix :
+    no buffer is allocated and nothing is copied, build_batch gathers its rows directly in the chunks.
+    """
+    piano_name = piano_array_name(parameters)
+    PARTS = {name: [] for name in arrays}
+    for block_folder in chunk_path_list:
+        this_PARTS = load_chunk_arrays(block_folder, arrays, mmap_mode='r')
+        for name in arrays:
+            PARTS[name].append(this_PARTS[name])
 
-    if mask_orch_bool:
-        mask_orch_file = re.sub('piano', 'mask_orch', piano_file)
-        mask_orch = np.load(mask_orch_file)
-    else:
-        mask_orch = None
+    piano_input = None
+    if piano_name in arrays:
+        if parameters.get("bitpacked_piano", False) and (not parameters["embedded_piano"]):
+            piano_input = bit_packing.Bit_packed_matrix(Virtual_matrix(PARTS[piano_name]), parameters["N_piano"])
+        else:
+            piano_input = Virtual_matrix(PARTS[piano_name], dtype=np.float16)
+        if (not parameters["embedded_piano"]) and (parameters.get("normalizer") != "no_normalization"):
+            # The normalizer transforms the whole block anyway
+            piano_input = np.asarray(piano_input)
+    orch_transformed = None
+    if 'pr_orch' in arrays:
+        if parameters.get("bitpacked_orch", False):
+            orch_transformed = bit_packing.Bit_packed_matrix(Virtual_matrix(PARTS['pr_orch']), parameters["N_orchestra"])
+        else:
+            orch_transformed = Virtual_matrix(PARTS['pr_orch'], dtype=np.float16)
+    duration_piano = None
+    if 'duration_piano' in arrays:
+        # One value per frame, small enough to be kept as a real array
+        duration_piano = np.concatenate(PARTS['duration_piano']).astype(np.float16)
+    mask_orch = None
+    if 'mask_orch' in arrays:
+        mask_orch = Virtual_matrix(PARTS['mask_orch'], dtype=np.float16)
+    return piano_input, orch_transformed, duration_piano, mask_orch
 
-    return pr_piano_transformed, pr_piano_embedded, pr_orch_transformed, duration_piano, mask_orch
\ No newline at end of file
+def load_chunk_arrays(block_folder, arrays, mmap_mode=None):
+    """Read only the listed arrays of a chunk ('pr_piano', 'pr_piano_embedded', 'pr_orch', 'duration_piano', 'mask_orch')
+    Returns a dictionary name -> array
+    """
+    # Packed subsets : memory-mapped slices of the subset arrays
+    store = chunk_store.get_store(block_folder)
+    if store is not None:
+        return {name: store.load_chunk(block_folder, name) for name in arrays}
+    return {name: np.load(os.path.join(block_folder, name + '.npy'), mmap_mode=mmap_mode) for name in arrays}
@@ -0,0 +1,66 @@
+#!/usr/bin/env python
+# -*- coding: utf8 -*-
+
+import time
+from collections import deque
+from multiprocessing import Pool
+from multiprocessing.pool import ThreadPool
+
+from LOP.Scripts.asynchronous_load_mat import async_load_mat
+
+
+def prefetch_options(parameters):
+	# Defaults reproduce the former loader : one thread, one block loaded in advance
+	return {'num_workers': parameters.get("prefetch_workers", 1),
+		'depth': parameters.get("prefetch_depth", 1),
+		'processes': parameters.get("prefetch_processes", False)}
+
+
+class Block_prefetcher(object):
+	"""Loads the blocks of a split in advance, in their order of use.
+	Blocks (list of chunks folders) are loaded and normalized by num_workers threads (or processes),
+	at most depth blocks are loaded or being loaded ahead of the one used by the trainer.
+	blocked_time is the time spent by the trainer waiting for a block.
+	cyclic : after the last block, start again from the first one (training epochs)
+	"""
+	def __init__(self, normalizer, parameters, blocks_chunks_folders, cyclic=False, num_workers=1, depth=1, processes=False):
+		self.normalizer = normalizer
+		self.parameters = parameters
+		self.blocks_chunks_folders = blocks_chunks_folders
+		self.cyclic = cyclic
+		self.depth = max(1, depth)
+		if processes:
+			self.pool = Pool(processes=num_workers)
+		else:
+			self.pool = ThreadPool(processes=num_workers)
+		self.pending = deque()
+		self.next_block = 0
+		self.blocked_time = 0.
+		for _ in range(self.depth):
+			self.submit()
+		return
+
+	def submit(self):
+		N_blocks = len(self.blocks_chunks_folders)
+		if (not self.cyclic) and (self.next_block >= N_blocks):
+			return
+		chunks_folders = self.blocks_chunks_folders[self.next_block % N_blocks]
+		self.pending.append(self.pool.apply_async(async_load_mat, (self.normalizer, chunks_folders, self.parameters)))
+		self.next_block += 1
+		return
+
+	def get(self):
+		"""Matrices of the next block : piano_input (durations appended), orch, None, mask_orch
+		"""
+		time_0 = time.time()
+		matrices = self.pending.popleft().get()
+		self.blocked_time += time.time() - time_0
+		self.submit()
+		return matrices
+
+	def close(self):
+		# Blocks loaded in advance and not used are dropped
+		self.pending.clear()
+		self.pool.terminate()
+		self.pool.join()
+		return
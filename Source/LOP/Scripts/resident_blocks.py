@@ -0,0 +1,77 @@
+#!/usr/bin/env python
+# -*- coding: utf8 -*-
+
+import os
+import shutil
+import numpy as np
+
+from LOP.Scripts.prefetch_queue import Block_prefetcher, prefetch_options
+from LOP.Utils.bit_packing import Bit_packed_matrix
+
+
+def materialize(matrix):
+	# Real arrays in memory (virtual matrices read all their rows)
+	if matrix is None:
+		return None
+	if isinstance(matrix, Bit_packed_matrix):
+		return Bit_packed_matrix(np.asarray(matrix.packed), matrix.dim, matrix.dtype)
+	return np.asarray(matrix)
+
+
+def spill(matrix, path):
+	# Write on disk and memory-map
+	if matrix is None:
+		return None
+	if isinstance(matrix, Bit_packed_matrix):
+		np.save(path, np.asarray(matrix.packed))
+		return Bit_packed_matrix(np.load(path, mmap_mode='r'), matrix.dim, matrix.dtype)
+	np.save(path, matrix)
+	return np.load(path, mmap_mode='r')
+
+
+class Resident_blocks(object):
+	"""Blocks of a split (typically validation) loaded and normalized once, then kept for the whole training run.
+	Blocks are kept in memory as long as their total size stays below memory_budget (bytes),
+	the next ones are spilled to memory-mapped files in spill_folder.
+	The first pass reads the blocks in order, through a Block_prefetcher.
+	"""
+	def __init__(self, normalizer, parameters, blocks_chunks_folders, memory_budget, spill_folder):
+		self.normalizer = normalizer
+		self.parameters = parameters
+		self.blocks_chunks_folders = blocks_chunks_folders
+		self.memory_budget = memory_budget
+		self.spill_folder = spill_folder
+		self.blocks = {}
+		self.resident_bytes = 0
+		self.num_spilled = 0
+		self.prefetcher = None
+		return
+
+	def get(self, block_ind):
+		if block_ind in self.blocks:
+			return self.blocks[block_ind]
+		if self.prefetcher is None:
+			self.prefetcher = Block_prefetcher(self.normalizer, self.parameters, self.blocks_chunks_folders[block_ind:], **prefetch_options(self.parameters))
+		matrices = [materialize(e) for e in self.prefetcher.get()]
+		if len(self.blocks) + 1 == len(self.blocks_chunks_folders):
+			self.prefetcher.close()
+			self.prefetcher = None
+
+		size = sum([e.nbytes for e in matrices if e is not None])
+		if self.resident_bytes + size <= self.memory_budget:
+			self.resident_bytes += size
+		else:
+			if not os.path.isdir(self.spill_folder):
+				os.makedirs(self.spill_folder)
+			matrices = [spill(e, os.path.join(self.spill_folder, '{}_{}.npy'.format(block_ind, matrix_ind))) for matrix_ind, e in enumerate(matrices)]
+			self.num_spilled += 1
+		self.blocks[block_ind] = tuple(matrices)
+		return self.blocks[block_ind]
+
+	def close(self):
+		if self.prefetcher is not None:
+			self.prefetcher.close()
+		self.blocks = {}
+		if os.path.isdir(self.spill_folder):
+			shutil.rmtree(self.spill_folder)
+		return
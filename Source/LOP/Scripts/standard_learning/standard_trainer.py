@@ -1,6 +1,7 @@
 #!/usr/bin/env python
 # -*- coding: utf8 -*-
 
+import weakref
 import tensorflow as tf
 import numpy as np
 import keras
@@ -8,32 +9,140 @@ from keras import backend as K
 
 import LOP.Scripts.config as config
 from LOP.Utils.training_error import accuracy_low_TN_tf, bin_Xent_tf, bin_Xen_weighted_0_tf, accuracy_tf, sparsity_penalty_l1, sparsity_penalty_l2, bin_Xen_weighted_1_tf
-from LOP.Utils.build_batch import build_batch
+from LOP.Utils.build_batch import Window_batch_builder, build_orch_frames, append_duration
+from LOP.Utils.sequence_batch import build_sequence_batch, build_window_sequence_batch
+
+def input_node(default, shape, name, dtype=tf.float32):
+	# Input placeholder, or an input computed in the graph which can still be fed
+	if default is None:
+		return tf.placeholder(dtype, shape=shape, name=name)
+	return tf.placeholder_with_default(default, shape=shape, name=name)
 
 class Standard_trainer(object):
 	
 	def __init__(self, **kwargs):
 		self.temporal_order = kwargs["temporal_order"]
+		self.batch_builder = Window_batch_builder(self.temporal_order)
+		# Training blocks copied in the graph, batches assembled by gather ops
+		self.graph_batches = kwargs.get("graph_batches", False)
+		self.block_in_graph = None
+		# In-graph loop of training steps (build_staged_steps_node)
+		self.staged_losses = None
+		# Sequence mode : batches are segments of the blocks, predictions for all their frames in one pass
+		self.sequence_mode = kwargs.get("sequence_mode", False)
+		# Frame cache : distinct past orchestra frames are fed once with their positions in the windows,
+		# for the models embedding frames independently (conv_lstm_1)
+		self.frame_cache = kwargs.get("frame_cache", False)
+		self.frame_keys = None
+		self.generation_cache = None
 		return
 
 	def build_variables_nodes(self, model, parameters):
 		# Build nodes
 		# Inputs
-		self.piano_t_ph = tf.placeholder(tf.float32, shape=(None, model.piano_dim), name="piano_t")
-		self.piano_past_ph = tf.placeholder(tf.float32, shape=(None, self.temporal_order-1, model.piano_dim), name="piano_past")
-		self.piano_future_ph = tf.placeholder(tf.float32, shape=(None, self.temporal_order-1, model.piano_dim), name="piano_future")
+		if self.graph_batches:
+			defaults = self.build_block_nodes(model)
+		else:
+			defaults = {}
+		if self.sequence_mode:
+			# piano_t and orch_past are sequences : piano at each frame, orchestra at the previous one
+			self.targets_ph = tf.placeholder(tf.bool, shape=(None, None), name="targets")
+			piano_t_shape = (None, None, model.piano_dim)
+			orch_past_shape = (None, None, model.orch_dim)
+		else:
+			piano_t_shape = (None, model.piano_dim)
+			orch_past_shape = (None, self.temporal_order-1, model.orch_dim)
+		self.piano_t_ph = input_node(defaults.get('piano_t'), shape=piano_t_shape, name="piano_t")
+		self.piano_past_ph = input_node(defaults.get('piano_past'), shape=(None, self.temporal_order-1, model.piano_dim), name="piano_past")
+		self.piano_future_ph = input_node(defaults.get('piano_future'), shape=(None, self.temporal_order-1, model.piano_dim), name="piano_future")
 		#
-		self.orch_t_ph = tf.placeholder(tf.float32, shape=(None, model.orch_dim), name="orch_t")
-		self.orch_past_ph = tf.placeholder(tf.float32, shape=(None, self.temporal_order-1, model.orch_dim), name="orch_past")
-		self.orch_future_ph = tf.placeholder(tf.float32, shape=(None, self.temporal_order-1, model.orch_dim), name="orch_past")
+		self.orch_t_ph = input_node(defaults.get('orch_t'), shape=(None, model.orch_dim), name="orch_t")
+		self.orch_past_ph = input_node(defaults.get('orch_past'), shape=orch_past_shape, name="orch_past")
+		self.orch_future_ph = input_node(defaults.get('orch_future'), shape=(None, self.temporal_order-1, model.orch_dim), name="orch_past")
 		# Orchestral mask
-		self.mask_orch_ph = tf.placeholder(tf.float32, shape=(None, model.orch_dim), name="mask_orch")
+		self.mask_orch_ph = input_node(defaults.get('mask_orch'), shape=(None, model.orch_dim), name="mask_orch")
+		if self.frame_cache:
+			self.orch_frames_ph = input_node(defaults.get('orch_frames'), shape=(None, model.orch_dim), name="orch_frames")
+			self.orch_past_index_ph = input_node(defaults.get('orch_past_index'), shape=(None, self.temporal_order-1), name="orch_past_index", dtype=tf.int32)
+			model.orch_frames_input = (self.orch_frames_ph, self.orch_past_index_ph)
+		return
+
+	def build_block_nodes(self, model):
+		# The current block is copied once in local (not saved) variables by load_block,
+		# then a training step only feeds the batch indices : the inputs are gathered in the graph.
+		# Returns the gathered inputs, used as defaults of the input placeholders
+		with tf.name_scope('block'):
+			self.batch_index_ph = tf.placeholder(tf.int32, shape=(None,), name="batch_index")
+			dims = [model.piano_dim, model.orch_dim, model.orch_dim]
+			self.block_phs = [tf.placeholder(tf.float32, shape=(None, dim), name=name) for name, dim in zip(["piano_block", "orch_block", "mask_orch_block"], dims)]
+			block_variables = [tf.Variable(tf.zeros((0, dim)), trainable=False, validate_shape=False, collections=[tf.GraphKeys.LOCAL_VARIABLES]) for dim in dims]
+			self.load_block_op = tf.group(*[tf.assign(variable, ph, validate_shape=False) for variable, ph in zip(block_variables, self.block_phs)])
+			self.block_tensors = [tf.reshape(variable, [-1, dim]) for variable, dim in zip(block_variables, dims)]
+			return self.gather_batch(self.batch_index_ph)
+
+	def gather_batch(self, batch_index):
+		# Inputs of a batch gathered from the block copied in the graph
+		piano_block, orch_block, mask_orch_block = self.block_tensors
+		with tf.name_scope('gather_batch'):
+			# Same indices as build_batch
+			past_index = tf.expand_dims(batch_index, 1) + tf.range(-(self.temporal_order-1), 0)
+			future_index = tf.expand_dims(batch_index, 1) + tf.range(1, self.temporal_order)
+			orch_t = tf.gather(orch_block, batch_index)
+			defaults = {'piano_t': tf.gather(piano_block, batch_index),
+				'piano_past': tf.gather(piano_block, past_index),
+				'piano_future': tf.gather(piano_block, future_index),
+				'orch_t': orch_t,
+				'orch_past': tf.gather(orch_block, past_index),
+				'orch_future': tf.gather(orch_block, future_index),
+				# Empty mask block : no mask
+				'mask_orch': tf.cond(tf.size(mask_orch_block) > 0, lambda: tf.gather(mask_orch_block, batch_index), lambda: tf.ones_like(orch_t))}
+			if self.frame_cache:
+				frame_times, frame_index = tf.unique(tf.reshape(past_index, [-1]))
+				defaults['orch_frames'] = tf.gather(orch_block, frame_times)
+				defaults['orch_past_index'] = tf.reshape(frame_index, tf.shape(past_index))
+		return defaults
+
+	def load_block(self, sess, piano, orch, mask_orch):
+		"""Copy the matrices of a block in the graph (graph_batches).
+		build_feed_dict then only feeds the batch indices for this block
+		"""
+		orch_array = np.asarray(orch, dtype=np.float32)
+		if mask_orch is None:
+			mask_orch_array = np.zeros((0, orch_array.shape[1]), dtype=np.float32)
+		else:
+			mask_orch_array = np.asarray(mask_orch, dtype=np.float32)
+		feed_dict = {self.block_phs[0]: np.asarray(piano, dtype=np.float32),
+			self.block_phs[1]: orch_array,
+			self.block_phs[2]: mask_orch_array}
+		sess.run(self.load_block_op, feed_dict)
+		# Weak references : the block in the graph does not keep the loaded matrices alive
+		self.block_in_graph = (weakref.ref(piano), weakref.ref(orch))
 		return
 
+	def training_steps(self, sess, batches):
+		"""Training steps on the block copied by load_block, one per batch of indices in batches,
+		all run by the in-graph loop of build_staged_steps_node in one call.
+		Returns the losses of the steps
+		"""
+		lengths = np.array([len(e) for e in batches], dtype=np.int32)
+		# (K, batch) indices, the shorter batches are padded
+		staged_batches = np.zeros((len(batches), lengths.max()), dtype=np.int32)
+		for staged_batch, batch, length in zip(staged_batches, batches, lengths):
+			staged_batch[:length] = batch
+		feed_dict = {self.staged_batches_ph: staged_batches,
+			self.staged_lengths_ph: lengths,
+			self.keras_learning_phase: True}
+		return sess.run(self.staged_losses, feed_dict)
+
 	def build_preds_nodes(self, model):
 		inputs_ph = (self.piano_t_ph, self.piano_past_ph, self.piano_future_ph, self.orch_past_ph, self.orch_future_ph)
 		# Prediction
 		self.preds, self.embedding_concat = model.predict(inputs_ph)
+		if self.sequence_mode:
+			# Predictions at the targets only : (num_targets, orch_dim), as in the windowed mode
+			self.preds = tf.boolean_mask(self.preds, self.targets_ph)
+		if self.frame_cache:
+			self.orch_frames_embedding = model.orch_frames_embedding
 		return
 	
 	def build_distance(self, model, parameters):
@@ -106,6 +215,41 @@ class Standard_trainer(object):
 			self.train_step = None
 		self.keras_learning_phase = K.learning_phase()
 		return
+
+	def build_staged_steps_node(self, model, parameters, optimizer):
+		"""tf.while_loop running one training step per row of a (K, batch) tensor of indices
+		in the block copied by load_block (graph_batches).
+		The model must build its layers once (layers_built_once) : the loop body calls predict again with the same weights.
+		optimizer is the one given to build_train_step_node, its slots are reused
+		"""
+		with tf.name_scope('staged_steps'):
+			self.staged_batches_ph = tf.placeholder(tf.int32, shape=(None, None), name="staged_batches")
+			self.staged_lengths_ph = tf.placeholder(tf.int32, shape=(None,), name="staged_lengths")
+			num_steps = tf.shape(self.staged_lengths_ph)[0]
+
+			def step(step_index, losses):
+				inputs = self.gather_batch(self.staged_batches_ph[step_index, :self.staged_lengths_ph[step_index]])
+				loss = self.build_step_loss(model, parameters, inputs)
+				train_step = optimizer.minimize(loss)
+				with tf.control_dependencies([train_step]):
+					return step_index + 1, losses.write(step_index, loss)
+
+			_, losses = tf.while_loop(lambda step_index, _: step_index < num_steps, step,
+				[tf.constant(0), tf.TensorArray(tf.float32, size=num_steps)])
+			self.staged_losses = losses.stack()
+		return
+
+	def build_step_loss(self, model, parameters, inputs):
+		# Training loss of build_loss_nodes for the gathered inputs of a staged step.
+		# The nodes read and set by build_loss_nodes are swapped for the time of the call
+		nodes = (self.preds, self.orch_t_ph, self.mask_orch_ph, self.loss, self.loss_val, self.sparse_loss_mean)
+		self.preds, _ = model.predict(tuple([inputs[e] for e in ['piano_t', 'piano_past', 'piano_future', 'orch_past', 'orch_future']]))
+		self.orch_t_ph = inputs['orch_t']
+		self.mask_orch_ph = inputs['mask_orch']
+		self.build_loss_nodes(model, parameters)
+		loss = self.loss
+		self.preds, self.orch_t_ph, self.mask_orch_ph, self.loss, self.loss_val, self.sparse_loss_mean = nodes
+		return loss
 	
 	def save_nodes(self, model):
 		tf.add_to_collection('preds', self.preds)
@@ -121,6 +265,20 @@ class Standard_trainer(object):
 		tf.add_to_collection('inputs_ph', self.piano_future_ph)
 		tf.add_to_collection('inputs_ph', self.orch_past_ph)
 		tf.add_to_collection('inputs_ph', self.orch_future_ph)
+		if self.sequence_mode:
+			tf.add_to_collection('targets_ph', self.targets_ph)
+		if self.frame_cache:
+			tf.add_to_collection('orch_frames', self.orch_frames_ph)
+			tf.add_to_collection('orch_frames', self.orch_past_index_ph)
+			tf.add_to_collection('orch_frames', self.orch_frames_embedding)
+		if self.graph_batches:
+			tf.add_to_collection('graph_block', self.batch_index_ph)
+			for ph in self.block_phs:
+				tf.add_to_collection('graph_block', ph)
+			tf.add_to_collection('graph_block', self.load_block_op)
+		if self.staged_losses is not None:
+			for node in [self.staged_batches_ph, self.staged_lengths_ph, self.staged_losses]:
+				tf.add_to_collection('staged_steps', node)
 		if model.optimize():
 			self.saver = tf.train.Saver()
 		else:
@@ -140,11 +298,45 @@ class Standard_trainer(object):
 		self.mask_orch_ph = tf.get_collection("mask_orch_ph")[0]
 		self.train_step = tf.get_collection('train_step')[0]
 		self.keras_learning_phase = tf.get_collection("keras_learning_phase")[0]
+		targets_ph = tf.get_collection('targets_ph')
+		if targets_ph:
+			self.targets_ph = targets_ph[0]
+		self.sequence_mode = bool(targets_ph)
+		orch_frames = tf.get_collection('orch_frames')
+		if orch_frames:
+			self.orch_frames_ph, self.orch_past_index_ph, self.orch_frames_embedding = orch_frames
+		self.frame_cache = bool(orch_frames)
+		graph_block = tf.get_collection('graph_block')
+		if graph_block:
+			self.batch_index_ph = graph_block[0]
+			self.block_phs = graph_block[1:4]
+			self.load_block_op = graph_block[4]
+		else:
+			# Model saved without the block nodes
+			self.graph_batches = False
+		staged_steps = tf.get_collection('staged_steps')
+		if staged_steps:
+			self.staged_batches_ph, self.staged_lengths_ph, self.staged_losses = staged_steps
 		return
 
 	def build_feed_dict(self, batch_index, piano, orch, duration_piano, mask_orch):
+		if (self.block_in_graph is not None) and (piano is self.block_in_graph[0]()) and (orch is self.block_in_graph[1]()):
+			# Batch gathered in the graph from the block copied by load_block
+			return {self.batch_index_ph: batch_index}, None
+
+		if self.sequence_mode:
+			if isinstance(batch_index, tuple):
+				# Batch of segments (training and validation)
+				piano_seq, orch_past_seq, orch_t, targets = build_sequence_batch(batch_index, piano, orch)
+			else:
+				# Windows (generation), fed as short segments
+				if duration_piano is not None:
+					piano = append_duration(piano, duration_piano)
+				piano_seq, orch_past_seq, orch_t, targets = build_window_sequence_batch(batch_index, piano, orch, self.temporal_order)
+			return self.sequence_feed_dict(piano_seq, orch_past_seq, orch_t, targets), orch_t
+
 		# Build batch
-		piano_t, piano_past, piano_future, orch_past, orch_future, orch_t, mask_orch_t = build_batch(batch_index, piano, orch, duration_piano, mask_orch, len(batch_index), self.temporal_order)
+		piano_t, piano_past, piano_future, orch_past, orch_future, orch_t, mask_orch_t = self.batch_builder.build(batch_index, piano, orch, duration_piano, mask_orch)
 
 		# Train step
 		feed_dict = {self.piano_t_ph: piano_t,
@@ -154,14 +346,32 @@ class Standard_trainer(object):
 			self.orch_future_ph: orch_future,
 			self.orch_t_ph: orch_t,
 			self.mask_orch_ph: mask_orch_t}
+		if self.frame_cache:
+			orch_frames, orch_past_index, self.frame_keys = build_orch_frames(batch_index, orch, self.temporal_order)
+			feed_dict[self.orch_frames_ph] = orch_frames
+			feed_dict[self.orch_past_index_ph] = orch_past_index
 		return feed_dict, orch_t
 
+	def sequence_feed_dict(self, piano_seq, orch_past_seq, orch_t, targets):
+		return {self.piano_t_ph: piano_seq,
+			self.orch_past_ph: orch_past_seq,
+			self.orch_t_ph: orch_t,
+			self.targets_ph: targets}
+
 	def build_feed_dict_long_range(self, t, piano_extracted, orch_extracted, orch_gen, duration_piano_extracted):
+		# Validation extracts from piano inputs with durations already appended : duration_piano_extracted is None
 		if duration_piano_extracted is not None:
 			dur_shape = duration_piano_extracted.shape
 			dur_reshape = duration_piano_extracted.reshape([dur_shape[0], dur_shape[1], 1])
 			piano_extracted = np.concatenate((piano_extracted, dur_reshape), axis=2)
 
+		if self.sequence_mode:
+			batch_index = np.tile(t, piano_extracted.shape[0])
+			piano_seq, orch_past_seq, orch_t, targets = build_window_sequence_batch(batch_index, piano_extracted, orch_gen, self.temporal_order)
+			# Targets are the extracted orchestra, inputs the generated one
+			orch_t = orch_extracted[:, t, :]
+			return self.sequence_feed_dict(piano_seq, orch_past_seq, orch_t, targets), orch_t
+
 		# We cannot use build_batch function here, but getting the matrices is quite easy
 		piano_t = piano_extracted[:, t, :]
 		piano_past = piano_extracted[:, t-(self.temporal_order-1):t, :]
@@ -179,9 +389,14 @@ class Standard_trainer(object):
 			self.orch_future_ph: orch_future,
 			self.orch_t_ph: orch_t,
 			self.mask_orch_ph: mask_orch_t}
+		if self.frame_cache:
+			# Generated windows : no frame shared between them
+			feed_dict[self.orch_frames_ph] = orch_past.reshape((-1, orch_past.shape[2]))
+			feed_dict[self.orch_past_index_ph] = np.arange(orch_past.shape[0] * orch_past.shape[1]).reshape(orch_past.shape[:2])
 		return feed_dict, orch_t
 
-	def training_step(self, sess, batch_index, piano, orch, duration_piano, mask_orch, summarize_dict):
+	def training_step(self, sess, batch_index, piano, orch, duration_piano, mask_orch, summarize_dict, diagnostics=True):
+		# diagnostics=False : only the train op and the loss are fetched (preds, debug_outputs and summary are None)
 		feed_dict, _ = self.build_feed_dict(batch_index, piano, orch, duration_piano, mask_orch)
 		feed_dict[self.keras_learning_phase] = True
 
@@ -202,6 +417,10 @@ class Standard_trainer(object):
 		#############################################
 		#############################################
 		
+		if not diagnostics:
+			_, loss_batch = sess.run([self.train_step, self.loss], feed_dict)
+			return loss_batch, None, None, None
+
 		if SUMMARIZE:
 			_, loss_batch, preds_batch, sparse_loss_batch, summary = sess.run([self.train_step, self.loss, self.preds, self.sparse_loss_mean, merged_node], feed_dict)
 		else:
@@ -226,6 +445,26 @@ class Standard_trainer(object):
 		return loss_batch, preds_batch, orch_t
 
 	def generation_step(self, sess, batch_index, piano, orch_gen, duration_gen, mask_orch):
+		if self.frame_cache:
+			# Embeddings of the frames already generated are reused
+			feed_dict, _ = self.build_feed_dict(batch_index, piano, orch_gen, duration_gen, mask_orch)
+			feed_dict[self.keras_learning_phase] = False
+			feed_dict[self.orch_frames_embedding] = self.cached_frames_embedding(sess, feed_dict[self.orch_frames_ph], orch_gen)
+			return sess.run(self.preds, feed_dict)
 		# Exactly the same as the valid_step in the case of the standard_learner
 		loss_batch, preds_batch, orch_t = self.valid_step(sess, batch_index, piano, orch_gen, duration_gen, mask_orch, None)
-		return preds_batch
\ No newline at end of file
+		return preds_batch
+
+	def cached_frames_embedding(self, sess, orch_frames, orch_gen):
+		"""Embeddings of the past frames of a generation step (frame_keys set by build_feed_dict).
+		Frames before the generated time are not modified anymore, each one is embedded once per generation (orch_gen)
+		"""
+		if (self.generation_cache is None) or (self.generation_cache[0] is not orch_gen):
+			self.generation_cache = (orch_gen, {})
+		cache = self.generation_cache[1]
+		missing = [ind for ind, key in enumerate(self.frame_keys) if key not in cache]
+		if len(missing) > 0:
+			embeddings = sess.run(self.orch_frames_embedding, {self.orch_frames_ph: orch_frames[missing], self.keras_learning_phase: False})
+			for ind, embedding in zip(missing, embeddings):
+				cache[self.frame_keys[ind]] = embedding
+		return np.stack([cache[key] for key in self.frame_keys])
@@ -5,6 +5,7 @@ import subprocess
 import os
 import pickle as pkl
 import train_wrapper
+from LOP.Utils import batch_plan
 
 
 def submit_job(config_folder_fold, parameters, model_params, dimensions, K_fold, 
@@ -18,7 +19,8 @@ def submit_job(config_folder_fold, parameters, model_params, dimensions, K_fold,
 	pkl.dump(parameters, open(context_folder + "/parameters.pkl", 'wb')) 
 	pkl.dump(model_params, open(context_folder + '/model_params.pkl', 'wb'))
 	pkl.dump(dimensions , open(context_folder + '/dimensions.pkl', 'wb'))
-	pkl.dump(K_fold, open(context_folder + '/K_fold.pkl', 'wb'))
+	# Batch plans as .npy files (K_fold_indices.npy, K_fold_offsets.npy)
+	batch_plan.save_fold(K_fold, context_folder, 'K_fold')
 	pkl.dump(test_names, open(context_folder + '/test_names.pkl', 'wb'))
 	pkl.dump(track_paths_generation, open(context_folder + '/track_paths_generation.pkl', 'wb'))
 	pkl.dump(save_bool , open(context_folder + '/save_bool.pkl', 'wb'))
@@ -7,16 +7,19 @@ from keras import backend as K
 import numpy as np
 import time
 import os
+import random
 import pickle as pkl
 import shutil
-from multiprocessing.pool import ThreadPool
-# from multiprocessing.pool import Pool
 
 import LOP.Scripts.config as config
 import LOP.Utils.early_stopping as early_stopping
 import LOP.Utils.model_statistics as model_statistics
-from LOP.Scripts.asynchronous_load_mat import async_load_mat
+from LOP.Utils.sequence_batch import count_targets
+from LOP.Database.load_data import to_sequence_blocks
+from LOP.Scripts.prefetch_queue import Block_prefetcher, prefetch_options
+from LOP.Scripts.resident_blocks import Resident_blocks
 import training_utils
+import load_matrices
 
 # Plot weights
 import LOP.Results_process.plot_weights as plot_weights
@@ -48,9 +51,19 @@ def train(model, train_splits_batches, valid_splits_batches, test_splits_batches
 	# Save it for generation. SO UGLY
 	with open(os.path.join(config_folder, 'which_trainer'), 'w') as ff:
 		ff.write(which_trainer)
+	# Sequence mode : recurrent models predict all the frames of segments of the blocks in one pass
+	sequence_mode = parameters.get("sequence_mode", False) and (which_trainer == 'standard_trainer')
+	if sequence_mode and not model.sequence_mode_supported():
+		logger_train.info("Sequence mode is not supported by " + model.name() + ", use windows")
+		sequence_mode = False
+	model.sequence_mode = sequence_mode
+
 	if which_trainer == 'standard_trainer':
 		from LOP.Scripts.standard_learning.standard_trainer import Standard_trainer as Trainer
-		kwargs_trainer = {'temporal_order': model.temporal_order}
+		kwargs_trainer = {'temporal_order': model.temporal_order,
+			'graph_batches': parameters.get("graph_batches", False) and (not sequence_mode),
+			'sequence_mode': sequence_mode,
+			'frame_cache': parameters.get("frame_cache", False) and model.frame_cache_supported()}
 	elif which_trainer == 'NADE_trainer':
 		from LOP.Scripts.NADE_learning.NADE_trainer import NADE_trainer as Trainer
 		kwargs_trainer = {'temporal_order': model.temporal_order, 'num_ordering': model.num_ordering}
@@ -60,6 +73,20 @@ def train(model, train_splits_batches, valid_splits_batches, test_splits_batches
 	else:
 		raise Exception("Undefined trainer")
 
+	if sequence_mode:
+		sequence_length = parameters.get("sequence_length", 100)
+		# The recurrent layers see up to sequence_length-1 past frames in training,
+		# but only temporal_order-1 in validation and generation, where windows are fed as segments of temporal_order frames
+		if sequence_length > model.temporal_order:
+			logger_train.warning("Sequence mode : training context of up to {} frames, validation and generation context of {} frames".format(sequence_length-1, model.temporal_order-1))
+		# About as many targets per batch as in the windowed mode
+		sequence_batch_size = max(1, parameters["batch_size"] // (sequence_length - model.temporal_order + 1))
+		random_sequences = random.Random(0)
+		# Validation and test blocks keep their windows (and long range batches) : same context as in generation
+		train_splits_batches = to_sequence_blocks(train_splits_batches, model.temporal_order, sequence_length, sequence_batch_size, random_sequences)
+	# Same number of targets in both modes, to compare their training speed
+	num_train_targets = sum([count_targets(e['batches']) for e in train_splits_batches])
+
 	# Flag to know if the model has to be trained or not
 	model_optimize = model.optimize()
 	trainer = Trainer(**kwargs_trainer)
@@ -70,7 +97,14 @@ def train(model, train_splits_batches, valid_splits_batches, test_splits_batches
 		trainer.build_variables_nodes(model, parameters)
 		trainer.build_preds_nodes(model)
 		trainer.build_loss_nodes(model, parameters)
-		trainer.build_train_step_node(model, config.optimizer())
+		optimizer = config.optimizer()
+		trainer.build_train_step_node(model, optimizer)
+		if trainer.graph_batches and parameters.get("staged_steps", 0) and model_optimize:
+			# The staged steps call predict again in a tf.while_loop
+			if model.layers_built_once() and not trainer.frame_cache:
+				trainer.build_staged_steps_node(model, parameters, optimizer)
+			else:
+				logger_train.info("Staged training steps are not supported by " + model.name() + ", one step per call")
 		trainer.save_nodes(model)
 		time_building_graph = time.time() - start_time_building_graph
 		logger_train.info("TTT : Building the graph took {0:.2f}s".format(time_building_graph))
@@ -185,19 +219,24 @@ def train(model, train_splits_batches, valid_splits_batches, test_splits_batches
 		# Load first matrix
 		#######################################
 		load_data_start = time.time()
-		pool = ThreadPool(processes=1)
-		async_train = pool.apply_async(async_load_mat, (normalizer, train_splits_batches[0]['chunks_folders'], parameters))
-		matrices_from_thread = async_train.get()
+		# Training blocks are loaded in advance, cyclically over epochs
+		train_prefetcher = Block_prefetcher(normalizer, parameters, [e['chunks_folders'] for e in train_splits_batches], cyclic=True, **prefetch_options(parameters))
+		matrices_from_thread = train_prefetcher.get()
 		load_data_time = time.time() - load_data_start
 		logger_train.info("Load the first matrix time : " + str(load_data_time))
 
+		# Validation blocks loaded and normalized once for all the epochs
+		if parameters.get("resident_validation", False):
+			valid_resident = Resident_blocks(normalizer, parameters, [e['chunks_folders'] for e in valid_splits_batches],
+				memory_budget=parameters.get("resident_memory_budget", 4) * 2**30, spill_folder=config_folder + '/resident_valid')
+		else:
+			valid_resident = None
+
 		# For dumb baseline models like random or repeat which don't need training step optimization
 		if model_optimize == False:
-			# WARNING : first validation matrix is not necessarily the same as the first train matrix
-			async_test = pool.apply_async(async_load_mat, (normalizer, test_splits_batches[0]['chunks_folders'], parameters))
-			init_matrices_test = async_test.get()
+			train_prefetcher.close()
 			test_results, test_long_range_results, _, _ = validate(trainer, sess, 
-					init_matrices_test, test_splits_batches, 
+					None, test_splits_batches, 
 					normalizer, parameters,
 					logger_train, DEBUG)
 			training_utils.mean_and_store_results(test_results, valid_tabs, 0)
@@ -205,6 +244,12 @@ def train(model, train_splits_batches, valid_splits_batches, test_splits_batches
 			return training_utils.remove_tail_training_curves(valid_tabs, 1), best_epoch, \
 				training_utils.remove_tail_training_curves(valid_tabs_LR, 1), best_epoch_LR
 
+		# Lean training steps (train op and loss only) between two steps fetching diagnostics
+		diagnostics_interval = max(1, parameters.get("diagnostics_interval", 1))
+		train_time_tab = []
+		# Number of training steps run by the in-graph loop per call to trainer.training_steps
+		staged_steps = parameters.get("staged_steps", 0) if (trainer.staged_losses is not None) else 0
+
 		# Training iteration
 		while (not OVERFITTING and not TIME_LIMIT
 			   and epoch != parameters['max_iter']):
@@ -212,44 +257,71 @@ def train(model, train_splits_batches, valid_splits_batches, test_splits_batches
 			start_time_epoch = time.time()
 
 			train_cost_epoch = []
+			# Diagnostics of the sampled steps : the first step of each epoch, then every diagnostics_interval steps
+			train_step_counter = 0
 			sparse_loss_epoch = []
+			preds_mean_epoch = []
+			summary = None
 
 			train_time = time.time()
+			blocked_time_epoch = train_prefetcher.blocked_time
 			for file_ind_CURRENT in range(N_matrix_files):
 
 				#######################################
-				# Get indices and matrices to load
+				# Get indices
 				#######################################
-				# We train on the current matrix
+				# We train on the current matrix, the next ones are loaded by the prefetcher
 				train_index = train_splits_batches[file_ind_CURRENT]['batches']
-				# But load the one next one
-				file_ind_NEXT = (file_ind_CURRENT+1) % N_matrix_files
-				next_chunks = train_splits_batches[file_ind_NEXT]['chunks_folders']
-
-				#######################################
-				# Load matrix thread
-				#######################################
-				async_train = pool.apply_async(async_load_mat, (normalizer, next_chunks, parameters))
 				
 				piano_input, orch_transformed, duration_piano, mask_orch = matrices_from_thread
+				if trainer.graph_batches:
+					# Training steps on this block only feed the batch indices
+					trainer.load_block(sess, piano_input, orch_transformed, mask_orch)
 				
 				#######################################
 				# Train
 				#######################################
-				for batch_index in train_index:
-					loss_batch, _, debug_outputs, summary = trainer.training_step(sess, batch_index, piano_input, orch_transformed, duration_piano, mask_orch, summarize_dict)
-					# Keep track of cost
-					train_cost_epoch.append(loss_batch)
-					sparse_loss_batch = debug_outputs[0]
-					sparse_loss_epoch.append(sparse_loss_batch)
+				batch_counter = 0
+				while batch_counter < len(train_index):
+					# Predictions, sparse loss and summaries are only fetched every diagnostics_interval steps
+					diagnostics = (train_step_counter % diagnostics_interval == 0)
+					if staged_steps and (not diagnostics):
+						# Steps until the next diagnostics step (at most staged_steps) in one call
+						n_steps = min(staged_steps, len(train_index) - batch_counter, diagnostics_interval - (train_step_counter % diagnostics_interval))
+						losses = trainer.training_steps(sess, [train_index[e] for e in range(batch_counter, batch_counter + n_steps)])
+						train_cost_epoch.extend(losses)
+					else:
+						n_steps = 1
+						loss_batch, preds_batch, debug_outputs, summary_batch = trainer.training_step(sess, train_index[batch_counter], piano_input, orch_transformed, duration_piano, mask_orch, summarize_dict, diagnostics=diagnostics)
+						# Keep track of cost
+						train_cost_epoch.append(loss_batch)
+						if diagnostics:
+							sparse_loss_batch = debug_outputs[0]
+							sparse_loss_epoch.append(sparse_loss_batch)
+							preds_mean_epoch.append(np.mean(preds_batch))
+							summary = summary_batch
+					batch_counter += n_steps
+					train_step_counter += n_steps
 
 				#######################################
 				# New matrices from thread
 				#######################################
 				del(matrices_from_thread)
-				matrices_from_thread = async_train.get()
+				matrices_from_thread = train_prefetcher.get()
 			train_time = time.time() - train_time
 			logger_train.info("Training time : {}".format(train_time))
+			logger_train.info("Training targets per second ({} mode) : {:.1f}".format("sequence" if sequence_mode else "windowed", num_train_targets / train_time))
+			train_time_tab.append(train_time)
+			logger_train.info("Blocked waiting for training data : {:.3f}s".format(train_prefetcher.blocked_time - blocked_time_epoch))
+			# No sampled step if the epoch had no training batch
+			if sparse_loss_epoch:
+				sparse_loss_mean = "{:.3f}".format(np.mean(sparse_loss_epoch))
+				preds_mean = "{:.4f}".format(np.mean(preds_mean_epoch))
+			else:
+				sparse_loss_mean = preds_mean = "n/a"
+			logger_train.info("Diagnostics on {} sampled steps : sparse loss {}, mean prediction {}".format(len(sparse_loss_epoch), sparse_loss_mean, preds_mean))
+			if parameters.get("block_cache_budget", 0):
+				logger_train.info("Block cache : " + load_matrices.block_cache.stats())
 
 			### 
 			# DEBUG
@@ -260,11 +332,7 @@ def train(model, train_splits_batches, valid_splits_batches, test_splits_batches
 			#
 			###
 
-			# WARNING : first validation matrix is not necessarily the same as the first train matrix
-			# So now that it's here, parallelization is absolutely useless....
-			async_valid = pool.apply_async(async_load_mat, (normalizer, valid_splits_batches[0]['chunks_folders'], parameters))
-
-			if SUMMARIZE:
+			if SUMMARIZE and (summary is not None):
 				if (epoch<5) or (epoch%10==0):
 					# Note that summarize here only look at the variables after the last batch of the epoch
 					# If you want to look at all the batches, include it in 
@@ -277,14 +345,13 @@ def train(model, train_splits_batches, valid_splits_batches, test_splits_batches
 			# Validate
 			#######################################
 			valid_time = time.time()
-			init_matrices_validation = async_valid.get()
 			if DEBUG["plot_nade_ordering_preds"]:
 				DEBUG["plot_nade_ordering_preds"]=config_folder+"/preds_nade/"+str(epoch)
 			valid_results, valid_long_range_results, preds_val, truth_val = \
 				validate(trainer, sess, 
-					init_matrices_validation, valid_splits_batches,
+					None, valid_splits_batches,
 					normalizer, parameters,
-					logger_train, DEBUG)
+					logger_train, DEBUG, resident_blocks=valid_resident)
 			valid_time = time.time() - valid_time
 			logger_train.info("Validation time : {}".format(valid_time))
 
@@ -315,11 +382,11 @@ def train(model, train_splits_batches, valid_splits_batches, test_splits_batches
 			logger_train.info('Epoch : {} , Training loss : {} , Validation loss : {} \n \
 Validation accuracy : {:.3f} %, precision : {:.3f} %, recall : {:.3f} % \n \
 True_accuracy : {:.3f} %, f_score : {:.3f} %, Xent : {:.6f}\n \
-Sparse_loss : {:.3f}'
+Sparse_loss : {}'
 							  .format(epoch, mean_loss,
 								valid_tabs['loss'][epoch], valid_tabs['accuracy'][epoch], valid_tabs['precision'][epoch],
 								valid_tabs['recall'][epoch], valid_tabs['true_accuracy'][epoch], valid_tabs['f_score'][epoch], valid_tabs['Xent'][epoch],
-								np.mean(sparse_loss_epoch)))
+								sparse_loss_mean))
 
 			logger_train.info('Time : {}'
 							  .format(end_time_epoch - start_time_epoch))
@@ -364,15 +431,24 @@ Sparse_loss : {:.3f}'
 			#######################################
 			epoch += 1
 
+		# Training speed, compare the modes with DEBUG/compare_training_speed.py
+		if len(train_time_tab) > 0:
+			with open(os.path.join(config_folder, 'training_speed.txt'), 'w') as ff:
+				ff.write("mode = {}\n".format("sequence" if sequence_mode else "windowed"))
+				ff.write("epoch_training_time = {}\n".format(np.mean(train_time_tab)))
+				ff.write("targets_per_epoch = {}\n".format(num_train_targets))
+
 		#######################################
 		# Test
 		#######################################
 		test_time = time.time()
-		async_test = pool.apply_async(async_load_mat, (normalizer, test_splits_batches[0]['chunks_folders'], parameters))
-		init_matrices_test = async_test.get()
+		train_prefetcher.close()
+		if valid_resident is not None:
+			logger_train.info("Resident validation blocks : {} bytes in memory, {} blocks spilled on disk".format(valid_resident.resident_bytes, valid_resident.num_spilled))
+			valid_resident.close()
 		test_results, test_long_range_results, preds_test, truth_test = \
 			validate(trainer, sess, 
-				init_matrices_test, test_splits_batches,
+				None, test_splits_batches,
 				normalizer, parameters,
 				logger_train, DEBUG)
 		test_time = time.time() - test_time
@@ -395,11 +471,6 @@ True_accuracy : {:.3f} %, f_score : {:.3f} %, Xent : {:.6f}"""
 						  .format(test_time))
 
 
-		#######################################
-		# Close workers' pool
-		#######################################
-		pool.close()
-		pool.join()
 	
 	return training_utils.remove_tail_training_curves(valid_tabs, epoch), test_tab, best_epoch, \
 		training_utils.remove_tail_training_curves(valid_tabs_LR, epoch), test_tab_LR, best_epoch_LR
@@ -15,6 +15,9 @@ from import_functions import import_model, import_normalizer
 from train import train
 from generate_midi import generate_midi
 import LOP.Utils.data_statistics as data_statistics
+from LOP.Database import shared_dataset
+import load_matrices
+from LOP.Utils import batch_plan
 
 def train_wrapper(parameters, model_params,
 	dimensions, config_folder_fold, K_fold,
@@ -23,6 +26,12 @@ def train_wrapper(parameters, model_params,
 
 	Model = import_model.import_model(parameters["model_name"])
 
+	# Jobs running on the same node share one copy of the database in memory
+	if parameters.get("shared_dataset", False):
+		shared_dataset.attach(parameters["store_folder"], logger)
+		# Read the shared pages directly instead of copying them in private buffers
+		parameters["mmap_matrices"] = True
+
 	train_folds = K_fold['train']
 	valid_folds = K_fold['valid']
 	test_folds = K_fold['test']
@@ -50,6 +59,8 @@ def train_wrapper(parameters, model_params,
 	model_params['mean_number_units_on'] = mean_number_units_on
 	time_data_stats_1 = time.time()
 	logger.info('TTT : Computing data statistics took {} seconds'.format(time_data_stats_1-time_data_stats_0))
+	if parameters.get("block_cache_budget", 0):
+		logger.info('Block cache : ' + load_matrices.block_cache.stats())
 	
 	########################################################
 	# Persistency
@@ -155,7 +166,7 @@ if __name__ == '__main__':
 	model_params = pkl.load(open(context_folder + "/model_params.pkl","rb"))
 	model_name = pkl.load(open(context_folder + "/model_name.pkl","rb"))
 	dimensions = pkl.load(open(context_folder + "/dimensions.pkl","rb")) 
-	K_fold = pkl.load(open(context_folder + "/K_fold.pkl","rb"))
+	K_fold = batch_plan.load_fold(context_folder, 'K_fold')
 	track_paths_generation = pkl.load(open(context_folder + "/track_paths_generation.pkl","rb"))
 	save_model = pkl.load(open(context_folder + "/save_model.pkl","rb"))
 	generate_bool = pkl.load(open(context_folder + "/generate_bool.pkl","rb"))
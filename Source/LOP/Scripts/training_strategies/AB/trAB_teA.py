@@ -9,6 +9,7 @@ import pickle as pkl
 
 from LOP.Scripts.submit_job import submit_job
 from LOP.Database.load_data import build_one_fold
+from LOP.Database import fold_plan_cache
 
 
 class TS_trAB_teA(object):
@@ -67,6 +68,13 @@ class TS_trAB_teA(object):
 		self.logger.info('##### Building folds')
 		# Load data and build K_folds
 		time_load_0 = time.time()
+		# Same database, split parameters and strategy : the folds are the same
+		split_parameters = fold_plan_cache.get_split_parameters(self.num_k_folds, parameters, model_params)
+		plan = fold_plan_cache.load(self.database_path, self.name(), split_parameters)
+		if plan is not None:
+			self.__dict__.update(plan)
+			self.logger.info('TTT : Loading fold plan took {} seconds'.format(time.time() - time_load_0))
+			return
 		# K_folds[fold_index]['train','test' or 'valid'][index split]['batches' : [[234,14,54..],[..],[..]], 'matrices_path':[path_0,path_1,..]]
 		if self.num_k_folds == 0:
 			# this_K_folds, this_valid_names, this_test_names = build_folds(tracks_start_end, piano, orch, 10, model_params["temporal_order"], parameters["batch_size"], parameters["long_range"], RANDOM_SEED_FOLDS, logger_load=None)
@@ -75,6 +83,7 @@ class TS_trAB_teA(object):
 			raise Exception("num_k_folds = -1 Doesn't really make sense here")
 		else:
 			self.K_folds, self.train_names, self.valid_names, self.test_names = self.__build_folds(self.num_k_folds, model_params["temporal_order"], parameters["batch_size"], parameters["long_range"], parameters["num_max_contiguous_blocks"])
+		fold_plan_cache.save(self.database_path, self.name(), split_parameters, fold_plan_cache.get_plan(self))
 		time_load = time.time() - time_load_0
 		self.logger.info('TTT : Building folds took {} seconds'.format(time_load))
 		return
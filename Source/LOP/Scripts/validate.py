@@ -3,14 +3,16 @@
 
 import time
 import os
-from multiprocessing.pool import ThreadPool
 import numpy as np
 
 import config
-from LOP.Scripts.asynchronous_load_mat import async_load_mat
+from LOP.Scripts.prefetch_queue import Block_prefetcher, prefetch_options
 from LOP.Utils.measure import accuracy_measure, precision_measure, recall_measure, true_accuracy_measure, f_measure, binary_cross_entropy
 
-def validate(trainer, sess, init_matrices_validation, valid_splits_batches, normalizer, parameters, logger, DEBUG):
+def validate(trainer, sess, init_matrices_validation, valid_splits_batches, normalizer, parameters, logger, DEBUG, resident_blocks=None):
+	"""init_matrices_validation : matrices of the first block if they are already loaded, None otherwise
+	resident_blocks : Resident_blocks of the split, if its blocks are kept across epochs
+	"""
 
 	temporal_order = trainer.temporal_order
 
@@ -38,24 +40,27 @@ def validate(trainer, sess, init_matrices_validation, valid_splits_batches, norm
 	Xent_long_range = []
 
 	N_matrix_files = len(valid_splits_batches)
-	pool = ThreadPool(processes=1)
-	matrices_from_thread = init_matrices_validation
+	blocks_chunks_folders = [e['chunks_folders'] for e in valid_splits_batches]
+	if resident_blocks is not None:
+		prefetcher = None
+	elif init_matrices_validation is None:
+		prefetcher = Block_prefetcher(normalizer, parameters, blocks_chunks_folders, **prefetch_options(parameters))
+	else:
+		prefetcher = Block_prefetcher(normalizer, parameters, blocks_chunks_folders[1:], **prefetch_options(parameters))
 
 	for file_ind_CURRENT in range(N_matrix_files):
 		#######################################
-		# Get indices and matrices to load
+		# Get indices and matrices
 		#######################################
-		# We train on the current matrix
 		valid_index = valid_splits_batches[file_ind_CURRENT]['batches']
 		valid_long_range_index = valid_splits_batches[file_ind_CURRENT]['batches_lr']
-		# But load the one next one
-		file_ind_NEXT = (file_ind_CURRENT+1) % N_matrix_files
-		next_chunks = valid_splits_batches[file_ind_NEXT]['chunks_folders']
-		
-		#######################################
-		# Load matrix thread
-		#######################################
-		async_valid = pool.apply_async(async_load_mat, (normalizer, next_chunks, parameters))
+		# Next blocks are loaded in the meantime by the prefetcher
+		if resident_blocks is not None:
+			matrices_from_thread = resident_blocks.get(file_ind_CURRENT)
+		elif (file_ind_CURRENT == 0) and (init_matrices_validation is not None):
+			matrices_from_thread = init_matrices_validation
+		else:
+			matrices_from_thread = prefetcher.get()
 
 		piano_input, orch_input, duration_piano, mask_orch = matrices_from_thread
 		
@@ -111,10 +116,8 @@ def validate(trainer, sess, init_matrices_validation, valid_splits_batches, norm
 			orch_dim = orch_input.shape[1]
 			piano_extracted = np.zeros((len(batch_index), seq_len, piano_dim))
 			orch_extracted = np.zeros((len(batch_index), seq_len, orch_dim))
-			if parameters["duration_piano"]:
-				duration_piano_extracted = np.zeros((len(batch_index), seq_len))
-			else:
-				duration_piano_extracted = None
+			# Durations, if used, are already the last column of piano_input
+			duration_piano_extracted = None
 			orch_gen = np.zeros((len(batch_index), seq_len, orch_dim))
 
 			for ind_b, this_batch_ind in enumerate(batch_index):
@@ -122,8 +125,6 @@ def validate(trainer, sess, init_matrices_validation, valid_splits_batches, norm
 				end_ind = start_ind + seq_len
 				piano_extracted[ind_b] = piano_input[start_ind:end_ind,:]
 				orch_extracted[ind_b] = orch_input[start_ind:end_ind,:]
-				if parameters["duration_piano"]:
-					duration_piano_extracted[ind_b] = duration_piano[start_ind:end_ind]
 			
 			# We know the past orchestration at the beginning...
 			orch_gen[:, :temporal_order-1, :] = orch_extracted[:, :temporal_order-1, :]
@@ -156,10 +157,10 @@ def validate(trainer, sess, init_matrices_validation, valid_splits_batches, norm
 				Xent_long_range.extend(Xent_batch)
 
 		del(matrices_from_thread)
-		matrices_from_thread = async_valid.get()
 
-	pool.close()
-	pool.join()
+	if prefetcher is not None:
+		logger.info("Blocked waiting for validation data : {:.3f}s".format(prefetcher.blocked_time))
+		prefetcher.close()
 
 	valid_results = {
 		'accuracy': np.asarray(accuracy), 
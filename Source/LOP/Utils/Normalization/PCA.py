@@ -9,7 +9,7 @@ Created on Thu Nov 16 12:17:39 2017
 
 import numpy as np
 from sklearn.decomposition import IncrementalPCA
-from load_matrices import load_matrices
+from load_matrices import load_matrices, piano_array_name
 
 class PCA(object):
     """Basically just a wrapper for scikit PCA
@@ -24,7 +24,7 @@ class PCA(object):
 
     def fit(self, train_folds, parameters):
         for path_matrix, indices in train_folds.iteritems():
-            piano, _, _, _ = load_matrices(path_matrix, parameters)
+            piano, _, _, _ = load_matrices(path_matrix, parameters, arrays=[piano_array_name(parameters)])
             flat_train_indices = [ind for batch in indices for ind in batch]
             mat_train = piano[flat_train_indices]
             try:
@@ -9,7 +9,7 @@ Created on Thu Nov 16 12:17:39 2017
 
 import numpy as np
 import math
-from load_matrices import load_matrices
+from load_matrices import load_matrices, piano_array_name
 
 class zero_mean_unit_variance(object):
     """Basically just a wrapper for scikit PCA
@@ -25,7 +25,7 @@ class zero_mean_unit_variance(object):
     def get_mean(self, train_folds, parameters):
         length = 0
         for path_matrix, indices in train_folds.iteritems():
-            piano, _, _, _ = load_matrices(path_matrix, parameters)
+            piano, _, _, _ = load_matrices(path_matrix, parameters, arrays=[piano_array_name(parameters)])
             if self.transformed_dim is None:
                 self.transformed_dim = piano.shape[1]
             flat_train_indices = [ind for batch in indices for ind in batch]
@@ -38,7 +38,7 @@ class zero_mean_unit_variance(object):
     def get_var(self, train_folds, parameters):
         length = 0
         for path_matrix, indices in train_folds.iteritems():
-            piano, _, _, _ = load_matrices(path_matrix, parameters)
+            piano, _, _, _ = load_matrices(path_matrix, parameters, arrays=[piano_array_name(parameters)])
             flat_train_indices = [ind for batch in indices for ind in batch]
             mat_train = piano[flat_train_indices]
             self.var += np.sum(np.square(mat_train - self.mean), axis=0)
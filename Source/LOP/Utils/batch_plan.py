@@ -0,0 +1,100 @@
+#!/usr/bin/env python
+# -*- coding: utf8 -*-
+
+import os
+import pickle as pkl
+import numpy as np
+
+# Batches of a block stored as one contiguous int32 array of indices and an offset vector :
+#   batch i = indices[offsets[i]:offsets[i+1]]
+# Folds are saved as two .npy files (all the plans of a fold concatenated) which can be memory-mapped.
+
+
+class Batch_plan(object):
+    """Sequence of batches of indices. Behaves like the former list of lists of ints :
+    len(), iteration and indexing, batches being int32 arrays (views, no copy).
+    """
+    def __init__(self, indices, offsets):
+        self.indices = indices
+        self.offsets = offsets
+        return
+
+    @staticmethod
+    def from_indices(indices, batch_size):
+        # Consecutive batches of batch_size indices, smaller last batch
+        # batch_size = None : a single batch with all the indices
+        indices = np.asarray(indices, dtype=np.int32)
+        n_ind = len(indices)
+        if batch_size:
+            offsets = np.append(np.arange(0, n_ind, batch_size), n_ind)
+        else:
+            offsets = np.asarray([0, n_ind])
+        return Batch_plan(indices, offsets.astype(np.int64))
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, batch_ind):
+        if batch_ind < 0:
+            batch_ind += len(self)
+        if (batch_ind < 0) or (batch_ind >= len(self)):
+            raise IndexError('Batch index out of range')
+        return self.indices[self.offsets[batch_ind]:self.offsets[batch_ind+1]]
+
+    def __iter__(self):
+        for batch_ind in range(len(self)):
+            yield self[batch_ind]
+
+    @property
+    def nbytes(self):
+        return self.indices.nbytes + self.offsets.nbytes
+
+
+PLAN_KEYS = ['batches', 'batches_lr']
+
+
+def save_fold(fold, folder, name):
+    """Write a fold ({'train': [block, ...], 'valid': ..., 'test': ...}) in folder :
+        - name.pkl : the fold, without the indices of the batch plans
+        - name_indices.npy, name_offsets.npy : all the plans, concatenated
+    """
+    all_indices = []
+    all_offsets = []
+    position_indices = 0
+    fold_skeleton = {}
+    for split_name, blocks in fold.items():
+        fold_skeleton[split_name] = []
+        for block in blocks:
+            block_skeleton = {}
+            for key, value in block.items():
+                if key not in PLAN_KEYS:
+                    block_skeleton[key] = value
+                    continue
+                # Position of the plan in the concatenated offsets
+                block_skeleton[key] = (sum([len(e) for e in all_offsets]), len(value.offsets))
+                all_indices.append(value.indices)
+                all_offsets.append(value.offsets + position_indices)
+                position_indices += len(value.indices)
+            fold_skeleton[split_name].append(block_skeleton)
+    with open(os.path.join(folder, name + '.pkl'), 'wb') as ff:
+        pkl.dump(fold_skeleton, ff, protocol=pkl.HIGHEST_PROTOCOL)
+    np.save(os.path.join(folder, name + '_indices.npy'), np.concatenate(all_indices + [np.zeros((0,), dtype=np.int32)]).astype(np.int32))
+    np.save(os.path.join(folder, name + '_offsets.npy'), np.concatenate(all_offsets + [np.zeros((0,), dtype=np.int64)]).astype(np.int64))
+    return
+
+
+def load_fold(folder, name, mmap_mode='r'):
+    with open(os.path.join(folder, name + '.pkl'), 'rb') as ff:
+        fold = pkl.load(ff)
+    all_indices = np.load(os.path.join(folder, name + '_indices.npy'), mmap_mode=mmap_mode)
+    all_offsets = np.load(os.path.join(folder, name + '_offsets.npy'), mmap_mode=mmap_mode)
+    for blocks in fold.values():
+        for block in blocks:
+            for key in PLAN_KEYS:
+                if key not in block:
+                    continue
+                start, length = block[key]
+                offsets = np.asarray(all_offsets[start:start+length])
+                # Plans index their own slice of the concatenated indices
+                block[key] = Batch_plan(all_indices[offsets[0]:offsets[-1]], offsets - offsets[0])
+    return fold
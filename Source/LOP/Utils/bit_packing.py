@@ -0,0 +1,76 @@
+#!/usr/bin/env python
+# -*- coding: utf8 -*-
+
+import numpy as np
+
+# Binary pianorolls are stored and kept in memory as bits (np.packbits along the pitch axis),
+# i.e. 16 times less than the float16 buffers used for real-valued matrices.
+
+
+def num_bytes(dim):
+    return (dim + 7) // 8
+
+
+def pack(pr):
+    # (T, N) binary matrix -> (T, ceil(N/8)) uint8
+    return np.packbits(np.asarray(pr) > 0, axis=-1)
+
+
+def unpack(packed, dim, dtype=np.float16):
+    # (..., ceil(N/8)) uint8 -> (..., N)
+    return np.unpackbits(np.asarray(packed), axis=-1)[..., :dim].astype(dtype)
+
+
+_bit_tables = {}
+
+
+def bit_table(dtype=np.float16):
+    # (256, 8) bits of each byte value, in the order of np.unpackbits : np.take(table, packed, axis=0) unpacks
+    dtype = np.dtype(dtype)
+    if dtype not in _bit_tables:
+        _bit_tables[dtype] = np.unpackbits(np.arange(256, dtype=np.uint8)[:, np.newaxis], axis=1).astype(dtype)
+    return _bit_tables[dtype]
+
+
+def as_array(pr):
+    # Full matrix, whatever the representation (bit-packed, virtual or numpy array)
+    if isinstance(pr, Bit_packed_matrix):
+        return pr.unpack()
+    return np.asarray(pr)
+
+
+class Bit_packed_matrix(object):
+    """Bit-packed (T, N) binary matrix.
+    Behaves like a numpy array for row indexing : only the selected rows are unpacked,
+    so build_batch and validate can use it in place of the float matrices.
+    packed can be a numpy array or a Virtual_matrix of memory-mapped chunks.
+    """
+    def __init__(self, packed, dim, dtype=np.float16):
+        self.packed = packed
+        self.dim = dim
+        self.dtype = dtype
+        self.shape = (packed.shape[0], dim)
+        return
+
+    def __len__(self):
+        return self.shape[0]
+
+    def __getitem__(self, key):
+        if isinstance(key, tuple):
+            rows, columns = key[0], key[1:]
+            return unpack(self.packed[rows], self.dim, self.dtype)[(Ellipsis,) + columns]
+        return unpack(self.packed[key], self.dim, self.dtype)
+
+    def unpack(self):
+        return unpack(self.packed, self.dim, self.dtype)
+
+    def __array__(self, dtype=None):
+        # Full matrix, e.g. for normalizers
+        out = self.unpack()
+        if dtype is not None:
+            out = out.astype(dtype)
+        return out
+
+    @property
+    def nbytes(self):
+        return self.packed.nbytes
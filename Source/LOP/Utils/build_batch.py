@@ -2,14 +2,22 @@
 # -*- coding: utf8 -*-
 
 import numpy as np
+from numpy.lib.stride_tricks import as_strided
+from LOP.Utils.bit_packing import Bit_packed_matrix, bit_table
+
+def append_duration(piano, duration_piano):
+    # Piano input of the models using durations : durations as last column
+    return np.concatenate((np.asarray(piano), np.asarray(duration_piano).reshape([-1,1])), axis=1)
 
 def build_batch(batch_index_list, piano, orch, duration_piano, mask_orch, batch_size, temporal_order):
+    # duration_piano : None when the durations are already appended to piano (loaded blocks),
+    # else they are appended here (generation)
 
     batch_index = np.asarray(batch_index_list)
 
     # Add duration ?
     if duration_piano is not None:
-        piano = np.concatenate((piano, duration_piano.reshape([-1,1])), axis=1)
+        piano = append_duration(piano, duration_piano)
 
     # Build batch
     piano_t = piano[batch_index]
@@ -64,6 +72,122 @@ def build_sequence_from_3D_matrix(pr, index, seq_length):
     pr_out = np.stack(pr[batch_ind, time-seq_length+1:time+1] for (batch_ind, time) in enumerate(index))
     return pr_out
 
+def sliding_windows(pr, length, axis=0):
+    # Read-only view, windows[..., i, :length, ...] = pr[..., i:i+length, ...] along axis. Nothing is copied
+    n_windows = max(pr.shape[axis] - length + 1, 0)
+    shape = pr.shape[:axis] + (n_windows, length) + pr.shape[axis+1:]
+    strides = pr.strides[:axis] + (pr.strides[axis], pr.strides[axis]) + pr.strides[axis+1:]
+    return as_strided(pr, shape=shape, strides=strides, writeable=False)
+
+class Window_batch_builder(object):
+    """Same batches as build_batch, for blocks held in numpy arrays or bit-packed in numpy arrays.
+    Past and future contexts are gathered from a sliding window view of each matrix :
+    one fancy indexing per context, no index grid.
+    The views are recomputed at each batch (no copy, only shape and strides), so no block is kept alive between batches.
+    Bit-packed matrices are windowed on their packed rows, and only the gathered rows are unpacked,
+    in buffers reused across batches. The contexts and masks returned are overwritten by the next batch, orch_t is not.
+    Other matrices (virtual, or durations not appended) go through build_batch.
+    """
+    def __init__(self, temporal_order):
+        self.temporal_order = temporal_order
+        # Output buffers by name
+        self.buffers = {}
+        return
+
+    def get_windows(self, pr, axis=0):
+        return sliding_windows(pr, self.temporal_order-1, axis)
+
+    def get_buffer(self, name, shape, dtype):
+        buffer = self.buffers.get(name)
+        if (buffer is None) or (buffer.shape != shape) or (buffer.dtype != dtype):
+            buffer = np.empty(shape, dtype=dtype)
+            self.buffers[name] = buffer
+        return buffer
+
+    def get_ones(self, shape):
+        # Mask of the batches without mask : never written
+        ones = self.buffers.get('ones')
+        if (ones is None) or (ones.shape != shape):
+            ones = np.ones(shape)
+            self.buffers['ones'] = ones
+        return ones
+
+    def unpack_rows(self, pr, packed_rows, name=None):
+        # Packed rows (..., num_bytes) of a Bit_packed_matrix -> (..., dim), in the buffer name (new array if None)
+        table = bit_table(pr.dtype)
+        shape = packed_rows.shape + (8,)
+        if name is None:
+            bits = np.take(table, packed_rows, axis=0)
+        else:
+            # Bytes are always valid indices : 'clip' avoids the buffering of 'raise'
+            bits = np.take(table, packed_rows, axis=0, out=self.get_buffer(name, shape, table.dtype), mode='clip')
+        return bits.reshape(packed_rows.shape[:-1] + (8 * packed_rows.shape[-1],))[..., :pr.dim]
+
+    def get_contexts(self, name, pr, starts):
+        # Windows of temporal_order-1 rows of pr starting at starts
+        if isinstance(pr, Bit_packed_matrix):
+            return self.unpack_rows(pr, self.get_windows(pr.packed)[starts], name)
+        return self.get_windows(pr)[starts]
+
+    def get_rows(self, pr, index):
+        if isinstance(pr, Bit_packed_matrix):
+            return self.unpack_rows(pr, pr.packed[index])
+        return pr[index]
+
+    @staticmethod
+    def supported(pr):
+        return isinstance(pr, np.ndarray) or (isinstance(pr, Bit_packed_matrix) and isinstance(pr.packed, np.ndarray))
+
+    def build(self, batch_index_list, piano, orch, duration_piano, mask_orch):
+        batch_size = len(batch_index_list)
+        if (duration_piano is not None) or (not self.supported(piano)) or (not self.supported(orch)):
+            return build_batch(batch_index_list, piano, orch, duration_piano, mask_orch, batch_size, self.temporal_order)
+
+        batch_index = np.asarray(batch_index_list, dtype=np.int64)
+        past_starts = batch_index - (self.temporal_order-1)
+        future_starts = batch_index + 1
+
+        piano_t = self.get_rows(piano, batch_index)
+        piano_past = self.get_contexts('piano_past', piano, past_starts)
+        piano_future = self.get_contexts('piano_future', piano, future_starts)
+
+        if len(orch.shape) == 2:
+            orch_past = self.get_contexts('orch_past', orch, past_starts)
+            orch_future = self.get_contexts('orch_future', orch, future_starts)
+            orch_t = self.get_rows(orch, batch_index)
+            if mask_orch is None:
+                mask_orch_t = self.get_ones(orch_t.shape)
+            else:
+                mask_orch_t = mask_orch[batch_index]
+        elif orch.ndim == 3:
+            # One sequence per batch element
+            assert orch.shape[0] == batch_size
+            batch_range = np.arange(batch_size)
+            orch_windows = self.get_windows(orch, 1)
+            orch_past = orch_windows[batch_range, past_starts]
+            orch_future = orch_windows[batch_range, future_starts]
+            orch_t = orch[batch_range, batch_index]
+            if mask_orch is None:
+                mask_orch_t = self.get_ones(orch_t.shape)
+            else:
+                mask_orch_t = mask_orch[batch_range, batch_index]
+        return piano_t, piano_past, piano_future, orch_past, orch_future, orch_t, mask_orch_t
+
+def build_orch_frames(batch_index, orch, temporal_order):
+    """Distinct frames of the past orchestra windows of a batch (frame cache) :
+        orch_frames (num_frames, orch_dim), orch_past_index (batch, temporal_order-1) their positions in the windows,
+        frame_keys (num_frames,) time of the frames in orch (row * length + time for 3-D matrices)
+    """
+    times = np.asarray(batch_index, dtype=np.int64)[:, np.newaxis] + np.arange(-(temporal_order-1), 0)
+    if len(orch.shape) == 3:
+        keys = times + np.arange(len(times))[:, np.newaxis] * orch.shape[1]
+        orch = orch.reshape((-1, orch.shape[2]))
+    else:
+        keys = times
+    frame_keys, orch_past_index = np.unique(keys, return_inverse=True)
+    orch_frames = np.asarray(orch[frame_keys])
+    return orch_frames, orch_past_index.reshape(keys.shape), frame_keys
+
 ######
 # Those functions are used for generating sequences
 # with originally non-sequential models
@@ -8,14 +8,16 @@ Created on Mon Dec  4 16:30:20 2017
 
 import numpy as np
 import re
-from load_matrices import load_matrices
+from load_matrices import load_matrices, piano_array_name
+from LOP.Utils.bit_packing import as_array
 
 def get_activation_ratio(train_folds, orch_dim, parameters):
     num_activation = np.zeros((orch_dim))
     num_notes = 0
     # Compute statistique on each chunk
     for chunk in train_folds:
-        _, orch, _, _ = load_matrices(chunk["chunks_folders"], parameters)
+        _, orch, _, _ = load_matrices(chunk["chunks_folders"], parameters, arrays=['pr_orch'])
+        orch = as_array(orch)
         num_activation += np.sum(orch>0, axis=0)
         num_notes += float(orch.shape[0])
     ratio_activation = num_activation / num_notes
@@ -33,7 +35,8 @@ def get_mask_inter_orch_NADE(train_folds, orch_dim, parameters):
     num_time_frames = np.zeros((orch_dim))
     # Compute statistique on each chunk
     for chunk in train_folds:
-        _, orch, _, _ = load_matrices(chunk["chunks_folders"], parameters)
+        _, orch, _, _ = load_matrices(chunk["chunks_folders"], parameters, arrays=['pr_orch'])
+        orch = as_array(orch)
         for target_note in range(orch_dim):
             # Make sure it's binary
             frames_on = orch[:, target_note]>0
@@ -56,7 +59,9 @@ def get_mask_piano_orch_NADE(train_folds, piano_dim, orch_dim, parameters):
     num_time_frames = np.zeros((orch_dim))
     # Compute statistique on each chunk
     for chunk in train_folds:
-        piano, orch, _, _ = load_matrices(chunk["chunks_folders"], parameters)
+        piano, orch, _, _ = load_matrices(chunk["chunks_folders"], parameters, arrays=[piano_array_name(parameters), 'pr_orch'])
+        piano = as_array(piano)
+        orch = as_array(orch)
         for target_note in range(piano_dim):
             # Make sure it's binary
             frames_on = piano[:, target_note]>0
@@ -78,7 +83,8 @@ def get_mean_number_units_on(train_folds, parameters):
     num_notes_on = []
     # Compute statistique on each chunk
     for chunk in train_folds:
-        _, orch, _, _ = load_matrices(chunk["chunks_folders"], parameters)
+        _, orch, _, _ = load_matrices(chunk["chunks_folders"], parameters, arrays=['pr_orch'])
+        orch = as_array(orch)
         this_num_notes_on = np.sum(orch>0, axis=1)
         num_notes_on.extend(this_num_notes_on)
     mean_number_on = sum(num_notes_on) / float(len(num_notes_on))
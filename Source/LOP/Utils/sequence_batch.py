@@ -0,0 +1,102 @@
+#!/usr/bin/env python
+# -*- coding: utf8 -*-
+
+import numpy as np
+
+# Sequence mode : instead of one window of temporal_order frames per target,
+# recurrent models are fed contiguous segments of a block and predict every frame in one pass.
+# Consecutive segments of a chunk overlap by temporal_order-1 frames,
+# so that each valid index is the target of exactly one segment, with at least temporal_order-1 frames of context.
+
+
+def build_segments(valid_indices, durations, temporal_order, sequence_length):
+    """Segments of at most sequence_length frames in the chunks of a block (durations : lengths of its chunks).
+    Returns starts, ends (segment i is [starts[i], ends[i]) in the block) and targets,
+    boolean matrix (num_segments, sequence_length) : frame starts[i]+j is a valid index predicted in segment i
+    """
+    context = temporal_order - 1
+    stride = sequence_length - context
+    assert stride > 0, "sequence_length must be larger than temporal_order-1"
+    durations = np.asarray(durations, dtype=np.int64)
+    total_duration = durations.sum()
+    chunk_starts = np.cumsum(durations) - durations
+
+    starts = []
+    ends = []
+    for chunk_start, duration in zip(chunk_starts, durations):
+        this_starts = np.arange(chunk_start, chunk_start + duration - context, stride)
+        starts.append(this_starts)
+        ends.append(np.minimum(this_starts + sequence_length, chunk_start + duration))
+    starts = np.concatenate(starts + [np.zeros((0,), dtype=np.int64)])
+    ends = np.concatenate(ends + [np.zeros((0,), dtype=np.int64)])
+
+    valid = np.zeros((total_duration,), dtype=bool)
+    valid[np.asarray(valid_indices, dtype=np.int64)] = True
+    positions = starts[:, np.newaxis] + np.arange(sequence_length)
+    targets = (positions < ends[:, np.newaxis]) & (np.arange(sequence_length) >= context)
+    targets &= valid[np.minimum(positions, max(total_duration-1, 0))]
+
+    # Segments without any target are useless
+    keep = targets.any(axis=1)
+    return starts[keep].astype(np.int32), ends[keep].astype(np.int32), targets[keep]
+
+
+def batch_segments(segments, batch_size, random_inst):
+    """Shuffled batches of segments, as (starts, ends, targets) tuples
+    """
+    starts, ends, targets = segments
+    order = np.arange(len(starts))
+    random_inst.shuffle(order)
+    batches = []
+    for batch_start in range(0, len(order), batch_size):
+        batch_ind = np.sort(order[batch_start:batch_start+batch_size])
+        batches.append((starts[batch_ind], ends[batch_ind], targets[batch_ind]))
+    return batches
+
+
+def build_sequence_batch(segments_batch, piano, orch):
+    """Inputs of a batch of segments :
+        piano_seq (batch, sequence_length, piano_dim) : piano at each frame
+        orch_past_seq (batch, sequence_length, orch_dim) : orchestra at the previous frame (zeros for the first frame of a segment)
+        orch_t (num_targets, orch_dim) : orchestra at the targets
+        targets (batch, sequence_length)
+    Frames after the end of a segment repeat its last frame, they are never targets.
+    """
+    starts, ends, targets = segments_batch
+    batch_size, sequence_length = targets.shape
+    positions = np.minimum(starts[:, np.newaxis] + np.arange(sequence_length), ends[:, np.newaxis] - 1).ravel()
+    piano_seq = np.asarray(piano[positions]).reshape((batch_size, sequence_length, -1))
+    orch_seq = np.asarray(orch[positions]).reshape((batch_size, sequence_length, -1))
+    orch_past_seq = np.zeros_like(orch_seq)
+    orch_past_seq[:, 1:] = orch_seq[:, :-1]
+    orch_t = orch_seq[targets]
+    return piano_seq, orch_past_seq, orch_t, targets
+
+
+def build_window_sequence_batch(batch_index, piano, orch, temporal_order):
+    """Windows of a windowed batch as segments of temporal_order frames, predicted at their last frame only,
+    for the models trained in sequence mode to be validated and generate with windows.
+    Same outputs as build_sequence_batch. 3-D matrices (batch, time, dim) are indexed by row (generation)
+    """
+    batch_index = np.asarray(batch_index)
+    positions = batch_index[:, np.newaxis] + np.arange(-(temporal_order-1), 1)
+    rows = np.arange(len(batch_index))[:, np.newaxis]
+
+    def gather(pr):
+        if len(pr.shape) == 3:
+            return np.asarray(pr[rows, positions])
+        return np.asarray(pr[positions])
+
+    piano_seq = gather(piano)
+    orch_seq = gather(orch)
+    orch_past_seq = np.zeros_like(orch_seq)
+    orch_past_seq[:, 1:] = orch_seq[:, :-1]
+    orch_t = orch_seq[:, -1]
+    targets = np.zeros(positions.shape, dtype=bool)
+    targets[:, -1] = True
+    return piano_seq, orch_past_seq, orch_t, targets
+
+
+def count_targets(batches):
+    # Number of targets in a list of batches (windows or segments)
+    return sum([e[2].sum() if isinstance(e, tuple) else len(e) for e in batches])
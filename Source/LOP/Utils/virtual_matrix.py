@@ -0,0 +1,67 @@
+#!/usr/bin/env python
+# -*- coding: utf8 -*-
+
+import numpy as np
+
+# Rows of several chunks seen as one (T, N) matrix, without concatenating them.
+# Chunks are typically memory-mapped (np.load(mmap_mode='r') or slices of a packed store),
+# so only the rows gathered by build_batch are read.
+
+
+class Virtual_matrix(object):
+    """Concatenation along the time axis of a list of arrays.
+    Behaves like a numpy array for row indexing (integers, slices, lists or arrays of indices) :
+    global indices are remapped to (chunk, offset) and rows are gathered chunk by chunk.
+    """
+    def __init__(self, chunks, dtype=None):
+        self.chunks = chunks
+        lengths = [len(e) for e in chunks]
+        # starts[i] = first global index of chunk i, starts[-1] = total length
+        self.starts = np.concatenate(([0], np.cumsum(lengths))).astype(np.int64)
+        if dtype is None:
+            dtype = chunks[0].dtype
+        self.dtype = np.dtype(dtype)
+        self.shape = (int(self.starts[-1]),) + tuple(chunks[0].shape[1:])
+        return
+
+    def __len__(self):
+        return self.shape[0]
+
+    def locate(self, index):
+        # Global indices -> (chunk indices, offsets in the chunks)
+        chunk_index = np.searchsorted(self.starts, index, side='right') - 1
+        return chunk_index, index - self.starts[chunk_index]
+
+    def gather(self, index):
+        index = np.asarray(index, dtype=np.int64)
+        flat_index = index.ravel()
+        # Negative indices count from the end, as in numpy
+        flat_index = np.where(flat_index < 0, flat_index + len(self), flat_index)
+        chunk_index, offset = self.locate(flat_index)
+        out = np.empty((len(flat_index),) + self.shape[1:], dtype=self.dtype)
+        for this_chunk in np.unique(chunk_index):
+            selected = (chunk_index == this_chunk)
+            out[selected] = self.chunks[this_chunk][offset[selected]]
+        return out.reshape(index.shape + self.shape[1:])
+
+    def __getitem__(self, key):
+        if isinstance(key, tuple):
+            rows, columns = key[0], key[1:]
+            return self[rows][(Ellipsis,) + columns]
+        if isinstance(key, slice):
+            start, stop, step = key.indices(len(self))
+            return self.gather(np.arange(start, stop, step))
+        if np.isscalar(key):
+            return self.gather([key])[0]
+        return self.gather(key)
+
+    def __array__(self, dtype=None):
+        # Full matrix, e.g. for normalizers or statistics
+        out = self.gather(np.arange(len(self)))
+        if dtype is not None:
+            out = out.astype(dtype)
+        return out
+
+    @property
+    def nbytes(self):
+        return sum([e.nbytes for e in self.chunks])
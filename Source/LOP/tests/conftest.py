@@ -0,0 +1,63 @@
+#!/usr/bin/env python
+# -*- coding: utf8 -*-
+
+import os
+import sys
+
+# Scripts modules import each other without the LOP prefix
+SOURCE = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..'))
+for path in [SOURCE, os.path.join(SOURCE, 'LOP', 'Scripts')]:
+    if path not in sys.path:
+        sys.path.insert(0, path)
+
+import numpy as np
+import pytest
+
+N_PIANO = 12
+N_ORCHESTRA = 10
+
+
+@pytest.fixture
+def database(tmp_path):
+    """Chunk folders of a small random database (subset A), their arrays and the matching parameters
+    """
+    rng = np.random.RandomState(0)
+    chunks = []
+    for counter, length in enumerate([6, 9, 4]):
+        chunk_folder = os.path.join(str(tmp_path), 'store', 'A', '{}_0'.format(counter))
+        os.makedirs(chunk_folder)
+        arrays = {'pr_piano': (rng.rand(length, N_PIANO) > 0.7).astype(np.float16),
+            'pr_piano_embedded': rng.rand(length, 5).astype(np.float16),
+            'pr_orch': (rng.rand(length, N_ORCHESTRA) > 0.7).astype(np.float16),
+            'duration_piano': rng.randint(1, 5, size=length).astype(np.float16),
+            'mask_orch': np.ones((length, N_ORCHESTRA), dtype=np.float16)}
+        for kind, array in arrays.items():
+            np.save(os.path.join(chunk_folder, kind + '.npy'), array)
+        chunks.append((chunk_folder, arrays))
+    parameters = {'embedded_piano': False, 'duration_piano': False, 'mask_orch': False,
+        'chunk_size': 10, 'N_piano': N_PIANO, 'N_piano_embedded': 5, 'N_orchestra': N_ORCHESTRA,
+        'normalizer': 'no_normalization'}
+    return chunks, parameters
+
+
+@pytest.fixture
+def assert_same_matrices():
+    # Outputs of two loaders : same matrices, None at the same places
+    def check(matrices, expected):
+        assert len(matrices) == len(expected)
+        for a, b in zip(matrices, expected):
+            if a is None:
+                assert b is None
+            else:
+                np.testing.assert_array_equal(np.asarray(a), np.asarray(b))
+    return check
+
+
+class Identity_normalizer(object):
+    def transform(self, pr):
+        return pr
+
+
+@pytest.fixture
+def identity_normalizer():
+    return Identity_normalizer()
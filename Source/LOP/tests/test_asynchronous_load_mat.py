@@ -0,0 +1,27 @@
+#!/usr/bin/env python
+# -*- coding: utf8 -*-
+
+import numpy as np
+
+import load_matrices
+from LOP.Scripts.asynchronous_load_mat import async_load_mat
+from LOP.Utils.build_batch import build_batch, Window_batch_builder
+
+TEMPORAL_ORDER = 3
+
+
+def test_durations_appended_once_per_block(database, identity_normalizer):
+    chunks, parameters = database
+    chunk_folders = [e[0] for e in chunks]
+    parameters['duration_piano'] = True
+    piano, orch, duration_piano, _ = load_matrices.load_matrices(chunk_folders, parameters)
+    piano_input, orch_input, no_duration, _ = async_load_mat(identity_normalizer, chunk_folders, parameters)
+    assert no_duration is None
+    assert piano_input.shape == (len(piano), piano.shape[1] + 1)
+    # Same batches as when durations were appended at each batch
+    batch_index = np.arange(TEMPORAL_ORDER-1, len(piano)-TEMPORAL_ORDER+1)
+    reference = build_batch(batch_index, piano, orch, duration_piano, None, len(batch_index), TEMPORAL_ORDER)
+    for builder in [lambda: build_batch(batch_index, piano_input, orch_input, None, None, len(batch_index), TEMPORAL_ORDER),
+            lambda: Window_batch_builder(TEMPORAL_ORDER).build(batch_index, piano_input, orch_input, None, None)]:
+        for a, b in zip(reference, builder()):
+            np.testing.assert_array_equal(a, b)
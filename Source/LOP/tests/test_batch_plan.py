@@ -0,0 +1,45 @@
+#!/usr/bin/env python
+# -*- coding: utf8 -*-
+
+import numpy as np
+
+from LOP.Utils.batch_plan import Batch_plan, save_fold, load_fold
+
+
+def list_batches(indices, batch_size):
+    # Former plans : list of lists of ints
+    return [list(indices[i:i+batch_size]) for i in range(0, len(indices), batch_size)]
+
+
+def test_same_batches_as_lists():
+    indices = list(np.random.RandomState(0).permutation(103))
+    for batch_size in [1, 10, 103, 200]:
+        plan = Batch_plan.from_indices(indices, batch_size)
+        batches = list_batches(indices, batch_size)
+        assert len(plan) == len(batches)
+        assert [list(e) for e in plan] == batches
+        assert list(plan[-1]) == batches[-1]
+        assert plan[0].dtype == np.int32
+    assert [list(e) for e in Batch_plan.from_indices(indices, None)] == [indices]
+    assert len(Batch_plan.from_indices([], 10)) == 0
+
+
+def test_fold_round_trip(tmp_path):
+    rng = np.random.RandomState(0)
+    def block(n_ind, chunks):
+        return {'batches': Batch_plan.from_indices(rng.permutation(n_ind), 7),
+            'batches_lr': Batch_plan.from_indices(rng.permutation(n_ind // 2), 7),
+            'chunks_folders': chunks}
+    fold = {'train': [block(30, ['a/0_0']), block(0, ['a/1_0']), block(15, ['a/2_0', 'a/3_0'])],
+        'valid': [block(12, ['b/0_0'])],
+        'test': []}
+    save_fold(fold, str(tmp_path), 'fold_0')
+    for mmap_mode in ['r', None]:
+        loaded = load_fold(str(tmp_path), 'fold_0', mmap_mode=mmap_mode)
+        assert sorted(loaded.keys()) == sorted(fold.keys())
+        for split_name, blocks in fold.items():
+            assert len(loaded[split_name]) == len(blocks)
+            for block, loaded_block in zip(blocks, loaded[split_name]):
+                assert loaded_block['chunks_folders'] == block['chunks_folders']
+                for key in ['batches', 'batches_lr']:
+                    assert [list(e) for e in loaded_block[key]] == [list(e) for e in block[key]]
@@ -0,0 +1,32 @@
+#!/usr/bin/env python
+# -*- coding: utf8 -*-
+
+import numpy as np
+
+from LOP.Utils import bit_packing
+from LOP.Utils.bit_packing import Bit_packed_matrix
+
+
+def random_pr(shape=(50, 93), seed=0):
+    return (np.random.RandomState(seed).rand(*shape) > 0.8).astype(np.float16)
+
+
+def test_round_trip():
+    for dim in [1, 8, 93, 128]:
+        pr = random_pr((30, dim))
+        packed = bit_packing.pack(pr)
+        assert packed.shape == (30, bit_packing.num_bytes(dim))
+        np.testing.assert_array_equal(bit_packing.unpack(packed, dim), pr)
+
+
+def test_indexing_same_as_the_dense_matrix():
+    pr = random_pr()
+    matrix = Bit_packed_matrix(bit_packing.pack(pr), pr.shape[1])
+    assert matrix.shape == pr.shape
+    index = np.array([3, 0, 49, 3])
+    np.testing.assert_array_equal(matrix[index], pr[index])
+    np.testing.assert_array_equal(matrix[10:20], pr[10:20])
+    np.testing.assert_array_equal(matrix[index, 5:40], pr[index, 5:40])
+    np.testing.assert_array_equal(np.asarray(matrix), pr)
+    np.testing.assert_array_equal(bit_packing.as_array(matrix), pr)
+    assert matrix.nbytes * 8 < pr.nbytes
@@ -0,0 +1,38 @@
+#!/usr/bin/env python
+# -*- coding: utf8 -*-
+
+import numpy as np
+
+import load_matrices
+from LOP.Scripts.block_cache import Block_cache
+
+
+def test_least_recently_used_is_evicted():
+    cache = Block_cache(budget=300)
+    arrays = {key: np.zeros(100, dtype=np.uint8) for key in 'abcd'}
+    for key in 'abc':
+        cache.put(key, arrays[key])
+    assert cache.get('a') is arrays['a']
+    cache.put('d', arrays['d'])
+    assert cache.get('b') is None
+    assert all([cache.get(key) is arrays[key] for key in 'acd'])
+    assert cache.size == 300
+    assert cache.evictions == 1
+    # Larger than the budget : not cached
+    cache.put('e', np.zeros(400, dtype=np.uint8))
+    assert cache.get('e') is None
+
+
+def test_cached_blocks_same_as_loaded_blocks(database, monkeypatch, assert_same_matrices):
+    chunks, parameters = database
+    monkeypatch.setattr(load_matrices, 'block_cache', Block_cache())
+    chunk_folders = [e[0] for e in chunks]
+    parameters['block_cache_budget'] = 0
+    expected = load_matrices.load_matrices(chunk_folders, parameters)
+    parameters['block_cache_budget'] = 1
+    for _ in range(2):
+        assert_same_matrices(load_matrices.load_matrices(chunk_folders, parameters), expected)
+    assert load_matrices.block_cache.hits == len(load_matrices.required_arrays(parameters))
+    # Another parameter set is another entry
+    parameters['duration_piano'] = True
+    assert load_matrices.load_matrices(chunk_folders, parameters)[2] is not None
@@ -0,0 +1,88 @@
+#!/usr/bin/env python
+# -*- coding: utf8 -*-
+
+import gc
+import weakref
+import numpy as np
+
+from LOP.Utils.build_batch import build_batch, Window_batch_builder, build_orch_frames
+from LOP.Utils.bit_packing import Bit_packed_matrix, pack
+
+TEMPORAL_ORDER = 5
+
+
+def random_block(length=80, seed=0):
+    rng = np.random.RandomState(seed)
+    piano = rng.rand(length, 7).astype(np.float32)
+    orch = (rng.rand(length, 9) > 0.7).astype(np.float32)
+    batch_index = rng.randint(TEMPORAL_ORDER-1, length-TEMPORAL_ORDER+1, size=16)
+    return piano, orch, batch_index
+
+
+def test_same_batch_as_build_batch():
+    piano, orch, batch_index = random_block()
+    mask_orch = np.ones_like(orch)
+    builder = Window_batch_builder(TEMPORAL_ORDER)
+    reference = build_batch(batch_index, piano, orch, None, mask_orch, len(batch_index), TEMPORAL_ORDER)
+    windowed = builder.build(batch_index, piano, orch, None, mask_orch)
+    for a, b in zip(reference, windowed):
+        np.testing.assert_array_equal(a, b)
+
+
+def test_generation_matrices():
+    # 3-D orchestra : one sequence per batch element
+    piano, _, _ = random_block()
+    orch_gen = (np.random.RandomState(1).rand(4, 80, 9) > 0.7).astype(np.float32)
+    batch_index = np.tile(30, 4)
+    _, piano_past, _, orch_past, orch_future, orch_t, _ = Window_batch_builder(TEMPORAL_ORDER).build(batch_index, piano, orch_gen, None, None)
+    np.testing.assert_array_equal(piano_past[0], piano[30-(TEMPORAL_ORDER-1):30])
+    np.testing.assert_array_equal(orch_past, orch_gen[:, 30-(TEMPORAL_ORDER-1):30])
+    np.testing.assert_array_equal(orch_future, orch_gen[:, 31:31+TEMPORAL_ORDER-1])
+    np.testing.assert_array_equal(orch_t, orch_gen[:, 30])
+
+
+def test_block_is_not_kept_alive():
+    piano, orch, batch_index = random_block()
+    builder = Window_batch_builder(TEMPORAL_ORDER)
+    batch = builder.build(batch_index, piano, orch, None, None)
+    references = [weakref.ref(piano), weakref.ref(orch)]
+    del piano, orch, batch
+    gc.collect()
+    assert all([e() is None for e in references])
+
+
+def test_orch_frames_rebuild_the_windows():
+    piano, orch, batch_index = random_block()
+    orch_past = build_batch(batch_index, piano, orch, None, None, len(batch_index), TEMPORAL_ORDER)[3]
+    orch_frames, orch_past_index, frame_keys = build_orch_frames(batch_index, orch, TEMPORAL_ORDER)
+    assert len(np.unique(frame_keys)) == len(frame_keys)
+    np.testing.assert_array_equal(orch_frames[orch_past_index], orch_past)
+
+
+def test_bit_packed_matrices():
+    piano, orch, batch_index = random_block()
+    packed_piano = Bit_packed_matrix(pack(piano > 0.5), piano.shape[1])
+    packed_orch = Bit_packed_matrix(pack(orch), orch.shape[1])
+    builder = Window_batch_builder(TEMPORAL_ORDER)
+    reference = build_batch(batch_index, packed_piano, packed_orch, None, None, len(batch_index), TEMPORAL_ORDER)
+    windowed = builder.build(batch_index, packed_piano, packed_orch, None, None)
+    for a, b in zip(reference, windowed):
+        assert a.dtype == b.dtype
+        np.testing.assert_array_equal(a, b)
+    np.testing.assert_array_equal(windowed[3], builder.build(batch_index, piano, orch, None, None)[3])
+    # Empty batch
+    assert builder.build(batch_index[:0], packed_piano, packed_orch, None, None)[3].shape == (0, TEMPORAL_ORDER-1, orch.shape[1])
+
+
+def test_buffers_reused_across_batches():
+    piano, orch, batch_index = random_block()
+    packed_orch = Bit_packed_matrix(pack(orch), orch.shape[1])
+    builder = Window_batch_builder(TEMPORAL_ORDER)
+    first = builder.build(batch_index, piano, packed_orch, None, None)
+    orch_t = first[5].copy()
+    second = builder.build(batch_index[::-1], piano, packed_orch, None, None)
+    # Contexts and mask in the same buffers, orch_t is a new array
+    for ind in [3, 4, 6]:
+        assert np.shares_memory(first[ind], second[ind])
+    assert not np.shares_memory(first[5], second[5])
+    np.testing.assert_array_equal(first[5], orch_t)
@@ -0,0 +1,49 @@
+#!/usr/bin/env python
+# -*- coding: utf8 -*-
+
+import os
+import pickle as pkl
+import numpy as np
+import pytest
+
+from LOP.Database import chunk_manifest, chunk_store
+
+
+@pytest.fixture(autouse=True)
+def empty_registries(monkeypatch):
+    monkeypatch.setattr(chunk_manifest, '_manifests', {})
+    monkeypatch.setattr(chunk_store, '_stores', {})
+
+
+def silences(pr_piano, pr_orch):
+    # Former silence test of load_data
+    flat_pr = (pr_piano.sum(axis=1) > 0) * (pr_orch.sum(axis=1) > 0)
+    return [e for e in range(len(pr_piano)) if flat_pr[e] != 0]
+
+
+def test_non_silent_frames(database):
+    chunks, _ = database
+    for _, arrays in chunks:
+        pr_piano, pr_orch = arrays['pr_piano'], arrays['pr_orch']
+        pr_orch[1] = 0
+        entry = chunk_manifest.chunk_entry(pr_piano, pr_orch)
+        assert entry['length'] == len(pr_piano)
+        assert list(np.flatnonzero(chunk_manifest.non_silent(entry))) == silences(pr_piano, pr_orch)
+        # Same entry from the bit-packed matrices
+        packed_entry = chunk_manifest.chunk_entry(np.packbits(pr_piano > 0, axis=1), np.packbits(pr_orch > 0, axis=1))
+        np.testing.assert_array_equal(packed_entry['non_silent'], entry['non_silent'])
+
+
+def test_manifest_of_an_existing_database(database):
+    chunks, _ = database
+    chunk_folders = [e[0] for e in chunks]
+    store_folder = os.path.dirname(os.path.dirname(chunk_folders[0]))
+    assert chunk_manifest.get_entry(chunk_folders[0]) is None
+    with open(os.path.join(store_folder, 'train_only_A.pkl'), 'wb') as ff:
+        pkl.dump({'score_0': chunk_folders[:2], 'score_1': [chunk_folders[2] + '/']}, ff)
+    chunk_manifest.build_manifest(store_folder)
+    for chunk_folder, arrays in chunks:
+        entry = chunk_manifest.get_entry(chunk_folder + '/')
+        expected = chunk_manifest.chunk_entry(arrays['pr_piano'], arrays['pr_orch'])
+        assert entry['length'] == expected['length']
+        np.testing.assert_array_equal(entry['non_silent'], expected['non_silent'])
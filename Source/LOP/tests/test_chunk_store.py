@@ -0,0 +1,58 @@
+#!/usr/bin/env python
+# -*- coding: utf8 -*-
+
+import os
+import shutil
+import numpy as np
+import pytest
+
+from LOP.Database import chunk_store
+
+
+@pytest.fixture(autouse=True)
+def empty_registries(monkeypatch):
+    monkeypatch.setattr(chunk_store, '_stores', {})
+    monkeypatch.setattr(chunk_store, '_packed_roots', {})
+
+
+def write_database(store_folder, lengths):
+    rng = np.random.RandomState(0)
+    chunks = {}
+    for counter, length in enumerate(lengths):
+        chunk_folder = os.path.join(store_folder, 'A', '{}_0'.format(counter))
+        os.makedirs(chunk_folder)
+        chunks[chunk_folder] = {'pr_piano': rng.rand(length, 4).astype(np.float32),
+            'pr_orch': (rng.rand(length, 3) > 0.5).astype(np.float32)}
+        for kind, array in chunks[chunk_folder].items():
+            np.save(os.path.join(chunk_folder, kind + '.npy'), array)
+    return chunks
+
+
+def test_packed_chunks_same_as_chunk_folders(tmp_path):
+    store_folder = str(tmp_path / 'store')
+    chunks = write_database(store_folder, [5, 12, 1])
+    assert chunk_store.get_store(list(chunks.keys())[0]) is None
+    chunk_store.pack_subset(os.path.join(store_folder, 'A'))
+    for chunk_folder, arrays in chunks.items():
+        store = chunk_store.get_store(chunk_folder)
+        assert store.chunk_length(chunk_folder) == len(arrays['pr_piano'])
+        for kind, array in arrays.items():
+            np.testing.assert_array_equal(store.load_chunk(chunk_folder, kind), array)
+
+
+def test_packed_root_whatever_the_path_spelling(tmp_path, monkeypatch):
+    store_folder = str(tmp_path / 'store')
+    chunks = write_database(store_folder, [5, 7])
+    chunk_store.pack_subset(os.path.join(store_folder, 'A'))
+    # Copy of the packed store, modified to know which one is read
+    packed_root = str(tmp_path / 'copy')
+    shutil.copytree(os.path.join(store_folder, 'A', chunk_store.PACKED_FOLDER), os.path.join(packed_root, 'A'))
+    np.save(os.path.join(packed_root, 'A', 'pr_orch.npy'), np.zeros((12, 3), dtype=np.float32))
+
+    chunk_folder = list(chunks.keys())[0]
+    assert chunk_store.get_store(chunk_folder).load_chunk(chunk_folder, 'pr_orch').any()
+    # Relative store folder with a trailing '/', absolute chunk paths
+    monkeypatch.chdir(str(tmp_path))
+    chunk_store.set_packed_root('store/', packed_root)
+    assert not chunk_store.get_store(chunk_folder).load_chunk(chunk_folder, 'pr_orch').any()
+    assert chunk_store.get_store('store/A/0_0/') is chunk_store.get_store(chunk_folder)
@@ -0,0 +1,85 @@
+#!/usr/bin/env python
+# -*- coding: utf8 -*-
+
+import numpy as np
+import pytest
+
+tf = pytest.importorskip("tensorflow")
+pytest.importorskip("keras")
+pytest.importorskip("hyperopt")
+
+from LOP.Models.Real_time.Conv_reccurent.conv_lstm_1 import Conv_lstm_1
+from LOP.Utils.build_batch import Window_batch_builder, build_orch_frames
+
+TEMPORAL_ORDER = 4
+PIANO_DIM = 30
+ORCH_DIM = 40
+
+
+def build_model(gru_on_orch_embedding=True):
+    model_param = {'gru_on_orch_embedding': gru_on_orch_embedding,
+        'dropout_probability': 0., 'weight_decay_coeff': 0., 'tn_weight': 0., 'sparsity_coeff': 0.,
+        'num_filter_piano': (4, 3), 'kernel_size_piano': (5, 5),
+        'num_filter_orch': (4, 3), 'kernel_size_orch': (5, 5),
+        'embeddings_size': 8, 'gru_orch': (6,), 'mlp_pred': (10,),
+    }
+    dimensions = {'temporal_order': TEMPORAL_ORDER, 'piano_input_dim': PIANO_DIM, 'orch_dim': ORCH_DIM}
+    return Conv_lstm_1(model_param, dimensions)
+
+
+def test_frame_cache_same_predictions():
+    # Same weights, windows of past frames or distinct frames gathered in the windows
+    rng = np.random.RandomState(0)
+    piano = rng.rand(50, PIANO_DIM).astype(np.float32)
+    orch = (rng.rand(50, ORCH_DIM) > 0.8).astype(np.float32)
+    batch_index = np.array([3, 4, 10, 11, 12, 30], dtype=np.int32)
+    piano_t, _, _, orch_past = Window_batch_builder(TEMPORAL_ORDER).build(batch_index, piano, orch, None, None)[:4]
+    orch_frames, orch_past_index, _ = build_orch_frames(batch_index, orch, TEMPORAL_ORDER)
+
+    with tf.Graph().as_default():
+        piano_ph = tf.placeholder(tf.float32, shape=(None, PIANO_DIM))
+        orch_past_ph = tf.placeholder(tf.float32, shape=(None, TEMPORAL_ORDER-1, ORCH_DIM))
+        orch_frames_ph = tf.placeholder(tf.float32, shape=(None, ORCH_DIM))
+        orch_past_index_ph = tf.placeholder(tf.int32, shape=(None, TEMPORAL_ORDER-1))
+        inputs_ph = (piano_ph, None, None, orch_past_ph, None)
+
+        with tf.variable_scope("windows"):
+            model = build_model()
+            prediction_windows, _ = model.predict(inputs_ph)
+        variables_windows = tf.trainable_variables()
+        with tf.variable_scope("frames"):
+            model = build_model()
+            model.orch_frames_input = (orch_frames_ph, orch_past_index_ph)
+            prediction_frames, _ = model.predict(inputs_ph)
+        variables_frames = tf.trainable_variables()[len(variables_windows):]
+        assert len(variables_windows) == len(variables_frames)
+        copy_weights = [b.assign(a) for a, b in zip(variables_windows, variables_frames)]
+
+        with tf.Session() as sess:
+            sess.run(tf.global_variables_initializer())
+            sess.run(copy_weights)
+            pred_windows = sess.run(prediction_windows, {piano_ph: piano_t, orch_past_ph: orch_past})
+            pred_frames = sess.run(prediction_frames, {piano_ph: piano_t, orch_frames_ph: orch_frames, orch_past_index_ph: orch_past_index})
+
+    np.testing.assert_allclose(pred_windows, pred_frames, rtol=1e-5, atol=1e-6)
+
+
+def test_gru_reads_the_raw_frames_by_default():
+    rng = np.random.RandomState(0)
+    piano_t = rng.rand(6, PIANO_DIM).astype(np.float32)
+    orch_past = (rng.rand(6, TEMPORAL_ORDER-1, ORCH_DIM) > 0.8).astype(np.float32)
+    with tf.Graph().as_default():
+        piano_ph = tf.placeholder(tf.float32, shape=(None, PIANO_DIM))
+        orch_past_ph = tf.placeholder(tf.float32, shape=(None, TEMPORAL_ORDER-1, ORCH_DIM))
+        model = build_model(gru_on_orch_embedding=False)
+        assert not model.frame_cache_supported()
+        prediction, _ = model.predict((piano_ph, None, None, orch_past_ph, None))
+        # The pitch convolutions are built but do not change the prediction
+        conv_kernels = [e for e in tf.trainable_variables() if 'conv1d' in e.name and 'kernel' in e.name][2:]
+        assert conv_kernels
+        with tf.Session() as sess:
+            sess.run(tf.global_variables_initializer())
+            feed_dict = {piano_ph: piano_t, orch_past_ph: orch_past}
+            pred = sess.run(prediction, feed_dict)
+            sess.run([e.assign(tf.zeros_like(e)) for e in conv_kernels])
+            np.testing.assert_array_equal(sess.run(prediction, feed_dict), pred)
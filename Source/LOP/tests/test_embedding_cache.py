@@ -0,0 +1,42 @@
+#!/usr/bin/env python
+# -*- coding: utf8 -*-
+
+import numpy as np
+import pytest
+
+torch = pytest.importorskip("torch")
+
+from LOP.Embedding.embedding_cache import Embedding_cache
+
+
+class Frame_embedding(torch.nn.Module):
+    # Same call as the piano embedding models : (batch, 1, 128), 0 -> (batch, dim)
+    def __init__(self):
+        super(Frame_embedding, self).__init__()
+        self.linear = torch.nn.Linear(128, 6)
+
+    def forward(self, x, _):
+        return torch.tanh(self.linear(x[:, 0]))
+
+
+def test_same_embeddings_as_every_frame(tmp_path):
+    torch.manual_seed(0)
+    model = Frame_embedding()
+    checkpoint = str(tmp_path / 'embedding.pth')
+    torch.save(model.state_dict(), checkpoint)
+    # Few distinct chords, repeated
+    chords = (np.random.RandomState(0).rand(5, 40) > 0.7).astype(np.float32)
+    pr_piano = chords[np.random.RandomState(1).randint(0, 5, size=60)]
+    frames = np.zeros((60, 128), dtype=np.float32)
+    frames[:, 30:70] = pr_piano
+    with torch.no_grad():
+        expected = model(torch.from_numpy(frames).unsqueeze(1), 0).numpy()
+
+    cache = Embedding_cache(model, checkpoint, cache_folder=str(tmp_path / 'cache'), batch_size=2)
+    np.testing.assert_allclose(cache.embed(pr_piano, 30, 70), expected, rtol=1e-6)
+    assert cache.num_embedded <= 5
+    cache.save()
+    # Table reloaded : nothing is embedded again
+    cache = Embedding_cache(model, checkpoint, cache_folder=str(tmp_path / 'cache'))
+    np.testing.assert_allclose(cache.embed(pr_piano[::-1], 30, 70), expected[::-1], rtol=1e-6)
+    assert cache.num_embedded == 0
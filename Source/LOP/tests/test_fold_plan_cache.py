@@ -0,0 +1,36 @@
+#!/usr/bin/env python
+# -*- coding: utf8 -*-
+
+import os
+from LOP.Database import fold_plan_cache
+
+SPLIT_PARAMETERS = {'num_k_folds': 10, 'temporal_order': 5, 'batch_size': 100, 'long_range': 5, 'num_max_contiguous_blocks': 4}
+
+
+def test_round_trip(tmp_path):
+    database_path = str(tmp_path)
+    with open(os.path.join(database_path, 'metadata.pkl'), 'wb') as ff:
+        ff.write(b'metadata')
+    plan = {'K_folds': [{'train': [{'batches': [[0, 1, 2], [3, 4]], 'chunks_folders': ['A/0_0']}]}],
+        'train_names': ['score_0']}
+    assert fold_plan_cache.load(database_path, 'k_folds', SPLIT_PARAMETERS) is None
+    fold_plan_cache.save(database_path, 'k_folds', SPLIT_PARAMETERS, plan)
+    loaded = fold_plan_cache.load(database_path, 'k_folds', SPLIT_PARAMETERS)
+    assert loaded['train_names'] == plan['train_names']
+    block = loaded['K_folds'][0]['train'][0]
+    assert block['chunks_folders'] == ['A/0_0']
+    assert [list(e) for e in block['batches']] == [list(e) for e in plan['K_folds'][0]['train'][0]['batches']]
+
+
+def test_other_strategy_parameters_or_database(tmp_path):
+    database_path = str(tmp_path)
+    metadata_path = os.path.join(database_path, 'metadata.pkl')
+    with open(metadata_path, 'wb') as ff:
+        ff.write(b'metadata')
+    fold_plan_cache.save(database_path, 'k_folds', SPLIT_PARAMETERS, {'K_folds': []})
+    assert fold_plan_cache.load(database_path, 'k_folds_A', SPLIT_PARAMETERS) is None
+    other_parameters = dict(SPLIT_PARAMETERS, batch_size=50)
+    assert fold_plan_cache.load(database_path, 'k_folds', other_parameters) is None
+    # Rebuilt database
+    os.utime(metadata_path, (0, os.stat(metadata_path).st_mtime + 10))
+    assert fold_plan_cache.load(database_path, 'k_folds', SPLIT_PARAMETERS) is None
@@ -0,0 +1,88 @@
+#!/usr/bin/env python
+# -*- coding: utf8 -*-
+
+import numpy as np
+import pytest
+
+tf = pytest.importorskip("tensorflow")
+pytest.importorskip("keras")
+pytest.importorskip("LOP.Scripts.config")
+
+from LOP.Scripts.standard_learning.standard_trainer import Standard_trainer
+from LOP.Utils.build_batch import Window_batch_builder
+
+TEMPORAL_ORDER = 4
+
+
+class Dimensions(object):
+    piano_dim = 7
+    orch_dim = 9
+    orch_frames_input = None
+
+
+def test_gathered_batches_same_as_fed_batches():
+    rng = np.random.RandomState(0)
+    piano = rng.rand(50, Dimensions.piano_dim).astype(np.float32)
+    orch = (rng.rand(50, Dimensions.orch_dim) > 0.5).astype(np.float32)
+    batch_index = rng.randint(TEMPORAL_ORDER-1, 50-TEMPORAL_ORDER+1, size=12).astype(np.int32)
+    expected = Window_batch_builder(TEMPORAL_ORDER).build(batch_index, piano, orch, None, None)
+
+    with tf.Graph().as_default():
+        trainer = Standard_trainer(temporal_order=TEMPORAL_ORDER, graph_batches=True, frame_cache=True)
+        trainer.build_variables_nodes(Dimensions(), {})
+        inputs = [trainer.piano_t_ph, trainer.piano_past_ph, trainer.piano_future_ph, trainer.orch_past_ph, trainer.orch_future_ph, trainer.orch_t_ph, trainer.mask_orch_ph]
+        with tf.Session() as sess:
+            sess.run(tf.local_variables_initializer())
+            trainer.load_block(sess, piano, orch, None)
+            feed_dict, _ = trainer.build_feed_dict(batch_index, piano, orch, None, None)
+            assert list(feed_dict.keys()) == [trainer.batch_index_ph]
+            gathered = sess.run(inputs, feed_dict)
+            orch_frames, orch_past_index = sess.run([trainer.orch_frames_ph, trainer.orch_past_index_ph], feed_dict)
+            # Other matrices are fed
+            other_piano = piano.copy()
+            assert trainer.orch_t_ph in trainer.build_feed_dict(batch_index, other_piano, orch, None, None)[0]
+
+    for a, b in zip(gathered, expected):
+        np.testing.assert_array_equal(a, b)
+    np.testing.assert_array_equal(orch_frames[orch_past_index], expected[3])
+
+
+def test_staged_steps_same_as_single_steps():
+    pytest.importorskip("hyperopt")
+    from LOP.Models.Real_time.LSTM_plugged_base import LSTM_plugged_base
+    rng = np.random.RandomState(0)
+    piano = rng.rand(50, Dimensions.piano_dim).astype(np.float32)
+    orch = (rng.rand(50, Dimensions.orch_dim) > 0.5).astype(np.float32)
+    # Last batch shorter : padded in the staged batches
+    batches = [rng.randint(TEMPORAL_ORDER-1, 50-TEMPORAL_ORDER+1, size=size).astype(np.int32) for size in [8, 8, 8, 5]]
+    model_param = {'dropout_probability': 0., 'weight_decay_coeff': 0., 'tn_weight': 0., 'sparsity_coeff': 0., 'n_hidden': [6, 5]}
+    dimensions = {'temporal_order': TEMPORAL_ORDER, 'piano_input_dim': Dimensions.piano_dim, 'orch_dim': Dimensions.orch_dim}
+    summarize_dict = {'bool': False, 'merged_node': None}
+
+    with tf.Graph().as_default():
+        model = LSTM_plugged_base(model_param, dimensions)
+        optimizer = tf.train.AdamOptimizer(0.01)
+        trainer = Standard_trainer(temporal_order=TEMPORAL_ORDER, graph_batches=True)
+        trainer.build_variables_nodes(model, {})
+        trainer.build_preds_nodes(model)
+        trainer.build_loss_nodes(model, {'mask_orch': False})
+        num_variables = len(tf.trainable_variables())
+        trainer.build_train_step_node(model, optimizer)
+        trainer.build_staged_steps_node(model, parameters={'mask_orch': False}, optimizer=optimizer)
+        # Same weights and optimizer slots in the loop
+        assert len(tf.trainable_variables()) == num_variables
+        variables = tf.global_variables()
+        with tf.Session() as sess:
+            sess.run([tf.global_variables_initializer(), tf.local_variables_initializer()])
+            initial_values = sess.run(variables)
+            trainer.load_block(sess, piano, orch, None)
+            single_losses = [trainer.training_step(sess, e, piano, orch, None, None, summarize_dict, diagnostics=False)[0] for e in batches]
+            single_values = sess.run(variables)
+            for variable, value in zip(variables, initial_values):
+                variable.load(value, sess)
+            staged_losses = trainer.training_steps(sess, batches)
+            staged_values = sess.run(variables)
+
+    np.testing.assert_allclose(staged_losses, single_losses, rtol=1e-4)
+    for a, b in zip(staged_values, single_values):
+        np.testing.assert_allclose(a, b, rtol=1e-4, atol=1e-6)
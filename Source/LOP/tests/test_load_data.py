@@ -0,0 +1,79 @@
+#!/usr/bin/env python
+# -*- coding: utf8 -*-
+
+import os
+import pickle as pkl
+import numpy as np
+import pytest
+
+pytest.importorskip("LOP.Scripts.config")
+
+import load_matrices
+from LOP.Database import chunk_manifest, load_data
+
+TEMPORAL_ORDER = 3
+
+
+@pytest.fixture(autouse=True)
+def empty_manifests(monkeypatch):
+    monkeypatch.setattr(chunk_manifest, '_manifests', {})
+
+
+def list_valid_indices(chunks_folders, temporal_order, long_range_pred):
+    # Former algorithm : lists of ints, chunk by chunk
+    indices = []
+    indices_lr = []
+    time = 0
+    for block_folder in chunks_folders:
+        PARTS = load_matrices.load_chunk_arrays(block_folder, ['pr_piano', 'pr_orch'])
+        pr_piano, pr_orch = PARTS['pr_piano'], PARTS['pr_orch']
+        flat_pr = (pr_piano.sum(axis=1) > 0) * (pr_orch.sum(axis=1) > 0)
+        duration = len(pr_piano)
+        indices.extend([e+time for e in range(temporal_order-1, duration-temporal_order+1) if flat_pr[e] != 0])
+        if long_range_pred:
+            indices_lr.extend([e+time for e in range(temporal_order-1, duration-temporal_order-long_range_pred+1) if flat_pr[e] != 0])
+        time += duration
+    return indices, indices_lr
+
+
+def add_silences(chunks):
+    for chunk_folder, arrays in chunks:
+        arrays['pr_orch'][2] = 0
+        arrays['pr_piano'][-2] = 0
+        for kind in ['pr_piano', 'pr_orch']:
+            np.save(os.path.join(chunk_folder, kind + '.npy'), arrays[kind])
+
+
+def test_same_indices_as_lists(database):
+    chunks, _ = database
+    add_silences(chunks)
+    chunk_folders = [e[0] for e in chunks]
+    for block in [chunk_folders, chunk_folders[1:], chunk_folders[:1], []]:
+        for long_range_pred in [0, 2]:
+            indices, indices_lr = load_data.get_valid_indices(block, TEMPORAL_ORDER, long_range_pred)
+            expected, expected_lr = list_valid_indices(block, TEMPORAL_ORDER, long_range_pred)
+            assert indices.dtype == np.int32
+            assert list(indices) == expected
+            if long_range_pred:
+                assert list(indices_lr) == expected_lr
+
+
+def test_same_indices_with_the_manifest(database):
+    chunks, _ = database
+    add_silences(chunks)
+    chunk_folders = [e[0] for e in chunks]
+    without_manifest = load_data.get_valid_indices(chunk_folders, TEMPORAL_ORDER, 2)
+    store_folder = os.path.dirname(os.path.dirname(chunk_folders[0]))
+    with open(os.path.join(store_folder, 'train_only_A.pkl'), 'wb') as ff:
+        pkl.dump({'score_0': chunk_folders}, ff)
+    chunk_manifest.build_manifest(store_folder)
+    assert chunk_manifest.get_entry(chunk_folders[0]) is not None
+    for a, b in zip(load_data.get_valid_indices(chunk_folders, TEMPORAL_ORDER, 2), without_manifest):
+        np.testing.assert_array_equal(a, b)
+
+
+def test_remove_silences():
+    piano = np.array([[0, 1], [0, 0], [1, 1], [1, 0]])
+    orch = np.array([[1, 0], [1, 1], [0, 0], [1, 1]])
+    assert list(load_data.remove_silences(range(4), piano, orch)) == [0, 3]
+    assert list(load_data.remove_silences([3, 1, 0], piano, orch)) == [3, 0]
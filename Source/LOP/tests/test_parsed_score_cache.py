@@ -0,0 +1,32 @@
+#!/usr/bin/env python
+# -*- coding: utf8 -*-
+
+import os
+
+from LOP.Database import parsed_score_cache
+
+READ_PARAMETERS = {'quantization': 8, 'temporal_granularity': 'event_level'}
+
+
+def test_parsed_once_per_folder_and_parameters(tmp_path):
+    folder = str(tmp_path / 'score_0')
+    os.makedirs(folder)
+    with open(os.path.join(folder, 'orch.csv'), 'w') as ff:
+        ff.write('violin')
+    cache_folder = str(tmp_path / 'cache')
+    parsed_score = {'pr_piano': [1, 2], 'instru_orch': ['violin']}
+
+    assert parsed_score_cache.load(cache_folder, folder, READ_PARAMETERS) is None
+    parsed_score_cache.save(cache_folder, folder, READ_PARAMETERS, parsed_score)
+    assert parsed_score_cache.load(cache_folder, folder, READ_PARAMETERS)['parsed_score'] == parsed_score
+    assert parsed_score_cache.load(cache_folder, folder, dict(READ_PARAMETERS, quantization=4)) is None
+
+    # Edited file : parsed again
+    with open(os.path.join(folder, 'orch.csv'), 'w') as ff:
+        ff.write('violin, viola')
+    assert parsed_score_cache.load(cache_folder, folder, READ_PARAMETERS) is None
+
+
+def test_no_cache_folder(tmp_path):
+    parsed_score_cache.save(None, str(tmp_path), READ_PARAMETERS, {})
+    assert parsed_score_cache.load(None, str(tmp_path), READ_PARAMETERS) is None
@@ -0,0 +1,32 @@
+#!/usr/bin/env python
+# -*- coding: utf8 -*-
+
+import load_matrices
+from LOP.Scripts.prefetch_queue import Block_prefetcher
+
+
+def blocks_of(chunks):
+    # One block per chunk, plus a block of two chunks
+    chunk_folders = [e[0] for e in chunks]
+    return [[e] for e in chunk_folders] + [chunk_folders[:2]]
+
+
+def test_blocks_in_order(database, identity_normalizer, assert_same_matrices):
+    chunks, parameters = database
+    blocks = blocks_of(chunks)
+    for num_workers, depth in [(1, 1), (3, 2), (2, 10)]:
+        prefetcher = Block_prefetcher(identity_normalizer, parameters, blocks, num_workers=num_workers, depth=depth)
+        for block in blocks:
+            assert_same_matrices(prefetcher.get(), load_matrices.load_matrices(block, parameters))
+        assert len(prefetcher.pending) == 0
+        prefetcher.close()
+
+
+def test_cyclic_epochs(database, identity_normalizer, assert_same_matrices):
+    chunks, parameters = database
+    blocks = blocks_of(chunks)
+    prefetcher = Block_prefetcher(identity_normalizer, parameters, blocks, cyclic=True, num_workers=2, depth=3)
+    for epoch in range(3):
+        for block in blocks:
+            assert_same_matrices(prefetcher.get(), load_matrices.load_matrices(block, parameters))
+    prefetcher.close()
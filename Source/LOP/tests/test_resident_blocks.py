@@ -0,0 +1,40 @@
+#!/usr/bin/env python
+# -*- coding: utf8 -*-
+
+import os
+import numpy as np
+
+import load_matrices
+from LOP.Scripts.resident_blocks import Resident_blocks
+
+
+def check_blocks(resident, blocks, parameters, assert_same_matrices):
+    for block_ind, block in enumerate(blocks):
+        assert_same_matrices(resident.get(block_ind), load_matrices.load_matrices(block, parameters))
+
+
+def test_blocks_kept_across_epochs(database, tmp_path, identity_normalizer, assert_same_matrices):
+    chunks, parameters = database
+    blocks = [[e[0]] for e in chunks]
+    resident = Resident_blocks(identity_normalizer, parameters, blocks, memory_budget=2**30, spill_folder=str(tmp_path / 'spill'))
+    check_blocks(resident, blocks, parameters, assert_same_matrices)
+    first = resident.get(0)
+    check_blocks(resident, blocks, parameters, assert_same_matrices)
+    assert resident.get(0) is first
+    assert resident.num_spilled == 0
+    resident.close()
+
+
+def test_blocks_over_budget_are_spilled(database, tmp_path, identity_normalizer, assert_same_matrices):
+    chunks, parameters = database
+    blocks = [[e[0]] for e in chunks]
+    spill_folder = str(tmp_path / 'spill')
+    # Room for the first block only
+    first_size = sum([e.nbytes for e in load_matrices.load_matrices(blocks[0], parameters) if e is not None])
+    resident = Resident_blocks(identity_normalizer, parameters, blocks, memory_budget=first_size, spill_folder=spill_folder)
+    for epoch in range(2):
+        check_blocks(resident, blocks, parameters, assert_same_matrices)
+    assert resident.num_spilled == len(blocks) - 1
+    assert isinstance(resident.get(1)[1], np.memmap)
+    resident.close()
+    assert not os.path.isdir(spill_folder)
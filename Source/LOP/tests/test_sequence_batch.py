@@ -0,0 +1,80 @@
+#!/usr/bin/env python
+# -*- coding: utf8 -*-
+
+import random
+import numpy as np
+
+from LOP.Utils.build_batch import build_batch
+from LOP.Utils.sequence_batch import build_segments, batch_segments, build_sequence_batch, build_window_sequence_batch, count_targets
+
+TEMPORAL_ORDER = 4
+
+
+def random_block(durations, seed=0):
+    rng = np.random.RandomState(seed)
+    total = sum(durations)
+    piano = rng.rand(total, 6).astype(np.float32)
+    orch = (rng.rand(total, 5) > 0.5).astype(np.float32)
+    # Valid indices : at least temporal_order-1 frames of context in the chunk
+    chunk_starts = np.cumsum(durations) - durations
+    valid = np.concatenate([np.arange(start + TEMPORAL_ORDER - 1, start + duration) for start, duration in zip(chunk_starts, durations)])
+    valid = valid[rng.rand(len(valid)) > 0.2]
+    return piano, orch, valid
+
+
+def target_positions(segments):
+    starts, ends, targets = segments
+    positions = starts[:, np.newaxis] + np.arange(targets.shape[1])
+    return positions[targets]
+
+
+def test_every_valid_index_is_predicted_once():
+    durations = [30, 7, 3, 52]
+    _, _, valid = random_block(durations)
+    for sequence_length in [TEMPORAL_ORDER, 10, 100]:
+        segments = build_segments(valid, durations, TEMPORAL_ORDER, sequence_length)
+        assert sorted(target_positions(segments)) == sorted(valid)
+
+
+def test_segments_stay_in_their_chunk():
+    durations = [30, 7, 52]
+    _, _, valid = random_block(durations)
+    starts, ends, _ = build_segments(valid, durations, TEMPORAL_ORDER, 10)
+    chunk_ends = np.cumsum(durations)
+    for start, end in zip(starts, ends):
+        assert np.searchsorted(chunk_ends, start, side='right') == np.searchsorted(chunk_ends, end-1, side='right')
+
+
+def test_sequence_batch_matches_the_block():
+    durations = [30, 52]
+    piano, orch, valid = random_block(durations)
+    segments = build_segments(valid, durations, TEMPORAL_ORDER, 12)
+    batches = batch_segments(segments, 3, random.Random(0))
+    assert count_targets(batches) == len(valid)
+    for batch in batches:
+        piano_seq, orch_past_seq, orch_t, targets = build_sequence_batch(batch, piano, orch)
+        np.testing.assert_array_equal(orch_t, orch[target_positions(batch)])
+        np.testing.assert_array_equal(piano_seq[targets], piano[target_positions(batch)])
+        # Previous frame of each target (targets have temporal_order-1 frames of context in their segment)
+        np.testing.assert_array_equal(orch_past_seq[targets], orch[target_positions(batch) - 1])
+
+
+def test_window_sequence_batch_same_inputs_as_windows():
+    piano, orch, valid = random_block([40])
+    batch_index = valid[:8]
+    piano_t, _, _, orch_past, _, orch_t, _ = build_batch(batch_index, piano, orch, None, None, len(batch_index), TEMPORAL_ORDER)
+    piano_seq, orch_past_seq, orch_t_seq, targets = build_window_sequence_batch(batch_index, piano, orch, TEMPORAL_ORDER)
+    assert targets.shape == (len(batch_index), TEMPORAL_ORDER)
+    np.testing.assert_array_equal(piano_seq[targets], piano_t)
+    np.testing.assert_array_equal(orch_past_seq[:, 1:], orch_past)
+    np.testing.assert_array_equal(orch_t_seq, orch_t)
+
+
+def test_window_sequence_batch_generation_matrices():
+    # Generation : one orchestra (batch, time, dim) per generated sequence
+    piano, _, _ = random_block([20])
+    orch_gen = (np.random.RandomState(1).rand(3, 20, 5) > 0.5).astype(np.float32)
+    batch_index = np.tile(10, 3)
+    _, orch_past_seq, orch_t, _ = build_window_sequence_batch(batch_index, piano, orch_gen, TEMPORAL_ORDER)
+    np.testing.assert_array_equal(orch_past_seq[:, 1:], orch_gen[:, 10-(TEMPORAL_ORDER-1):10])
+    np.testing.assert_array_equal(orch_t, orch_gen[:, 10])
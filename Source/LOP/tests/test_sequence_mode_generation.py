@@ -0,0 +1,99 @@
+#!/usr/bin/env python
+# -*- coding: utf8 -*-
+
+import random
+import numpy as np
+import pytest
+
+tf = pytest.importorskip("tensorflow")
+pytest.importorskip("keras")
+pytest.importorskip("hyperopt")
+pytest.importorskip("LOP.Scripts.config")
+
+from keras import backend as K
+from LOP.Models.Real_time.LSTM_plugged_base import LSTM_plugged_base
+from LOP.Scripts.standard_learning.standard_trainer import Standard_trainer
+from LOP.Utils.sequence_batch import build_segments, batch_segments
+
+TEMPORAL_ORDER = 4
+PIANO_DIM = 6
+ORCH_DIM = 5
+
+
+def test_generate_after_sequence_training(tmp_path):
+    rng = np.random.RandomState(0)
+    piano = rng.rand(60, PIANO_DIM).astype(np.float32)
+    orch = (rng.rand(60, ORCH_DIM) > 0.5).astype(np.float32)
+    valid = np.arange(TEMPORAL_ORDER-1, 60)
+    batches = batch_segments(build_segments(valid, [60], TEMPORAL_ORDER, 12), 4, random.Random(0))
+    model_param = {'dropout_probability': 0., 'weight_decay_coeff': 0., 'tn_weight': 0., 'sparsity_coeff': 0., 'n_hidden': (8,)}
+    dimensions = {'temporal_order': TEMPORAL_ORDER, 'piano_input_dim': PIANO_DIM, 'orch_dim': ORCH_DIM}
+    model_folder = str(tmp_path)
+
+    # Train in sequence mode and save
+    with tf.Graph().as_default():
+        model = LSTM_plugged_base(model_param, dimensions)
+        model.sequence_mode = True
+        trainer = Standard_trainer(temporal_order=TEMPORAL_ORDER, sequence_mode=True)
+        trainer.build_variables_nodes(model, {})
+        trainer.build_preds_nodes(model)
+        trainer.build_loss_nodes(model, {'mask_orch': False})
+        trainer.build_train_step_node(model, tf.train.AdamOptimizer())
+        trainer.save_nodes(model)
+        with tf.Session() as sess:
+            K.set_session(sess)
+            sess.run(tf.global_variables_initializer())
+            for batch in batches:
+                trainer.training_step(sess, batch, piano, orch, None, None, {'bool': False, 'merged_node': None})
+            trainer.saver.save(sess, model_folder + '/model')
+
+    # Restore and generate as generate.py does : windows on a (batch, time, dim) orchestra
+    with tf.Graph().as_default():
+        trainer = Standard_trainer(temporal_order=TEMPORAL_ORDER)
+        trainer.load_pretrained_model(model_folder)
+        assert trainer.sequence_mode
+        orch_gen = np.zeros((3, 60, ORCH_DIM))
+        with tf.Session() as sess:
+            K.set_session(sess)
+            trainer.saver.restore(sess, model_folder + '/model')
+            for t in range(TEMPORAL_ORDER, 10):
+                prediction = trainer.generation_step(sess, np.tile(t, 3), piano, orch_gen, None, None)
+                assert prediction.shape == (3, ORCH_DIM)
+                orch_gen[:, t, :] = np.random.binomial(1, prediction)
+
+
+def test_validation_on_windows():
+    # Validation blocks keep their windows and long range batches in sequence mode
+    rng = np.random.RandomState(0)
+    piano = rng.rand(40, PIANO_DIM).astype(np.float32)
+    orch = (rng.rand(40, ORCH_DIM) > 0.5).astype(np.float32)
+    model_param = {'dropout_probability': 0., 'weight_decay_coeff': 0., 'tn_weight': 0., 'sparsity_coeff': 0., 'n_hidden': (8,)}
+    dimensions = {'temporal_order': TEMPORAL_ORDER, 'piano_input_dim': PIANO_DIM, 'orch_dim': ORCH_DIM}
+    batch_index = np.arange(TEMPORAL_ORDER-1, 20)
+    long_range = 3
+    seq_len = (TEMPORAL_ORDER-1) * 2 + long_range
+    piano_extracted = np.stack([piano[e:e+seq_len] for e in range(3)])
+    orch_extracted = np.stack([orch[e:e+seq_len] for e in range(3)])
+
+    with tf.Graph().as_default():
+        model = LSTM_plugged_base(model_param, dimensions)
+        model.sequence_mode = True
+        trainer = Standard_trainer(temporal_order=TEMPORAL_ORDER, sequence_mode=True)
+        trainer.build_variables_nodes(model, {})
+        trainer.build_preds_nodes(model)
+        trainer.build_loss_nodes(model, {'mask_orch': False})
+        trainer.build_train_step_node(model, tf.train.AdamOptimizer())
+        with tf.Session() as sess:
+            K.set_session(sess)
+            sess.run(tf.global_variables_initializer())
+            loss, preds, orch_t = trainer.valid_step(sess, batch_index, piano, orch, None, None, None)
+            # Same prediction as a segment of temporal_order frames ending at the target
+            segment = (np.array([batch_index[5]-(TEMPORAL_ORDER-1)]), np.array([batch_index[5]+1]), np.array([[False]*(TEMPORAL_ORDER-1) + [True]]))
+            _, preds_segment, _ = trainer.valid_step(sess, segment, piano, orch, None, None, None)
+            _, preds_lr, orch_t_lr = trainer.valid_long_range_step(sess, TEMPORAL_ORDER-1, piano_extracted, orch_extracted, np.zeros_like(orch_extracted), None)
+
+    assert preds.shape == (len(batch_index), ORCH_DIM)
+    np.testing.assert_array_equal(orch_t, orch[batch_index])
+    np.testing.assert_allclose(preds[5], preds_segment[0], rtol=1e-5)
+    assert preds_lr.shape == (3, ORCH_DIM)
+    np.testing.assert_array_equal(orch_t_lr, orch_extracted[:, TEMPORAL_ORDER-1])
@@ -0,0 +1,53 @@
+#!/usr/bin/env python
+# -*- coding: utf8 -*-
+
+import os
+import subprocess
+import sys
+import numpy as np
+import pytest
+
+from LOP.Database import chunk_store, shared_dataset
+
+
+@pytest.fixture(autouse=True)
+def shared_root(tmp_path, monkeypatch):
+    monkeypatch.setattr(chunk_store, '_stores', {})
+    monkeypatch.setattr(chunk_store, '_packed_roots', {})
+    monkeypatch.setattr(shared_dataset, 'SHARED_ROOT', str(tmp_path / 'shm'))
+
+
+def dead_pid():
+    process = subprocess.Popen([sys.executable, '-c', 'pass'])
+    process.wait()
+    return process.pid
+
+
+def write_lock(store_folder, pid):
+    tmp_folder = shared_dataset.get_shared_folder(store_folder) + '_tmp'
+    os.makedirs(os.path.join(tmp_folder, 'A'))
+    with open(os.path.join(tmp_folder, shared_dataset.WRITER_FILE), 'w') as ff:
+        ff.write(str(pid))
+    return tmp_folder
+
+
+def test_copy_written_again_when_the_writer_died(database):
+    chunks, _ = database
+    store_folder = os.path.dirname(os.path.dirname(chunks[0][0]))
+    tmp_folder = write_lock(store_folder, dead_pid())
+    shared_folder = shared_dataset.attach(store_folder, timeout=0)
+    assert not os.path.exists(tmp_folder)
+    assert not os.path.exists(os.path.join(shared_folder, shared_dataset.WRITER_FILE))
+    for chunk_folder, arrays in chunks:
+        store = chunk_store.get_store(chunk_folder)
+        assert os.path.dirname(store.packed_folder) == shared_folder
+        np.testing.assert_array_equal(store.load_chunk(chunk_folder, 'pr_orch'), arrays['pr_orch'])
+
+
+def test_wait_for_a_running_writer(database):
+    chunks, _ = database
+    store_folder = os.path.dirname(os.path.dirname(chunks[0][0]))
+    tmp_folder = write_lock(store_folder, os.getpid())
+    with pytest.raises(Exception, match='Timeout'):
+        shared_dataset.attach(store_folder, timeout=0)
+    assert os.path.isdir(tmp_folder)
@@ -0,0 +1,59 @@
+#!/usr/bin/env python
+# -*- coding: utf8 -*-
+
+import os
+import pytest
+
+from LOP.Database import source_manifest
+
+
+@pytest.fixture(autouse=True)
+def empty_hashes(monkeypatch):
+    monkeypatch.setattr(source_manifest, '_folder_hashes', {})
+
+
+def write_folder(folder, files):
+    if not os.path.isdir(folder):
+        os.makedirs(folder)
+    for name, content in files.items():
+        with open(os.path.join(folder, name), 'wb') as ff:
+            ff.write(content)
+
+
+def test_modified_folders_are_rebuilt(tmp_path, monkeypatch):
+    folder = str(tmp_path / 'source' / 'score_0')
+    chunk = str(tmp_path / 'store' / 'A' / '0_0')
+    os.makedirs(chunk)
+    write_folder(folder, {'piano.mid': b'piano', 'orch.mid': b'orch', 'orch.csv': b'violin'})
+    entry = {'hash': source_manifest.hash_folder(folder), 'file_counter': 0, 'chunks': [chunk]}
+    assert source_manifest.is_reusable(entry, source_manifest.hash_folder(folder))
+    assert not source_manifest.is_reusable(None, source_manifest.hash_folder(folder))
+
+    # Next build : new run, hashes computed again
+    for files in [{'orch.csv': b'viola'}, {'new.xml': b'score'}]:
+        monkeypatch.setattr(source_manifest, '_folder_hashes', {})
+        write_folder(folder, files)
+        assert not source_manifest.is_reusable(entry, source_manifest.hash_folder(folder))
+
+    # Chunks removed by hand
+    entry['hash'] = source_manifest.hash_folder(folder)
+    os.rmdir(chunk)
+    assert not source_manifest.is_reusable(entry, source_manifest.hash_folder(folder))
+
+
+def test_round_trip(tmp_path):
+    store_folder = str(tmp_path)
+    assert source_manifest.load(store_folder) is None
+    manifest = {'build_parameters': {'quantization': 8}, 'instru_mapping': {},
+        'folders': {'A': {'score_0': {'hash': 'abc', 'file_counter': 0, 'chunks': ['A/0_0']}}}}
+    source_manifest.save(store_folder, manifest)
+    assert source_manifest.load(store_folder) == manifest
+
+
+def test_pitch_range_widened():
+    old_mapping = {'violin': {'pitch_min': 55, 'pitch_max': 100}}
+    assert not source_manifest.pitch_range_widened(old_mapping, {'violin': {'pitch_min': 60, 'pitch_max': 90}})
+    assert not source_manifest.pitch_range_widened(old_mapping, {})
+    assert source_manifest.pitch_range_widened(old_mapping, {'violin': {'pitch_min': 50, 'pitch_max': 90}})
+    assert source_manifest.pitch_range_widened(old_mapping, {'violin': {'pitch_min': 60, 'pitch_max': 101}})
+    assert source_manifest.pitch_range_widened(old_mapping, {'viola': {'pitch_min': 60, 'pitch_max': 90}})
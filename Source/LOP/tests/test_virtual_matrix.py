@@ -0,0 +1,49 @@
+#!/usr/bin/env python
+# -*- coding: utf8 -*-
+
+import numpy as np
+
+from LOP.Utils.virtual_matrix import Virtual_matrix
+from LOP.Utils.build_batch import build_batch
+import load_matrices
+
+
+def test_indexing_same_as_the_dense_matrix():
+    rng = np.random.RandomState(0)
+    chunks = [rng.rand(length, 3) for length in [4, 1, 7, 5]]
+    dense = np.concatenate(chunks)
+    matrix = Virtual_matrix(chunks)
+    assert matrix.shape == dense.shape
+    assert len(matrix) == len(dense)
+    for key in [0, 4, 16, -1, slice(2, 13), slice(None, None, 3), [15, 0, 4, 4, 11], np.array([[1, 2], [5, 6]])]:
+        np.testing.assert_array_equal(matrix[key], dense[key])
+    np.testing.assert_array_equal(matrix[[3, 5], 1:], dense[[3, 5], 1:])
+    np.testing.assert_array_equal(np.asarray(matrix), dense)
+
+
+def test_batches_same_as_the_dense_matrix():
+    rng = np.random.RandomState(0)
+    chunks = [(rng.rand(length, 6) > 0.5).astype(np.float16) for length in [8, 3, 12]]
+    dense = np.concatenate(chunks)
+    batch_index = np.array([4, 8, 10, 15, 18])
+    reference = build_batch(batch_index, dense, dense, None, None, len(batch_index), 4)
+    virtual = build_batch(batch_index, Virtual_matrix(chunks), Virtual_matrix(chunks), None, None, len(batch_index), 4)
+    for a, b in zip(reference, virtual):
+        np.testing.assert_array_equal(a, b)
+
+
+def test_memory_mapped_blocks_same_as_loaded_blocks(database, assert_same_matrices):
+    chunks, parameters = database
+    chunk_folders = [e[0] for e in chunks]
+    for bitpacked in [False, True]:
+        # Only the orchestra is stored packed here
+        if bitpacked:
+            for chunk_folder, arrays in chunks:
+                np.save(chunk_folder + '/pr_orch.npy', np.packbits(arrays['pr_orch'] > 0, axis=-1))
+        parameters['bitpacked_orch'] = bitpacked
+        parameters['mmap_matrices'] = False
+        loaded = load_matrices.load_matrices(chunk_folders, parameters)
+        parameters['mmap_matrices'] = True
+        mapped = load_matrices.load_matrices(chunk_folders, parameters)
+        assert_same_matrices(mapped, loaded)
+        np.testing.assert_array_equal(np.asarray(mapped[1]), np.concatenate([e[1]['pr_orch'] for e in chunks]))